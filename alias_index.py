@@ -0,0 +1,423 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from collections.abc import Mapping, Sequence
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from company_mentions import build_company_mappings
+from crm_table import CrmTable
+from logger import get_logger
+
+logger = get_logger()
+
+# Каталог с файлами индекса псевдонимов (пустое значение отключает сохранение на диск)
+ALIAS_INDEX_DIRECTORY = os.getenv("ALIAS_INDEX_DIRECTORY", os.path.join("data", "alias_index"))
+# Сколько последних индексов хранить на диске
+ALIAS_INDEX_KEEP_FILES = int(os.getenv("ALIAS_INDEX_KEEP_FILES", "5"))
+
+# Версия формата файла и логики построения маппингов.
+# Увеличивается при любом изменении build_company_mappings или нормализации, чтобы старые индексы не использовались.
+ALIAS_INDEX_VERSION = 3
+ALIAS_INDEX_MAGIC = b"CMALIDX\x00"
+ALIAS_INDEX_EXTENSION = ".idx"
+REVISION_POINTER_EXTENSION = ".rev"
+
+# Заголовок: сигнатура, версия, количество псевдонимов, компаний, строк, колонок CRM и значений колонок,
+# хэш исходных строк CRM, размер блока строк
+INDEX_HEADER = struct.Struct("<8sIIIIII32sQ")
+# Выравнивание секций, чтобы массивы читались из отображенного файла без копирования
+SECTION_ALIGNMENT = 8
+
+# Типы значений колонок CRM: значение хранится в таблице строк и приводится к типу при чтении
+VALUE_NONE, VALUE_STR, VALUE_INT, VALUE_FLOAT = range(4)
+VALUE_PARSERS = {VALUE_STR: str, VALUE_INT: int, VALUE_FLOAT: float}
+
+
+def hash_companies_dataframe(companies_dataframe: pd.DataFrame) -> str:
+    """
+    Вычисляет хэш содержимого CRM для обнаружения изменений.
+    Args: companies_dataframe: DataFrame с данными о компаниях
+    Returns: Хэш SHA-256 в шестнадцатеричном виде
+    """
+    content_hash = hashlib.sha256()
+    content_hash.update("\x1f".join(map(str, companies_dataframe.columns)).encode("utf-8"))
+    content_hash.update(pd.util.hash_pandas_object(companies_dataframe, index=False).to_numpy().tobytes())
+    return content_hash.hexdigest()
+
+
+def _padding(size: int) -> int:
+    """Возвращает количество байт для выравнивания секции"""
+    return -size % SECTION_ALIGNMENT
+
+
+def _encode_value(value) -> tuple[int, str]:
+    """
+    Представляет значение колонки CRM строкой для таблицы строк.
+    Args: value: Значение колонки
+    Returns: Кортеж (тип значения, строковое представление)
+    """
+    if value is None or value is pd.NA or value is pd.NaT:
+        return VALUE_NONE, ""
+    if isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_)):
+        return VALUE_INT, str(int(value))
+    if isinstance(value, (float, np.floating)):
+        return VALUE_FLOAT, repr(float(value))
+    return VALUE_STR, str(value)
+
+
+class MappedStrings(Sequence):
+    """Строки из блока UTF-8 отображенного файла индекса; декодируются только при обращении"""
+
+    def __init__(self, strings_blob: memoryview, string_offsets: np.ndarray, string_ids: Optional[np.ndarray] = None):
+        """
+        Args: strings_blob: Блок строк UTF-8
+            string_offsets: Смещения строк в блоке (на одно больше количества строк)
+            string_ids: Номера строк в таблице по порядку элементов (None — все строки таблицы)
+        """
+        self._strings_blob = strings_blob
+        # Индексирование memoryview возвращает int без создания скаляров numpy
+        self._string_offsets = memoryview(string_offsets)
+        self._string_ids = memoryview(string_ids) if string_ids is not None else None
+
+    def __len__(self) -> int:
+        return len(self._string_ids) if self._string_ids is not None else len(self._string_offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        string_id = self._string_ids[index] if self._string_ids is not None else index
+        return str(self._strings_blob[self._string_offsets[string_id]:self._string_offsets[string_id + 1]], "utf-8")
+
+
+class MappedFieldValues(Sequence):
+    """Уникальные значения колонки CRM из таблицы строк индекса, приведенные к исходным типам"""
+
+    def __init__(self, strings: MappedStrings, value_kinds: np.ndarray):
+        """
+        Args: strings: Строковые представления значений
+            value_kinds: Типы значений (VALUE_NONE, VALUE_STR, VALUE_INT, VALUE_FLOAT)
+        """
+        self._strings = strings
+        self._value_kinds = memoryview(value_kinds)
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def __getitem__(self, index: int):
+        value_kind = self._value_kinds[index]
+        if value_kind == VALUE_NONE:
+            return None
+        return VALUE_PARSERS[value_kind](self._strings[index])
+
+
+class MappedAliases(Mapping):
+    """
+    Маппинг псевдонимов на номера компаний из отображенного файла индекса.
+    Псевдонимы декодируются при обходе; словарь для поиска по псевдониму строится только при первом обращении.
+    """
+
+    def __init__(self, aliases: MappedStrings, company_ids: np.ndarray):
+        """
+        Args: aliases: Псевдонимы
+            company_ids: Номера компаний в том же порядке
+        """
+        self._aliases = aliases
+        self._company_ids = company_ids
+        self._lookup: Optional[dict[str, int]] = None
+
+    def items(self) -> Iterator[tuple[str, int]]:
+        return zip(self._aliases, self._company_ids.tolist())
+
+    def __getitem__(self, alias: str) -> int:
+        if self._lookup is None:
+            self._lookup = dict(self.items())
+        return self._lookup[alias]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._aliases)
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+
+class AliasIndex:
+    """Результат build_company_mappings, загруженный из файла индекса или построенный в памяти"""
+
+    def __init__(self, alias_to_company_id: Mapping[str, int], canonical_to_crm: CrmTable, content_hash: str):
+        self.alias_to_company_id = alias_to_company_id
+        self.canonical_to_crm = canonical_to_crm
+        self.content_hash = content_hash
+
+
+def write_alias_index(file_path: str, alias_to_company_id: Mapping[str, int], canonical_to_crm: CrmTable,
+                      content_hash: str) -> None:
+    """
+    Записывает маппинги компаний в файл индекса атомарно (через временный файл).
+    Формат: заголовок, смещения строк (uint64), пары псевдоним-номер компании (uint32),
+    номера строк с названиями компаний (uint32), коды колонок CRM (uint32, колонки x компании),
+    номера строк с названиями колонок (uint32), границы значений каждой колонки (uint32),
+    номера строк со значениями колонок (uint32), типы значений (uint8), блок строк UTF-8.
+    Все строки, включая значения колонок, хранятся в одной таблице строк с длинами в виде смещений.
+    Args: file_path: Путь к файлу индекса
+        alias_to_company_id: Маппинг псевдонимов на номера компаний
+        canonical_to_crm: Таблица CRM
+        content_hash: Хэш исходных строк CRM
+    """
+    encoded_values = [[_encode_value(value) for value in values] for values in canonical_to_crm.field_values]
+
+    # Таблица уникальных строк: канонические названия встречаются и среди псевдонимов
+    string_ids: dict[str, int] = {}
+    for name in (*canonical_to_crm.canonical_names, *alias_to_company_id, *canonical_to_crm.fields):
+        string_ids.setdefault(name, len(string_ids))
+    for values in encoded_values:
+        for _, text in values:
+            string_ids.setdefault(text, len(string_ids))
+
+    encoded_strings = [name.encode("utf-8") for name in string_ids]
+    string_offsets = np.zeros(len(encoded_strings) + 1, dtype="<u8")
+    np.cumsum([len(encoded) for encoded in encoded_strings], out=string_offsets[1:])
+
+    alias_pairs = np.array(
+        [(string_ids[alias], company_id) for alias, company_id in alias_to_company_id.items()], dtype="<u4",
+    ).reshape(-1, 2)
+    canonical_ids = np.array([string_ids[name] for name in canonical_to_crm.canonical_names], dtype="<u4")
+    field_codes = np.ascontiguousarray(canonical_to_crm.field_codes, dtype="<u4")
+    field_ids = np.array([string_ids[field] for field in canonical_to_crm.fields], dtype="<u4")
+    value_bounds = np.zeros(len(encoded_values) + 1, dtype="<u4")
+    np.cumsum([len(values) for values in encoded_values], out=value_bounds[1:])
+    value_ids = np.array([string_ids[text] for values in encoded_values for _, text in values], dtype="<u4")
+    value_kinds = np.array([kind for values in encoded_values for kind, _ in values], dtype="u1")
+
+    strings_blob = b"".join(encoded_strings)
+    header = INDEX_HEADER.pack(
+        ALIAS_INDEX_MAGIC, ALIAS_INDEX_VERSION, len(alias_to_company_id), len(canonical_to_crm),
+        len(encoded_strings), len(canonical_to_crm.fields), len(value_ids), bytes.fromhex(content_hash),
+        len(strings_blob),
+    )
+
+    directory = os.path.dirname(file_path) or "."
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "wb") as index_file:
+            for section in (header, string_offsets.tobytes(), alias_pairs.tobytes(), canonical_ids.tobytes(),
+                            field_codes.tobytes(), field_ids.tobytes(), value_bounds.tobytes(), value_ids.tobytes(),
+                            value_kinds.tobytes(), strings_blob):
+                index_file.write(section)
+                index_file.write(b"\x00" * _padding(len(section)))
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def read_alias_index(file_path: str) -> AliasIndex:
+    """
+    Загружает индекс псевдонимов, отображая файл в память.
+    Массивы и строки читаются из отображенного файла без копирования и декодируются только при обращении,
+    поэтому страницы разделяются между процессами.
+    Args: file_path: Путь к файлу индекса
+    Returns: Индекс псевдонимов
+    Raises: ValueError если файл поврежден или записан другой версией
+    """
+    with open(file_path, "rb") as index_file:
+        buffer = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(buffer) < INDEX_HEADER.size:
+        raise ValueError(f"Файл индекса {file_path} поврежден")
+    (magic, version, alias_count, canonical_count, string_count, field_count, value_count,
+     content_hash, strings_size) = INDEX_HEADER.unpack_from(buffer)
+    if magic != ALIAS_INDEX_MAGIC or version != ALIAS_INDEX_VERSION:
+        raise ValueError(f"Файл индекса {file_path} имеет неподдерживаемый формат или версию")
+
+    offset = INDEX_HEADER.size + _padding(INDEX_HEADER.size)
+
+    def read_array(dtype: str, count: int) -> np.ndarray:
+        nonlocal offset
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+        offset += array.nbytes + _padding(array.nbytes)
+        return array
+
+    try:
+        string_offsets = read_array("<u8", string_count + 1)
+        alias_pairs = read_array("<u4", alias_count * 2).reshape(-1, 2)
+        canonical_ids = read_array("<u4", canonical_count)
+        field_codes = read_array("<u4", field_count * canonical_count)
+        field_ids = read_array("<u4", field_count)
+        value_bounds = read_array("<u4", field_count + 1).tolist()
+        value_ids = read_array("<u4", value_count)
+        value_kinds = read_array("u1", value_count)
+    except ValueError:
+        raise ValueError(f"Файл индекса {file_path} поврежден") from None
+
+    strings_start = offset
+    if (strings_start + strings_size + _padding(strings_size) != len(buffer)
+            or string_offsets[-1] != strings_size or value_bounds[-1] != value_count):
+        raise ValueError(f"Файл индекса {file_path} поврежден")
+
+    strings_blob = memoryview(buffer)[strings_start:strings_start + strings_size]
+    strings = MappedStrings(strings_blob, string_offsets)
+    field_values = [
+        MappedFieldValues(MappedStrings(strings_blob, string_offsets, value_ids[start:end]), value_kinds[start:end])
+        for start, end in zip(value_bounds, value_bounds[1:])
+    ]
+    canonical_to_crm = CrmTable(MappedStrings(strings_blob, string_offsets, canonical_ids),
+                                [strings[field_id] for field_id in field_ids.tolist()], field_values, field_codes)
+    alias_to_company_id = MappedAliases(MappedStrings(strings_blob, string_offsets, alias_pairs[:, 0]),
+                                        alias_pairs[:, 1])
+
+    return AliasIndex(alias_to_company_id, canonical_to_crm, content_hash.hex())
+
+
+class AliasIndexStore:
+    """
+    Каталог файлов индекса псевдонимов, именованных по хэшу исходных строк CRM.
+    Дополнительно хранит указатели "ревизия источника -> хэш", чтобы после перезапуска
+    загружать индекс без повторного чтения CRM, если источник не менялся.
+    """
+
+    def __init__(self, directory: str = ALIAS_INDEX_DIRECTORY, keep_files: int = ALIAS_INDEX_KEEP_FILES):
+        """
+        Args: directory: Каталог с файлами индекса
+            keep_files: Сколько последних индексов хранить
+        """
+        self.directory = directory
+        self.keep_files = keep_files
+
+    def _index_path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}.v{ALIAS_INDEX_VERSION}{ALIAS_INDEX_EXTENSION}")
+
+    def _revision_path(self, revision: str) -> str:
+        revision_hash = hashlib.sha256(revision.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{revision_hash}{REVISION_POINTER_EXTENSION}")
+
+    def load(self, content_hash: str) -> Optional[AliasIndex]:
+        """
+        Загружает индекс по хэшу исходных строк.
+        Args: content_hash: Хэш исходных строк CRM
+        Returns: Индекс или None, если файла нет или он поврежден
+        """
+        file_path = self._index_path(content_hash)
+        if not os.path.exists(file_path):
+            return None
+        try:
+            alias_index = read_alias_index(file_path)
+        except (OSError, ValueError) as e:
+            logger.warning("Не удалось загрузить индекс псевдонимов %s: %s", file_path, e)
+            return None
+
+        logger.info("Индекс псевдонимов загружен с диска: %d алиасов", len(alias_index.alias_to_company_id))
+        return alias_index
+
+    def load_latest(self) -> Optional[AliasIndex]:
+        """
+        Загружает самый свежий сохраненный индекс (например, для отчетов без загрузки CRM).
+        Returns: Индекс или None, если сохраненных индексов нет
+        """
+        try:
+            index_entries = [
+                entry for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith(f".v{ALIAS_INDEX_VERSION}{ALIAS_INDEX_EXTENSION}")
+            ]
+        except FileNotFoundError:
+            return None
+        if not index_entries:
+            return None
+
+        latest_entry = max(index_entries, key=lambda entry: entry.stat().st_mtime)
+        return self.load(latest_entry.name.split(".")[0])
+
+    def load_or_build(self, companies_dataframe: pd.DataFrame, content_hash: Optional[str] = None,
+                      revision: Optional[str] = None) -> AliasIndex:
+        """
+        Возвращает индекс для данных CRM: загружает сохраненный или строит и сохраняет новый.
+        Args: companies_dataframe: DataFrame с данными о компаниях
+            content_hash: Хэш исходных строк (вычисляется, если не передан)
+            revision: Ревизия источника, для которой запоминается индекс
+        Returns: Индекс псевдонимов
+        """
+        content_hash = content_hash or hash_companies_dataframe(companies_dataframe)
+
+        alias_index = self.load(content_hash)
+        if alias_index is None:
+            alias_to_company_id, canonical_to_crm = build_company_mappings(companies_dataframe)
+            alias_index = AliasIndex(alias_to_company_id, canonical_to_crm, content_hash)
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                write_alias_index(self._index_path(content_hash), alias_to_company_id, canonical_to_crm, content_hash)
+                logger.info("Индекс псевдонимов сохранен: %s", self._index_path(content_hash))
+                self._remove_old_files()
+            except OSError as e:
+                logger.warning("Не удалось сохранить индекс псевдонимов: %s", e)
+
+        if revision is not None:
+            self.remember_revision(revision, content_hash)
+        return alias_index
+
+    def find_by_revision(self, revision: str) -> Optional[AliasIndex]:
+        """
+        Загружает индекс, ранее построенный для указанной ревизии источника.
+        Args: revision: Ревизия источника (например, время изменения таблицы)
+        Returns: Индекс или None, если для ревизии индекса нет
+        """
+        try:
+            with open(self._revision_path(revision), "r", encoding="utf-8") as pointer_file:
+                content_hash = pointer_file.read().strip()
+        except OSError:
+            return None
+        return self.load(content_hash)
+
+    def remember_revision(self, revision: str, content_hash: str) -> None:
+        """Сохраняет указатель с ревизии источника на хэш индекса"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._revision_path(revision), "w", encoding="utf-8") as pointer_file:
+                pointer_file.write(content_hash)
+        except OSError as e:
+            logger.warning("Не удалось сохранить ревизию индекса псевдонимов: %s", e)
+
+    def _remove_old_files(self) -> None:
+        """Удаляет самые старые индексы сверх keep_files и указатели на удаленные индексы"""
+        entries = [entry for entry in os.scandir(self.directory) if entry.is_file()]
+        index_entries = sorted(
+            (entry for entry in entries if entry.name.endswith(ALIAS_INDEX_EXTENSION)),
+            key=lambda entry: entry.stat().st_mtime, reverse=True,
+        )
+        stale_paths = [entry.path for entry in index_entries[self.keep_files:]]
+
+        kept_hashes = {entry.name.split(".")[0] for entry in index_entries[:self.keep_files]}
+        for entry in entries:
+            if entry.name.endswith(REVISION_POINTER_EXTENSION):
+                with open(entry.path, "r", encoding="utf-8") as pointer_file:
+                    if pointer_file.read().strip() not in kept_hashes:
+                        stale_paths.append(entry.path)
+
+        # Файлы могут одновременно удалять другие процессы; уже открытые отображения остаются валидными
+        for stale_path in stale_paths:
+            try:
+                os.remove(stale_path)
+            except FileNotFoundError:
+                pass
+
+
+def load_alias_index(companies_dataframe: pd.DataFrame, content_hash: Optional[str] = None,
+                     revision: Optional[str] = None) -> AliasIndex:
+    """
+    Возвращает индекс псевдонимов для данных CRM, используя каталог ALIAS_INDEX_DIRECTORY.
+    Если каталог не задан, маппинги строятся в памяти.
+    Args: companies_dataframe: DataFrame с данными о компаниях
+        content_hash: Хэш исходных строк (вычисляется, если не передан)
+        revision: Ревизия источника
+    Returns: Индекс псевдонимов
+    """
+    content_hash = content_hash or hash_companies_dataframe(companies_dataframe)
+    if not ALIAS_INDEX_DIRECTORY:
+        return AliasIndex(*build_company_mappings(companies_dataframe), content_hash)
+    return AliasIndexStore().load_or_build(companies_dataframe, content_hash, revision)
@@ -0,0 +1,153 @@
+from collections import deque
+from typing import Optional
+
+from fuzzy_matcher import FUZZY_MATCH_THRESHOLD, FuzzyAliasIndex
+
+
+def _is_word_char(char: str) -> bool:
+    """Проверяет, является ли символ частью слова (буква или цифра)"""
+    return char.isalnum()
+
+
+class AliasMatcher:
+    """
+    Автомат Ахо–Корасик для поиска псевдонимов компаний в тексте за один линейный проход.
+    Строится один раз из маппинга псевдонимов на номера компаний в таблице CRM.
+    """
+
+    def __init__(self, alias_to_company_id: dict[str, int], fuzzy_threshold: float = FUZZY_MATCH_THRESHOLD):
+        """
+        Args: alias_to_company_id: Маппинг нормализованных псевдонимов на номера компаний
+            fuzzy_threshold: Порог сходства для нечеткого поиска псевдонимов (0 — без нечеткого поиска)
+        """
+        self._company_ids: list[int] = []
+        self._alias_lengths: list[int] = []
+        # Нужна ли проверка границы слова слева/справа (только если псевдоним начинается/заканчивается буквой)
+        self._check_left_boundary: list[bool] = []
+        self._check_right_boundary: list[bool] = []
+
+        # Узлы бора: переходы, суффиксные ссылки, терминальный псевдоним и ссылка на ближайший терминальный суффикс
+        self._transitions: list[dict[str, int]] = [{}]
+        self._fail_links: list[int] = [0]
+        self._terminal_alias: list[int] = [-1]
+        self._output_links: list[int] = [0]
+
+        for alias, company_id in alias_to_company_id.items():
+            if alias:
+                self._add_alias(alias, company_id)
+
+        self._build_links()
+        # Узел, с которого начинается перебор совпадений: сам узел, если в нем заканчивается псевдоним,
+        # иначе ближайший терминальный суффикс (0 — совпадений нет)
+        self._match_links = [node if alias_id >= 0 else output_link
+                             for node, (alias_id, output_link) in enumerate(zip(self._terminal_alias,
+                                                                                self._output_links))]
+
+        # Индекс триграмм для опечаток и транслитерации в свободных упоминаниях
+        self.fuzzy_index = FuzzyAliasIndex(alias_to_company_id, fuzzy_threshold) if fuzzy_threshold > 0 else None
+
+    def __len__(self) -> int:
+        return len(self._company_ids)
+
+    def _add_alias(self, alias: str, company_id: int) -> None:
+        """Добавляет псевдоним в бор"""
+        node = 0
+        for char in alias:
+            next_node = self._transitions[node].get(char)
+            if next_node is None:
+                next_node = len(self._transitions)
+                self._transitions[node][char] = next_node
+                self._transitions.append({})
+                self._fail_links.append(0)
+                self._terminal_alias.append(-1)
+                self._output_links.append(0)
+            node = next_node
+
+        alias_id = self._terminal_alias[node]
+        if alias_id < 0:
+            alias_id = len(self._company_ids)
+            self._terminal_alias[node] = alias_id
+            self._company_ids.append(company_id)
+            self._alias_lengths.append(len(alias))
+            self._check_left_boundary.append(_is_word_char(alias[0]))
+            self._check_right_boundary.append(_is_word_char(alias[-1]))
+        else:
+            self._company_ids[alias_id] = company_id
+
+    def _build_links(self) -> None:
+        """Строит суффиксные ссылки обходом бора в ширину"""
+        nodes_to_visit = deque(self._transitions[0].values())
+
+        while nodes_to_visit:
+            node = nodes_to_visit.popleft()
+            for char, child in self._transitions[node].items():
+                fail_node = self._fail_links[node]
+                while fail_node and char not in self._transitions[fail_node]:
+                    fail_node = self._fail_links[fail_node]
+                self._fail_links[child] = self._transitions[fail_node].get(char, 0)
+
+                # Ссылка на ближайший по суффиксам узел, в котором заканчивается псевдоним
+                fail_child = self._fail_links[child]
+                self._output_links[child] = (fail_child if self._terminal_alias[fail_child] >= 0
+                                             else self._output_links[fail_child])
+                nodes_to_visit.append(child)
+
+    def find_matches(self, text: str) -> list[tuple[int, int, int]]:
+        """
+        Находит псевдонимы в нормализованном тексте с учетом границ слов.
+        Из пересекающихся совпадений выбирается самое левое, а среди них самое длинное.
+        Args: text: Нормализованный текст
+        Returns: Список (начало, конец, номер компании), упорядоченный по позиции
+        """
+        transitions = self._transitions
+        fail_links = self._fail_links
+        terminal_alias = self._terminal_alias
+        output_links = self._output_links
+        match_links = self._match_links
+        text_length = len(text)
+
+        candidates = []
+        node = 0
+        for position, char in enumerate(text):
+            # Обычно переход находится сразу, поэтому словарь узла проверяется одним get
+            next_node = transitions[node].get(char)
+            while next_node is None and node:
+                node = fail_links[node]
+                next_node = transitions[node].get(char)
+            node = next_node or 0
+
+            match_node = match_links[node]
+            while match_node:
+                alias_id = terminal_alias[match_node]
+                end = position + 1
+                start = end - self._alias_lengths[alias_id]
+
+                left_ok = (not self._check_left_boundary[alias_id] or start == 0
+                           or not _is_word_char(text[start - 1]))
+                right_ok = (not self._check_right_boundary[alias_id] or end == text_length
+                            or not _is_word_char(text[end]))
+                if left_ok and right_ok:
+                    candidates.append((start, end, alias_id))
+
+                match_node = output_links[match_node]
+
+        candidates.sort(key=lambda candidate: (candidate[0], -candidate[1]))
+
+        matches = []
+        last_end = 0
+        for start, end, alias_id in candidates:
+            if start >= last_end:
+                matches.append((start, end, self._company_ids[alias_id]))
+                last_end = end
+
+        return matches
+
+    def find_similar(self, mention: str) -> Optional[int]:
+        """
+        Находит компанию по упоминанию с опечаткой или в другой раскладке.
+        Args: mention: Нормализованное упоминание, не совпавшее ни с одним псевдонимом
+        Returns: Номер компании или None, если похожего псевдонима нет
+        """
+        if self.fuzzy_index is None:
+            return None
+        return self.fuzzy_index.find(mention)
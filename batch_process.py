@@ -0,0 +1,277 @@
+"""
+Пакетная обработка выгрузок без Telegram.
+Обрабатывает файлы, каталоги и шаблоны glob тем же конвейером, что и бот (mention_engine),
+в нескольких процессах. Снимок CRM и автомат поиска загружаются один раз: при запуске процессов
+через fork они наследуются без копирования. Для каждого файла пишется свой отчет, после чего
+статистика объединяется в общий отчет, который можно дополнительно записать в Google Таблицу.
+Посты попадают в хранилище упоминаний (MENTION_STORE_PATH), как при загрузке через бота.
+
+Запуск из корня репозитория:
+    python batch_process.py exports/ --output-dir reports --formats xlsx,csv
+    python batch_process.py 'exports/**/*.csv.gz' --crm-file crm.xlsx --workers 4 --google
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+
+from dotenv import load_dotenv
+
+# Настройки модулей (MENTION_STORE_PATH, REPORT_FORMAT и др.) читаются при импорте, поэтому .env загружается раньше
+load_dotenv()
+
+from company_mentions import MentionAggregator
+from config import parse_names
+from crm_cache import CrmSnapshot
+from crm_sources import UploadedWorkbookCrmSource, has_crm_sheet
+from instrumentation import job_trace
+from logger import get_logger
+from mention_engine import get_engine
+from parallel_matching import resolve_start_method
+from post_readers import detect_post_format
+from report_sinks import MERGED_REPORT, PROCESSED_REPORT, ReportOutput
+from report_writer import REPORT_FORMAT
+
+logger = get_logger()
+
+# Источники CRM по умолчанию: локальный файл, Google Таблица, лист "для ВПР" первого xlsx из пакета
+DEFAULT_BATCH_CRM_SOURCES = "file,google,upload"
+DEFAULT_OUTPUT_DIRECTORY = "batch_reports"
+
+# Снимок CRM, общий для всех файлов пакета (в процессах пула наследуется при fork или загружается при старте)
+_batch_snapshot: Optional[CrmSnapshot] = None
+
+
+class BatchFileResult:
+    """Итог обработки одного файла пакета"""
+
+    def __init__(self, file_path: str, seconds: float, aggregator: Optional[MentionAggregator] = None,
+                 report_outputs: Optional[list[ReportOutput]] = None, error: Optional[str] = None):
+        """
+        Args: file_path: Путь к файлу
+            seconds: Время обработки
+            aggregator: Статистика упоминаний по файлу (None при ошибке)
+            report_outputs: Записанные отчеты по файлу
+            error: Текст ошибки, если файл не обработан
+        """
+        self.file_path = file_path
+        self.seconds = seconds
+        self.aggregator = aggregator
+        self.report_outputs = report_outputs or []
+        self.error = error
+
+
+def _init_batch_worker(source_names: Sequence[str], crm_workbook: Optional[str]) -> None:
+    """Загружает снимок CRM в процессе пула, если он не унаследован от родителя"""
+    global _batch_snapshot
+    if _batch_snapshot is None:
+        _batch_snapshot = get_engine().load_crm(source_names, crm_workbook)
+
+
+def process_batch_file(file_path: str, path_prefix: str, sink_names: Sequence[str]) -> BatchFileResult:
+    """
+    Обрабатывает один файл пакета по общему снимку CRM. Ошибка не прерывает пакет, а возвращается в итоге.
+    Args: file_path: Путь к файлу с постами
+        path_prefix: Префикс пути для отчетов по файлу
+        sink_names: Получатели отчета по файлу (пустой список — отчет по файлу не пишется)
+    Returns: Итог обработки файла
+    """
+    engine = get_engine()
+    start_time = time.perf_counter()
+    try:
+        with job_trace("batch_file", file=os.path.basename(file_path)):
+            aggregator = engine.match_file(file_path, None, _batch_snapshot)
+            report_outputs = engine.write_reports(aggregator, _batch_snapshot.canonical_to_crm, PROCESSED_REPORT,
+                                                  path_prefix, sink_names)
+    except Exception as error:
+        logger.error("Ошибка пакетной обработки файла %s: %s", file_path, error, exc_info=True)
+        return BatchFileResult(file_path, time.perf_counter() - start_time, error=f"{type(error).__name__}: {error}")
+    return BatchFileResult(file_path, time.perf_counter() - start_time, aggregator, report_outputs)
+
+
+def collect_input_files(inputs: Sequence[str], recursive: bool = False,
+                        exclude_directory: Optional[str] = None) -> list[str]:
+    """
+    Раскрывает файлы, каталоги и шаблоны glob в список файлов с постами без повторов.
+    Файлы из каталогов и шаблонов в неподдерживаемых форматах пропускаются.
+    Args: inputs: Пути к файлам, каталогам или шаблоны glob
+        recursive: Обходить вложенные каталоги
+        exclude_directory: Каталог, файлы из которого не обрабатываются (каталог отчетов)
+    Returns: Пути к файлам в порядке аргументов, внутри каталога и шаблона — по алфавиту
+    """
+    excluded_prefix = os.path.join(os.path.abspath(exclude_directory), "") if exclude_directory else None
+    file_paths: dict[str, None] = {}
+
+    for input_path in inputs:
+        if os.path.isfile(input_path):
+            file_paths[input_path] = None
+            continue
+
+        if os.path.isdir(input_path):
+            pattern = os.path.join(input_path, "**", "*") if recursive else os.path.join(input_path, "*")
+        else:
+            pattern = input_path
+        matched_paths = sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+        if not matched_paths:
+            logger.warning("Нет файлов для %s", input_path)
+
+        for file_path in matched_paths:
+            if excluded_prefix and os.path.abspath(file_path).startswith(excluded_prefix):
+                continue
+            try:
+                detect_post_format(file_path)
+            except ValueError:
+                logger.info("Файл %s пропущен: формат не поддерживается", file_path)
+                continue
+            file_paths[file_path] = None
+
+    return list(file_paths)
+
+
+def build_path_prefixes(file_paths: Sequence[str], output_directory: str) -> list[str]:
+    """
+    Формирует префиксы путей отчетов по файлам в каталоге отчетов.
+    Одноименные файлы из разных каталогов получают номер, чтобы отчеты не перезаписывали друг друга.
+    """
+    used_prefixes: set[str] = set()
+    path_prefixes = []
+    for file_path in file_paths:
+        stem = os.path.basename(file_path)
+        if stem.lower().endswith(".gz"):
+            stem = stem[:-len(".gz")]
+        stem = os.path.splitext(stem)[0]
+
+        path_prefix = os.path.join(output_directory, stem)
+        duplicate_number = 2
+        while path_prefix in used_prefixes:
+            path_prefix = os.path.join(output_directory, f"{stem}_{duplicate_number}")
+            duplicate_number += 1
+        used_prefixes.add(path_prefix)
+        path_prefixes.append(path_prefix)
+    return path_prefixes
+
+
+def find_crm_workbook(file_paths: Sequence[str]) -> Optional[str]:
+    """Возвращает первый xlsx пакета с листом "для ВПР" (None — такого файла нет)"""
+    for file_path in file_paths:
+        try:
+            if detect_post_format(file_path) == "xlsx" and has_crm_sheet(file_path):
+                return file_path
+        except ValueError:
+            continue
+    return None
+
+
+def run_batch(file_paths: Sequence[str], output_directory: str, source_names: Sequence[str],
+              file_sink_names: Sequence[str], merged_sink_names: Sequence[str],
+              workers: int) -> tuple[list[BatchFileResult], list[ReportOutput]]:
+    """
+    Обрабатывает файлы пакета и записывает объединенный отчет.
+    Args: file_paths: Файлы с постами
+        output_directory: Каталог отчетов
+        source_names: Источники CRM в порядке приоритета
+        file_sink_names: Получатели отчетов по файлам
+        merged_sink_names: Получатели объединенного отчета
+        workers: Количество процессов
+    Returns: Кортеж (итоги по файлам в порядке file_paths, записанные объединенные отчеты)
+    """
+    global _batch_snapshot
+    engine = get_engine()
+    os.makedirs(output_directory, exist_ok=True)
+
+    crm_workbook = find_crm_workbook(file_paths) if UploadedWorkbookCrmSource.name in source_names else None
+    _batch_snapshot = engine.load_crm(source_names, crm_workbook)
+    # Автомат строится до запуска пула, чтобы процессы унаследовали его при fork
+    _batch_snapshot.alias_matcher
+    logger.info("Пакет: %d файлов, CRM: %d компаний, %d псевдонимов", len(file_paths),
+                len(_batch_snapshot.canonical_to_crm), len(_batch_snapshot.alias_to_company_id))
+
+    path_prefixes = build_path_prefixes(file_paths, output_directory)
+    with job_trace("batch", files=len(file_paths), workers=workers):
+        if workers <= 1 or len(file_paths) <= 1:
+            file_results = [process_batch_file(file_path, path_prefix, file_sink_names)
+                            for file_path, path_prefix in zip(file_paths, path_prefixes)]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(file_paths)),
+                                     mp_context=multiprocessing.get_context(resolve_start_method()),
+                                     initializer=_init_batch_worker,
+                                     initargs=(tuple(source_names), crm_workbook)) as executor:
+                file_results = list(executor.map(process_batch_file, file_paths, path_prefixes,
+                                                 [tuple(file_sink_names)] * len(file_paths)))
+
+        # Статистика объединяется в порядке файлов, поэтому объединенный отчет не зависит от числа процессов
+        merged_aggregator = MentionAggregator()
+        for file_result in file_results:
+            if file_result.aggregator is not None:
+                merged_aggregator.merge(file_result.aggregator)
+                # Статистика по файлу больше не нужна
+                file_result.aggregator = None
+
+        merged_outputs = engine.write_reports(merged_aggregator, _batch_snapshot.canonical_to_crm, MERGED_REPORT,
+                                              os.path.join(output_directory, "batch"), merged_sink_names)
+    return file_results, merged_outputs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Пакетная обработка выгрузок с постами без Telegram")
+    parser.add_argument("inputs", nargs="+", help="Файлы, каталоги или шаблоны glob (например, 'exports/**/*.xlsx')")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIRECTORY, help="Каталог для отчетов")
+    parser.add_argument("--formats", default=REPORT_FORMAT,
+                        help="Форматы файлов отчетов через запятую (xlsx, csv, parquet)")
+    parser.add_argument("--crm-file", default=None,
+                        help="xlsx с листом 'для ВПР' (по умолчанию CRM_FILE_PATH)")
+    parser.add_argument("--crm-sources", default=DEFAULT_BATCH_CRM_SOURCES,
+                        help="Источники CRM в порядке приоритета (file, google, upload)")
+    parser.add_argument("--workers", type=int, default=0, help="Количество процессов (0 — по числу ядер)")
+    parser.add_argument("--recursive", action="store_true", help="Обходить вложенные каталоги")
+    parser.add_argument("--no-per-file", action="store_true", help="Не писать отчеты по отдельным файлам")
+    parser.add_argument("--google", action="store_true",
+                        help="Записать объединенный отчет в Google Таблицу GOOGLE_SHEET_KEY")
+    arguments = parser.parse_args()
+
+    if arguments.crm_file:
+        # Ядро читает путь к CRM из окружения, в том числе в процессах пула
+        os.environ["CRM_FILE_PATH"] = arguments.crm_file
+
+    file_paths = collect_input_files(arguments.inputs, arguments.recursive, arguments.output_dir)
+    if not file_paths:
+        print("Нет файлов для обработки")
+        sys.exit(1)
+
+    formats = parse_names(arguments.formats)
+    file_sink_names = () if arguments.no_per_file else formats
+    merged_sink_names = formats + (("google",) if arguments.google else ())
+    # Ненастроенные получатели обнаруживаются до обработки
+    for sink_name in merged_sink_names:
+        get_engine().get_report_sink(sink_name)
+
+    workers = arguments.workers if arguments.workers > 0 else os.cpu_count() or 1
+    print(f"Файлов: {len(file_paths)}, процессов: {min(workers, len(file_paths))}", flush=True)
+
+    start_time = time.perf_counter()
+    file_results, merged_outputs = run_batch(file_paths, arguments.output_dir, parse_names(arguments.crm_sources),
+                                             file_sink_names, merged_sink_names, workers)
+
+    failed_results = [file_result for file_result in file_results if file_result.error is not None]
+    for file_result in file_results:
+        if file_result.error is not None:
+            print(f"  ОШИБКА {file_result.file_path}: {file_result.error}")
+        else:
+            locations = ", ".join(output.file_path for output in file_result.report_outputs) or "без отчета"
+            print(f"  {file_result.file_path}: {file_result.seconds:.2f} с -> {locations}")
+
+    for merged_output in merged_outputs:
+        print(f"Объединенный отчет ({merged_output.rows} компаний): {merged_output.file_path or merged_output.url}")
+    print(f"Обработано файлов: {len(file_results) - len(failed_results)} из {len(file_results)} "
+          f"за {time.perf_counter() - start_time:.2f} с")
+
+    if failed_results:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
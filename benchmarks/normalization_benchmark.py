@@ -0,0 +1,198 @@
+"""
+Микробенчмарк нормализации и поиска упоминаний в одном посте.
+Сравнивает исходную обработку (re.split по разделителям, нормализация каждого фрагмента строковыми
+шаблонами re и поиск фрагмента в маппинге псевдонимов) с рабочим путем: prepare_text_for_matching
+и find_company_mentions_in_post с автоматом псевдонимов.
+Функции legacy_* скопированы из исходной версии без изменений (в том числе замена ё до приведения
+к нижнему регистру, из-за которой заглавная Ё в исходной версии не заменялась).
+
+Запуск из корня репозитория: python -m benchmarks.normalization_benchmark
+"""
+import argparse
+import random
+import re
+import timeit
+
+import pandas as pd
+
+from alias_matcher import AliasMatcher
+from company_mentions import build_company_mappings, find_company_mentions_in_post
+from text_normalization import GENERIC_STOP_WORDS, normalize_text, prepare_text_for_matching, strip_gpt_prefix
+
+LEGACY_COMPANY_LEGAL_FORMS = {"ооо", "ао", "пао", "зао", "ao", "pjsc", "llc", "inc", "co", "corp", "gmbh"}
+
+SAMPLE_COMPANIES = [
+    "ООО «Яндекс»", "Сбер", "Альфа-Банк", "МТС", "Ozon", "Т-Банк", "Газпром нефть", "Ростелеком",
+    "X5 Group", "Ёлка Лаб", "Лаборатория Касперского", "VK", "Авито", "ПАО Северсталь", "ЛУКОЙЛ",
+]
+SAMPLE_SEPARATORS = [", ", "; ", "\n", " • ", " / ", " | "]
+SAMPLE_PREFIXES = ["Компании: ", "Упоминания: ", ""]
+
+
+def legacy_normalize_text(text: str) -> str:
+    """
+    Нормализует текст: приводит к нижнему регистру, заменяет ё на е, удаляет лишние пробелы и символы.
+    Args: text: Исходный текст
+    Returns: Нормализованный текст
+    """
+    if pd.isna(text):
+        return ""
+
+    normalized = (str(text)
+                  .replace("ё", "е")
+                  .strip()
+                  .lower())
+    normalized = re.sub(r"\s+", " ", normalized)
+    normalized = normalized.strip("«»\"'()[]")
+
+    return normalized
+
+
+def legacy_extract_company_mentions_from_text(text: str) -> list[str]:
+    """
+    Извлекает упоминания компаний из текста, обработанного GPT.
+    Args: text: Текст с упоминаниями компаний
+    Returns: Список найденных упоминаний компаний
+    """
+    if pd.isna(text):
+        return []
+
+    # Удаляем префикс перед двоеточием если есть
+    text_after_colon = text.split(":", 1)[1] if ":" in text else text
+
+    # Разделяем текст по различным разделителям
+    separators = r"[;,•/|—\-–\n\.]"
+    parts = re.split(separators, text_after_colon)
+
+    mentions = []
+    for part in parts:
+        normalized_part = legacy_normalize_text(part)
+        if normalized_part:
+            mentions.append(normalized_part)
+
+    return mentions
+
+
+def legacy_is_valid_company_name(company_name: str) -> bool:
+    """
+    Проверяет, является ли название компании валидным для обработки.
+    Args: company_name: Название компании для проверки
+    Returns: True если название валидно, иначе False
+    """
+    if not company_name:
+        return False
+
+    # Исключаем общие стоп-слова
+    if company_name in {"vk", "вк", "vk.com"}:
+        return False
+
+    # Исключаем чисто числовые значения
+    if company_name.isdigit():
+        return False
+    # Исключаем слишком короткие названия
+    if len(company_name) <= 2:
+        return False
+
+    # Исключаем общие стоп-слова
+    if company_name in GENERIC_STOP_WORDS:
+        return False
+
+    # Удаляем юридические формы и проверяем остаток
+    legal_forms_pattern = r"\b(" + "|".join(LEGACY_COMPANY_LEGAL_FORMS) + r")\b\.?"
+    name_without_legal_form = re.sub(legal_forms_pattern, "", company_name).strip()
+
+    return bool(name_without_legal_form)
+
+
+def legacy_find_company_mentions_in_post(post_gpt_text: str, alias_to_canonical_mapping: dict) -> set[str]:
+    """
+    Находит упоминания компаний в тексте поста.
+    Args: post_gpt_text: Текст поста, обработанный GPT
+        alias_to_canonical_mapping: Маппинг псевдонимов на канонические названия
+    Returns: Множество найденных компаний (канонические названия и валидные свободные упоминания)
+    """
+    mentioned_companies = set()
+    extracted_mentions = legacy_extract_company_mentions_from_text(post_gpt_text)
+
+    for mention in extracted_mentions:
+        # Проверяем прямое соответствие в маппинге
+        if mention in alias_to_canonical_mapping:
+            mentioned_companies.add(alias_to_canonical_mapping[mention])
+            continue
+
+        # Пробуем удалить юридическую форму и проверить снова
+        legal_forms_pattern = r"\b(" + "|".join(LEGACY_COMPANY_LEGAL_FORMS) + r")\b\.?"
+        mention_without_legal_form = re.sub(legal_forms_pattern, "", mention).strip()
+
+        if (mention_without_legal_form and 
+            mention_without_legal_form in alias_to_canonical_mapping):
+            mentioned_companies.add(alias_to_canonical_mapping[mention_without_legal_form])
+            continue
+
+        # Добавляем валидные свободные упоминания
+        if legacy_is_valid_company_name(mention):
+            mentioned_companies.add(mention)
+
+    return mentioned_companies
+
+
+def generate_posts(posts_count: int, seed: int = 42) -> list[tuple[str, list[str]]]:
+    """Генерирует синтетические тексты GPT с разными разделителями и списками упомянутых компаний"""
+    generator = random.Random(seed)
+    posts = []
+    for _ in range(posts_count):
+        companies = generator.sample(SAMPLE_COMPANIES, generator.randint(1, 6))
+        separator = generator.choice(SAMPLE_SEPARATORS)
+        posts.append((generator.choice(SAMPLE_PREFIXES) + separator.join(companies), companies))
+    return posts
+
+
+def prepare_posts_legacy(posts: list[str]) -> int:
+    """Нормализует фрагменты постов исходными функциями"""
+    return sum(len(mention) for post in posts for mention in legacy_extract_company_mentions_from_text(post))
+
+
+def prepare_posts_current(posts: list[str]) -> int:
+    """Подготавливает посты к поиску псевдонимов так же, как find_company_mentions_in_post"""
+    return sum(len(prepare_text_for_matching(strip_gpt_prefix(post))) for post in posts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Микробенчмарк нормализации текста постов")
+    parser.add_argument("--posts", type=int, default=10000, help="Количество синтетических постов")
+    parser.add_argument("--repeat", type=int, default=5, help="Количество повторов замера")
+    arguments = parser.parse_args()
+
+    generated_posts = generate_posts(arguments.posts)
+    posts = [post for post, _ in generated_posts]
+    alias_to_company_id, canonical_to_crm = build_company_mappings(pd.DataFrame({"Полное имя": SAMPLE_COMPANIES}))
+    alias_matcher = AliasMatcher(alias_to_company_id)
+    # Исходный код хранил в маппинге канонические названия
+    alias_to_canonical = {alias: canonical_to_crm.canonical_names[company_id]
+                          for alias, company_id in alias_to_company_id.items()}
+
+    # Рабочий путь находит каждую упомянутую компанию под ее каноническим названием в порядке появления
+    # (названия площадок вроде VK псевдонимами не считаются)
+    for post, companies in generated_posts:
+        expected_mentions = [normalize_text(company) for company in companies
+                             if normalize_text(company) in alias_to_canonical]
+        found_mentions = [canonical_to_crm.canonical_names[company_id]
+                          for company_id in find_company_mentions_in_post(post, alias_matcher)]
+        assert found_mentions == expected_mentions, post
+
+    stages = (
+        ("подготовка текста", lambda: prepare_posts_legacy(posts), lambda: prepare_posts_current(posts)),
+        ("поиск упоминаний",
+         lambda: [legacy_find_company_mentions_in_post(post, alias_to_canonical) for post in posts],
+         lambda: [find_company_mentions_in_post(post, alias_matcher) for post in posts]),
+    )
+    for stage_name, legacy_function, current_function in stages:
+        print(stage_name)
+        for label, function in (("до", legacy_function), ("после", current_function)):
+            best_time = min(timeit.repeat(function, number=1, repeat=arguments.repeat))
+            print(f"{label:>8}: {best_time / len(posts) * 1e6:.2f} мкс на пост "
+                  f"({len(posts) / best_time:,.0f} постов/с)")
+
+
+if __name__ == '__main__':
+    main()
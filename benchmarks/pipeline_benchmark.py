@@ -0,0 +1,340 @@
+"""
+Бенчмарк конвейера обработки выгрузки на синтетических данных.
+Генерирует посты VK (лист "vk" с колонкой GPT) и лист CRM "для ВПР" заданного масштаба
+и замеряет каждый этап отдельно: чтение xlsx, построение маппингов и автомата псевдонимов,
+поиск упоминаний, агрегацию, потоковую запись отчета (report_writer.write_report) в каждом из форматов
+и подготовку строк для Google Таблицы.
+Каждый масштаб запускается в отдельном процессе, чтобы пик памяти не накапливался между замерами.
+
+Результаты (время, постов/строк в секунду, пик RSS) сохраняются в JSON. При передаче --baseline
+результаты сравниваются с сохраненными ранее, и при замедлении больше допуска код возврата равен 1.
+
+Запуск из корня репозитория:
+    python -m benchmarks.pipeline_benchmark --scales 1000,10000,100000 --output baseline.json
+    python -m benchmarks.pipeline_benchmark --scales 1000,10000 --baseline baseline.json
+    python -m benchmarks.pipeline_benchmark --scales 100000 --formats xlsx,csv
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import pandas as pd
+
+from alias_matcher import AliasMatcher
+from company_mentions import MentionAggregator, build_company_mappings, find_company_mentions_in_post
+from google_sheet_writer import _prepare_rows
+from post_readers import POSTS_SHEET_NAME, iter_xlsx_posts
+from report_writer import REPORT_WRITERS, report_file_name, write_report
+
+try:
+    import resource
+except ImportError:
+    # Модуля resource нет на Windows: пиковый RSS не замеряется
+    resource = None
+
+CRM_SHEET_NAME = "для ВПР"
+DEFAULT_SCALES = "1000,10000,100000"
+
+SYLLABLES = [
+    "ал", "бе", "ви", "го", "да", "ер", "жи", "зо", "ин", "ка", "ло", "ми", "но", "ор", "пе", "ра",
+    "си", "те", "ум", "фа", "хо", "це", "ча", "ши", "эк", "юн", "яр", "тех", "ком", "пром", "строй", "нефть",
+]
+LATIN_WORDS = ["tech", "group", "labs", "soft", "data", "systems", "digital", "cloud", "bank", "media"]
+LEGAL_FORMS = ["ООО", "АО", "ПАО", "LLC", ""]
+RESPONSIBLE_NAMES = ["Иванова А.", "Петров С.", "Сидорова Е.", "Кузнецов Д.", ""]
+FREE_MENTIONS = ["Стажировка", "Кафедра информатики", "Лютик", "ООО «Рога и копыта»", "vk.com", "123", "Ёжик Инк"]
+GPT_PREFIXES = ["Компании: ", "Упоминания: ", ""]
+GPT_SEPARATORS = [", ", "; ", "\n", " • ", " / ", " | ", " — "]
+LATIN_LOOKALIKES = str.maketrans("абвгдезиклмнопрстуфх", "abvgdeziklmnoprstufh")
+
+
+def generate_company_names(companies_count: int, generator: random.Random) -> list[str]:
+    """Генерирует уникальные названия компаний из слогов (часть — с латинским словом)"""
+    names: dict[str, None] = {}
+    while len(names) < companies_count:
+        name = "".join(generator.choice(SYLLABLES) for _ in range(generator.randint(2, 4))).capitalize()
+        if generator.random() < 0.3:
+            name = f"{name} {generator.choice(LATIN_WORDS).capitalize()}"
+        if generator.random() < 0.2:
+            name = f"{name} {generator.randint(1, 99)}"
+        names[name] = None
+    return list(names)
+
+
+def generate_crm_dataframe(companies_count: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Генерирует лист CRM "для ВПР".
+    Args: companies_count: Количество компаний
+        seed: Зерно генератора случайных чисел
+    Returns: DataFrame с колонками листа CRM
+    """
+    generator = random.Random(seed)
+    rows = []
+    for number, name in enumerate(generate_company_names(companies_count, generator), start=1):
+        legal_form = generator.choice(LEGAL_FORMS)
+        aliases = []
+        if generator.random() < 0.3:
+            aliases.append(name.lower().translate(LATIN_LOOKALIKES))
+        if generator.random() < 0.2:
+            aliases.append(name.split()[0][:6])
+        rows.append({
+            "#": number,
+            "Полное имя": f"{legal_form} «{name}»" if legal_form else name,
+            "Also known as (AKA)": ", ".join(aliases) if aliases else None,
+            "Ответственный ДК": generator.choice(RESPONSIBLE_NAMES),
+            "Ответственный Media": generator.choice(RESPONSIBLE_NAMES) or None,
+        })
+    return pd.DataFrame(rows)
+
+
+def _make_typo(name: str, generator: random.Random) -> str:
+    """Удаляет или переставляет одну букву названия"""
+    if len(name) < 5:
+        return name
+    position = generator.randrange(1, len(name) - 2)
+    if generator.random() < 0.5:
+        return name[:position] + name[position + 1:]
+    return name[:position] + name[position + 1] + name[position] + name[position + 2:]
+
+
+def generate_posts_dataframe(posts_count: int, crm_dataframe: pd.DataFrame, seed: int = 42) -> pd.DataFrame:
+    """
+    Генерирует лист постов VK с текстами GPT: названия и псевдонимы из CRM, опечатки,
+    свободные упоминания и пустые ответы, разделенные разными разделителями.
+    Args: posts_count: Количество постов
+        crm_dataframe: Лист CRM, из которого берутся названия
+        seed: Зерно генератора случайных чисел
+    Returns: DataFrame с колонками "Пост", "Группа", "GPT"
+    """
+    generator = random.Random(seed + 1)
+    canonical_names = crm_dataframe["Полное имя"].tolist()
+    aliases = [alias for value in crm_dataframe["Also known as (AKA)"].dropna() for alias in value.split(", ")]
+    # Популярные компании упоминаются чаще: выбираем из небольшого "горячего" набора
+    hot_names = canonical_names[:max(10, len(canonical_names) // 100)]
+
+    rows = []
+    for post_number in range(posts_count):
+        mentions_count = generator.choice([0, 1, 1, 2, 2, 3, 4, 6])
+        mentions = []
+        for _ in range(mentions_count):
+            kind = generator.random()
+            if kind < 0.35:
+                mentions.append(generator.choice(hot_names))
+            elif kind < 0.6:
+                mentions.append(generator.choice(canonical_names))
+            elif kind < 0.75 and aliases:
+                mentions.append(generator.choice(aliases))
+            elif kind < 0.85:
+                mentions.append(_make_typo(generator.choice(canonical_names), generator))
+            else:
+                mentions.append(generator.choice(FREE_MENTIONS))
+
+        if mentions:
+            gpt_text = generator.choice(GPT_PREFIXES) + generator.choice(GPT_SEPARATORS).join(mentions)
+        else:
+            gpt_text = generator.choice([None, "Нет компаний", ""])
+
+        group_number = generator.randrange(max(1, posts_count // 20))
+        # Часть постов повторяется (репосты), часть без ссылки на пост
+        post_link = (f"https://vk.com/wall-{group_number}_{generator.randrange(posts_count)}"
+                     if generator.random() < 0.95 else None)
+        rows.append({
+            "Пост": post_link,
+            "Группа": f"https://vk.com/club{group_number}",
+            "GPT": gpt_text,
+        })
+    return pd.DataFrame(rows)
+
+
+def _peak_rss_megabytes() -> Optional[float]:
+    """Возвращает пиковый RSS процесса в мегабайтах (ru_maxrss — в КБ на Linux и в байтах на macOS)"""
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class StageTimer:
+    """Замеряет этапы конвейера: время, пропускную способность и рост пика RSS"""
+
+    def __init__(self):
+        self.stages: dict[str, dict] = {}
+
+    def run(self, stage_name: str, function: Callable, rows_count: Optional[int] = None):
+        """
+        Выполняет этап и сохраняет его замер.
+        Args: stage_name: Название этапа
+            function: Функция без аргументов, выполняющая этап
+            rows_count: Количество обрабатываемых строк (для пропускной способности)
+        Returns: Результат функции
+        """
+        rss_before = _peak_rss_megabytes()
+        start_time = time.perf_counter()
+        result = function()
+        elapsed_seconds = time.perf_counter() - start_time
+        peak_rss = _peak_rss_megabytes()
+
+        self.stages[stage_name] = {
+            "seconds": round(elapsed_seconds, 6),
+            "rows": rows_count,
+            "rows_per_second": round(rows_count / elapsed_seconds, 1) if rows_count and elapsed_seconds else None,
+            "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None,
+            "rss_growth_mb": round(peak_rss - rss_before, 1) if peak_rss is not None else None,
+        }
+        print(f"  {stage_name:<24} {elapsed_seconds:>9.3f} с"
+              + (f"  {rows_count / elapsed_seconds:>12,.0f} строк/с" if rows_count and elapsed_seconds else "")
+              + (f"  пик RSS {peak_rss:,.0f} МБ" if peak_rss is not None else ""), flush=True)
+        return result
+
+
+def run_scale(posts_count: int, companies_count: int, seed: int, report_formats: tuple[str, ...]) -> dict:
+    """
+    Генерирует данные одного масштаба и замеряет все этапы конвейера.
+    Args: posts_count: Количество постов
+        companies_count: Количество компаний в CRM
+        seed: Зерно генератора случайных чисел
+        report_formats: Форматы файла отчета (ключи REPORT_WRITERS)
+    Returns: Словарь с замерами этапов
+    """
+    crm_dataframe = generate_crm_dataframe(companies_count, seed)
+    posts_dataframe = generate_posts_dataframe(posts_count, crm_dataframe, seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        upload_path = os.path.join(directory, "upload.xlsx")
+        with pd.ExcelWriter(upload_path) as writer:
+            posts_dataframe.to_excel(writer, sheet_name=POSTS_SHEET_NAME, index=False)
+            crm_dataframe.to_excel(writer, sheet_name=CRM_SHEET_NAME, index=False)
+        del posts_dataframe, crm_dataframe
+
+        timer = StageTimer()
+        timer.run("read_excel_posts", lambda: pd.read_excel(upload_path, sheet_name=POSTS_SHEET_NAME), posts_count)
+        posts = timer.run("read_xlsx_posts_stream", lambda: list(iter_xlsx_posts(upload_path)), posts_count)
+        crm_dataframe = timer.run("read_excel_crm",
+                                  lambda: pd.read_excel(upload_path, sheet_name=CRM_SHEET_NAME), companies_count)
+
+    alias_to_company_id, canonical_to_crm = timer.run(
+        "build_company_mappings", lambda: build_company_mappings(crm_dataframe), companies_count
+    )
+    alias_matcher = timer.run("build_alias_matcher", lambda: AliasMatcher(alias_to_company_id),
+                              len(alias_to_company_id))
+
+    matched_companies = timer.run(
+        "find_mentions",
+        lambda: [find_company_mentions_in_post(gpt_text, alias_matcher) for _, gpt_text in posts],
+        posts_count,
+    )
+
+    def aggregate() -> MentionAggregator:
+        aggregator = MentionAggregator()
+        for (post_link, _), companies in zip(posts, matched_companies):
+            aggregator.add_post(post_link, companies)
+        return aggregator
+
+    mention_aggregator = timer.run("aggregate", aggregate, posts_count)
+
+    # Файлы отчета пишутся тем же путем, что и в боте: строки потоково, без DataFrame
+    with tempfile.TemporaryDirectory() as directory:
+        for report_format in report_formats:
+            report_path = os.path.join(directory, report_file_name("report.xlsx", report_format))
+            timer.run(f"write_report_{report_format}",
+                      lambda: write_report(mention_aggregator, canonical_to_crm, report_path, report_format, 0),
+                      len(mention_aggregator))
+
+    # Для Google Таблицы отчет по-прежнему собирается в DataFrame
+    report_dataframe = timer.run("build_report_dataframe", lambda: mention_aggregator.build_report(canonical_to_crm),
+                                 len(mention_aggregator))
+    timer.run("report_sheet_rows", lambda: _prepare_rows(report_dataframe), len(report_dataframe))
+
+    return {
+        "posts": posts_count,
+        "companies": companies_count,
+        "aliases": len(alias_to_company_id),
+        "report_rows": len(report_dataframe),
+        "stages": timer.stages,
+    }
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Сравнивает замеры с сохраненной базовой линией.
+    Args: results: Текущие результаты
+        baseline: Результаты базового запуска
+        tolerance: Допустимое относительное замедление (0.25 — на 25%)
+    Returns: Описания этапов, которые замедлились больше допуска
+    """
+    regressions = []
+    for scale, scale_results in results["scales"].items():
+        baseline_stages = baseline.get("scales", {}).get(scale, {}).get("stages", {})
+        for stage_name, stage in scale_results["stages"].items():
+            baseline_stage = baseline_stages.get(stage_name)
+            if not baseline_stage or not baseline_stage["seconds"]:
+                continue
+            slowdown = stage["seconds"] / baseline_stage["seconds"] - 1
+            if slowdown > tolerance:
+                regressions.append(f"{scale} / {stage_name}: {baseline_stage['seconds']:.3f} с -> "
+                                   f"{stage['seconds']:.3f} с (+{slowdown:.0%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк этапов обработки выгрузки на синтетических данных")
+    parser.add_argument("--scales", default=DEFAULT_SCALES,
+                        help="Количества постов через запятую (например, 1000,10000,100000,1000000)")
+    parser.add_argument("--companies", type=int, default=None,
+                        help="Количество компаний в CRM (по умолчанию равно количеству постов)")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора синтетических данных")
+    parser.add_argument("--formats", default=",".join(REPORT_WRITERS),
+                        help="Форматы файла отчета через запятую (xlsx, csv, parquet)")
+    parser.add_argument("--output", default="pipeline_benchmark.json", help="Файл JSON для результатов")
+    parser.add_argument("--baseline", default=None, help="Файл JSON с результатами для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Допустимое замедление этапа (доля)")
+    arguments = parser.parse_args()
+    report_formats = tuple(report_format.strip() for report_format in arguments.formats.split(",")
+                           if report_format.strip())
+    unknown_formats = [report_format for report_format in report_formats if report_format not in REPORT_WRITERS]
+    if unknown_formats:
+        parser.error(f"Неизвестные форматы отчета: {', '.join(unknown_formats)}")
+
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "scales": {},
+    }
+
+    # Каждый масштаб — в отдельном процессе, чтобы пик RSS отражал только его
+    context = multiprocessing.get_context("spawn")
+    for posts_count in (int(scale) for scale in arguments.scales.split(",")):
+        companies_count = arguments.companies or posts_count
+        print(f"Масштаб: {posts_count:,} постов, {companies_count:,} компаний", flush=True)
+        with context.Pool(1) as pool:
+            results["scales"][str(posts_count)] = pool.apply(run_scale, (posts_count, companies_count, arguments.seed,
+                                                                         report_formats))
+
+    with open(arguments.output, "w", encoding="utf-8") as output_file:
+        json.dump(results, output_file, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {arguments.output}")
+
+    if arguments.baseline:
+        with open(arguments.baseline, encoding="utf-8") as baseline_file:
+            regressions = compare_with_baseline(results, json.load(baseline_file), arguments.tolerance)
+        if regressions:
+            print("Замедление относительно базовой линии:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("Замедлений относительно базовой линии нет")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,402 @@
+import time
+
+# Момент загрузки модуля бота: от него отсчитывается время холодного старта
+BOT_MODULE_LOADED_AT = time.perf_counter()
+
+import asyncio
+import os
+import sys
+from typing import TYPE_CHECKING, Optional, Sequence
+
+from telegram import Message, Update
+from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, ContextTypes
+from dotenv import load_dotenv
+
+from config import describe_crm_sources, parse_names
+from instrumentation import span
+from job_scheduler import JobCancelledError, JobScheduler, QueueFullError
+from logger import get_logger
+from metrics import UPLOADS, start_metrics_server
+from progress import PROGRESS_INTERVAL_SECONDS, ProgressChannel, format_progress_message
+
+# Модули обработки (pandas, openpyxl, gspread) импортируются внутри функций: бот начинает принимать
+# обновления сразу, а ядро обработки загружается в фоне после запуска (prewarm_processing)
+if TYPE_CHECKING:
+    from report_sinks import ReportOutput
+
+load_dotenv()
+
+logger = get_logger()
+
+DATA_DIRECTORY = 'data'
+# Целевое время ответа на /start, секунды: более медленные ответы записываются в лог как предупреждение
+START_RESPONSE_TARGET_SECONDS = float(os.getenv("START_RESPONSE_TARGET", "1"))
+# Источники CRM по умолчанию в порядке приоритета: лист "для ВПР" загруженного файла,
+# CRM Google Таблицы (если задан GOOGLE_SHEET_KEY), локальный файл CRM_FILE_PATH
+DEFAULT_CRM_SOURCES = "upload,google,file"
+# Получатели отчета по умолчанию: файл в формате REPORT_FORMAT и лист Google Таблицы (если задан GOOGLE_SHEET_KEY)
+DEFAULT_REPORT_SINKS = "file,google"
+
+
+class BotWorkflow:
+    """Вариант работы бота: откуда берутся данные CRM и куда записывается отчет"""
+
+    def __init__(self, source_names: Sequence[str], sink_names: Sequence[str]):
+        """
+        Args: source_names: Названия источников CRM в порядке приоритета (upload, google, file)
+            sink_names: Названия получателей отчета (file, xlsx, csv, parquet, google)
+        """
+        self.source_names = tuple(source_names)
+        self.sink_names = tuple(sink_names)
+
+    def describe_crm(self) -> str:
+        """Описание источников CRM для приветствия (по переменным окружения, без загрузки ядра обработки)"""
+        return describe_crm_sources(self.source_names)
+
+
+def build_workflow_from_environment() -> BotWorkflow:
+    """
+    Создает вариант работы по переменным CRM_SOURCES и REPORT_SINKS.
+    Без REPORT_SINKS отчет отправляется файлом и, если задан GOOGLE_SHEET_KEY, записывается в Google Таблицу.
+    Returns: Вариант работы бота
+    """
+    sink_names = parse_names(os.getenv("REPORT_SINKS"))
+    if not sink_names:
+        # Получатель google настраивается в ядре обработки по той же переменной GOOGLE_SHEET_KEY
+        sink_names = tuple(name for name in parse_names(DEFAULT_REPORT_SINKS)
+                           if name != "google" or os.getenv("GOOGLE_SHEET_KEY"))
+    return BotWorkflow(parse_names(os.getenv("CRM_SOURCES", DEFAULT_CRM_SOURCES)), sink_names)
+
+
+def prepare_engine(workflow: BotWorkflow) -> None:
+    """
+    Загружает ядро обработки и проверяет, что все получатели отчета варианта работы настроены.
+    Args: workflow: Вариант работы бота
+    Raises: ValueError если получатель отчета неизвестен или не настроен
+    """
+    from mention_engine import get_engine
+
+    engine = get_engine()
+    for sink_name in workflow.sink_names:
+        engine.get_report_sink(sink_name)
+
+
+# Вариант работы задается при запуске бота
+bot_workflow = BotWorkflow(parse_names(DEFAULT_CRM_SOURCES), ("file",))
+job_scheduler = JobScheduler()
+
+
+async def reply_with_report(message: Message, report_outputs: list["ReportOutput"], title: str) -> None:
+    """
+    Отправляет пользователю результаты записи отчета: файлы документами, затем сообщение о том,
+    куда записан отчет (по описаниям получателей, которые действительно его записали), со ссылками на листы.
+    Args: message: Сообщение пользователя
+        report_outputs: Результаты записи отчета
+        title: Начало сообщения, например "✅ Обработка завершена! Отчет сохранен"
+    """
+    links = []
+    for report_output in report_outputs:
+        if report_output.file_path is not None:
+            with open(report_output.file_path, 'rb') as result_file:
+                await message.reply_document(result_file, filename=report_output.file_name)
+        elif report_output.url is not None:
+            links.append(f"📊 Лист '{report_output.sheet_name}':\n{report_output.url}")
+
+    destinations = ", ".join(report_output.description for report_output in report_outputs)
+    await message.reply_text("\n".join([f"{title}: {destinations}", *links]))
+
+
+async def relay_progress(status_message: Message, progress_channel: ProgressChannel, file_name: str) -> None:
+    """
+    Пересылает прогресс задачи пользователю, редактируя сообщение о загрузке не чаще раза в PROGRESS_INTERVAL
+    секунд и только при изменении текста. Работает до отмены.
+    Args: status_message: Сообщение бота о загрузке файла
+        progress_channel: Канал прогресса задачи
+        file_name: Имя загруженного файла
+    """
+    last_text = None
+    while True:
+        await asyncio.sleep(PROGRESS_INTERVAL_SECONDS)
+        try:
+            progress_update = progress_channel.latest()
+            if progress_update is None:
+                continue
+            text = format_progress_message(progress_update, file_name)
+            if text != last_text:
+                await status_message.edit_text(text)
+                last_text = text
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            # Прогресс необязателен: ошибки Telegram (лимиты, удаленное сообщение) не прерывают обработку
+            logger.debug("Не удалось обновить прогресс %s: %s", file_name, error)
+
+
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обрабатывает команду /start"""
+    logger.info("Команда /start от пользователя %s", update.effective_user.id)
+    started_at = time.perf_counter()
+    with span("start_reply"):
+        # Описание CRM строится по настройкам и не ждет загрузки ядра обработки в фоне
+        crm_description = bot_workflow.describe_crm()
+        welcome_message = (
+            "Привет! Отправьте файл с постами для обработки. "
+            "Размер файла не должен превышать 20 МБ\n\n"
+            "Поддерживаются форматы xlsx, csv, csv.gz, parquet и jsonl.\n"
+            f"Данные о компаниях берутся из {crm_description}.\n\n"
+            "/report [начало] [конец] — отчет по всем загруженным постам за период (даты в формате ГГГГ-ММ-ДД)"
+        )
+        await update.message.reply_text(welcome_message)
+
+    response_seconds = time.perf_counter() - started_at
+    if response_seconds > START_RESPONSE_TARGET_SECONDS:
+        logger.warning("Ответ на /start занял %.2f с (цель %.2f с)", response_seconds, START_RESPONSE_TARGET_SECONDS)
+
+
+async def handle_file_upload(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обрабатывает загруженные файлы"""
+    user_id = update.effective_user.id
+    uploaded_file = update.message.document
+
+    logger.info("Получен файл от пользователя %s: %s", user_id, uploaded_file.file_name)
+
+    file_object = await uploaded_file.get_file()
+    # Префикс из идентификаторов не дает параллельным загрузкам перезаписать друг друга
+    file_path = os.path.join(DATA_DIRECTORY, f"{user_id}_{update.message.message_id}_{uploaded_file.file_name}")
+
+    try:
+        # Скачиваем файл
+        with span("download", file=uploaded_file.file_name, size=uploaded_file.file_size):
+            await file_object.download_to_drive(custom_path=file_path)
+        logger.info("Файл сохранен: %s", file_path)
+
+        from mention_engine import process_file_job
+        from post_readers import detect_post_format
+
+        try:
+            post_format = detect_post_format(file_path)
+        except ValueError as error:
+            logger.warning("Файл пользователя %s не поддерживается: %s", user_id, error)
+            UPLOADS.inc(outcome="unsupported")
+            await update.message.reply_text(str(error))
+            return
+        logger.info("Формат файла: %s", post_format)
+
+        # Задача публикует прогресс в канал, а сообщение пользователю обновляется из цикла событий
+        progress_channel = job_scheduler.create_progress_channel()
+        try:
+            job = job_scheduler.submit(user_id, process_file_job, file_path, post_format,
+                                       bot_workflow.source_names, bot_workflow.sink_names, progress_channel,
+                                       progress_channel=progress_channel)
+        except QueueFullError as error:
+            logger.warning("Файл пользователя %s не поставлен в очередь: %s", user_id, error)
+            UPLOADS.inc(outcome="rejected")
+            await update.message.reply_text(f"Не удалось поставить файл в обработку: {error}")
+            return
+
+        queue_position = job_scheduler.queue_position(job)
+        if queue_position:
+            status_message = await update.message.reply_text(
+                f"Файл {uploaded_file.file_name} успешно загружен. Позиция в очереди: {queue_position}. "
+                f"Для отмены отправьте /cancel"
+            )
+        else:
+            status_message = await update.message.reply_text(
+                f"Файл {uploaded_file.file_name} успешно загружен. Обрабатываю..."
+            )
+
+        # Обрабатываем файл в пуле, не блокируя цикл событий
+        progress_task = asyncio.create_task(relay_progress(status_message, progress_channel, uploaded_file.file_name))
+        try:
+            report_outputs = await job.wait()
+        finally:
+            progress_task.cancel()
+
+        await reply_with_report(update.message, report_outputs, "✅ Обработка завершена! Отчет сохранен")
+        logger.info("Обработка файла завершена для пользователя %s", user_id)
+        UPLOADS.inc(outcome="ok")
+
+    except JobCancelledError:
+        logger.info("Обработка файла отменена пользователем %s", user_id)
+        UPLOADS.inc(outcome="cancelled")
+        await update.message.reply_text(f"Обработка файла {uploaded_file.file_name} отменена")
+    except Exception as error:
+        logger.error("Ошибка обработки файла для пользователя %s: %s", user_id, error, exc_info=True)
+        UPLOADS.inc(outcome="error")
+        await update.message.reply_text(f"Ошибка при обработке файла: {error}")
+
+
+async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обрабатывает команду /report [начало] [конец]: отчет по всем загруженным постам за период"""
+    from mention_engine import summary_report_job
+    from mention_store import describe_report_period, parse_report_period
+
+    user_id = update.effective_user.id
+    logger.info("Команда /report от пользователя %s: %s", user_id, context.args)
+
+    try:
+        since, until = parse_report_period(context.args or [])
+    except ValueError as error:
+        await update.message.reply_text(f"{error}. Пример: /report 2025-01-01 2025-01-31")
+        return
+
+    path_prefix = os.path.join(DATA_DIRECTORY, f"{user_id}_{update.message.message_id}")
+    try:
+        job = job_scheduler.submit(user_id, summary_report_job, path_prefix, since, until,
+                                   bot_workflow.source_names, bot_workflow.sink_names)
+    except QueueFullError as error:
+        await update.message.reply_text(f"Не удалось поставить отчет в обработку: {error}")
+        return
+
+    period_description = describe_report_period(since, until)
+    await update.message.reply_text(f"Формирую отчет {period_description}...")
+
+    try:
+        report_outputs = await job.wait()
+        await reply_with_report(update.message, report_outputs, f"Отчет {period_description} сохранен")
+    except JobCancelledError:
+        await update.message.reply_text("Формирование отчета отменено")
+    except Exception as error:
+        logger.error("Ошибка формирования отчета для пользователя %s: %s", user_id, error, exc_info=True)
+        await update.message.reply_text(f"Ошибка при формировании отчета: {error}")
+
+
+async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обрабатывает команду /cancel: отменяет задачи пользователя"""
+    user_id = update.effective_user.id
+    logger.info("Команда /cancel от пользователя %s", user_id)
+
+    cancelled_count = job_scheduler.cancel_user_jobs(user_id)
+    if cancelled_count:
+        await update.message.reply_text(f"Отменено задач: {cancelled_count}")
+    else:
+        await update.message.reply_text("Нет файлов в обработке")
+
+
+async def refresh_crm_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обрабатывает команду /refresh_crm: сбрасывает кэш CRM и загружает данные заново"""
+    from mention_engine import get_engine
+
+    logger.info("Команда /refresh_crm от пользователя %s", update.effective_user.id)
+
+    try:
+        # Загрузка CRM выполняется в отдельном потоке, чтобы не блокировать цикл событий
+        crm_snapshot = await asyncio.to_thread(get_engine().refresh_crm, bot_workflow.source_names)
+    except Exception as error:
+        logger.error("Ошибка обновления CRM: %s", error, exc_info=True)
+        await update.message.reply_text(f"Ошибка при обновлении CRM: {error}")
+        return
+
+    if crm_snapshot is None:
+        await update.message.reply_text("Кэш CRM сброшен: данные будут прочитаны из следующего загруженного файла")
+        return
+    await update.message.reply_text(
+        f"Данные CRM обновлены: {len(crm_snapshot.canonical_to_crm)} компаний, "
+        f"{len(crm_snapshot.alias_to_company_id)} псевдонимов"
+    )
+
+
+async def prewarm_processing(application) -> None:
+    """
+    Подготавливает обработку в фоне после запуска бота: загружает ядро и проверяет получателей отчета,
+    заранее строит автомат поиска по постоянному источнику CRM и запускает процессы пула.
+    Если получатели отчета не настроены, бот останавливается, а ошибка сохраняется в bot_data["startup_error"].
+    Args: application: Приложение бота
+    """
+    try:
+        await asyncio.to_thread(prepare_engine, bot_workflow)
+    except Exception as error:
+        logger.error("Ошибка подготовки ядра обработки: %s", error, exc_info=True)
+        application.bot_data["startup_error"] = error
+        application.stop_running()
+        return
+    logger.info("Ядро обработки загружено через %.2f с после запуска", time.perf_counter() - BOT_MODULE_LOADED_AT)
+
+    from mention_engine import prewarm_engine
+
+    # Снимок CRM и автомат поиска процесса бота нужны пулу потоков, а с fork — и процессам пула
+    await asyncio.to_thread(prewarm_engine, bot_workflow.source_names)
+    job_scheduler.start_workers(prewarm_engine, bot_workflow.source_names)
+    logger.info("Обработка подготовлена через %.2f с после запуска", time.perf_counter() - BOT_MODULE_LOADED_AT)
+
+
+async def start_background_prewarm(application) -> None:
+    """Запускает подготовку обработки, не задерживая начало приема обновлений"""
+    application.create_task(prewarm_processing(application))
+    logger.info("Бот принимает обновления через %.2f с после запуска",
+                time.perf_counter() - BOT_MODULE_LOADED_AT)
+
+
+async def shutdown_job_scheduler(application) -> None:
+    """Останавливает пул обработки и процессы поиска упоминаний ядра при остановке бота"""
+    job_scheduler.shutdown()
+    # Ядро загружается в фоне и могло еще не загрузиться; в пуле процессов у каждого процесса свое ядро
+    mention_engine = sys.modules.get("mention_engine")
+    if mention_engine is not None:
+        mention_engine.close_engine()
+    logger.info("Пул обработки остановлен")
+
+
+def setup_bot_handlers(application) -> None:
+    """Настраивает обработчики команд и сообщений для бота"""
+    application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("cancel", cancel_command))
+    application.add_handler(CommandHandler("refresh_crm", refresh_crm_command))
+    application.add_handler(CommandHandler("report", report_command))
+    application.add_handler(MessageHandler(filters.Document.ALL, handle_file_upload))
+    logger.info("Обработчики бота настроены")
+
+
+def main(workflow: Optional[BotWorkflow] = None) -> None:
+    """
+    Основная функция запуска бота.
+    Args: workflow: Вариант работы (по умолчанию из переменных CRM_SOURCES и REPORT_SINKS)
+    """
+    global bot_workflow
+    logger.info("Запуск бота...")
+
+    # Создаем папку для данных если она не существует
+    if not os.path.exists(DATA_DIRECTORY):
+        os.makedirs(DATA_DIRECTORY)
+        logger.info("Создана директория %s", DATA_DIRECTORY)
+
+    # Проверяем наличие необходимых переменных окружения
+    telegram_bot_token = os.getenv("TELEGRAM_TOKEN")
+    if not telegram_bot_token:
+        logger.error("Не установлена переменная окружения TELEGRAM_TOKEN")
+        raise ValueError("TELEGRAM_TOKEN не установлен")
+
+    bot_workflow = workflow or build_workflow_from_environment()
+    logger.info("Источники CRM: %s, получатели отчета: %s",
+                ", ".join(bot_workflow.source_names), ", ".join(bot_workflow.sink_names))
+
+    # Эндпоинт метрик запускается, если задан METRICS_PORT
+    start_metrics_server()
+
+    try:
+        # Создаем и настраиваем приложение бота
+        # Обновления обрабатываются параллельно, пока файлы ждут своей очереди в пуле
+        bot_application = (ApplicationBuilder()
+                           .token(telegram_bot_token)
+                           .concurrent_updates(True)
+                           .post_init(start_background_prewarm)
+                           .post_shutdown(shutdown_job_scheduler)
+                           .build())
+        setup_bot_handlers(bot_application)
+
+        # Запускаем бота
+        logger.info("Бот запущен и готов к работе")
+        bot_application.run_polling()
+
+        # Неизвестные или ненастроенные получатели отчета обнаруживаются при подготовке ядра, а не на первом файле
+        startup_error = bot_application.bot_data.get("startup_error")
+        if startup_error is not None:
+            raise startup_error
+
+    except Exception as e:
+        logger.error("Критическая ошибка при запуске бота: %s", e, exc_info=True)
+        raise
+
+
+if __name__ == '__main__':
+    main()
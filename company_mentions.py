@@ -0,0 +1,267 @@
+import heapq
+import os
+import sys
+from typing import Iterator, Optional, Sequence, Union
+
+import pandas as pd
+
+from alias_matcher import AliasMatcher
+from crm_table import CrmTable
+from logger import get_logger
+from text_normalization import (
+    MENTION_FRAGMENT_PATTERN, is_missing, is_valid_company_name, normalize_series, normalize_text,
+    prepare_text_for_matching, strip_gpt_prefix,
+)
+
+logger = get_logger()
+
+# Колонки итогового отчета
+REPORT_COLUMNS = [
+    "#", "Компания", "Количество упоминаний", "Ссылки на посты",
+    "Ответственный Ивенты", "Ответственный Медиа", "Есть в СРМ"
+]
+
+# Ограничение количества ссылок в ячейке "Ссылки на посты" (0 — без ограничения)
+MAX_POST_LINKS_PER_COMPANY = int(os.getenv("MAX_POST_LINKS_PER_COMPANY", "0"))
+
+INVALID_ALIASES = {",", ".", "-", "–", "—", "/", "|", "vk", "вк"}
+
+# Компания в результатах поиска: номер компании в таблице CRM или свободное упоминание (нормализованный текст).
+# Названия компаний CRM подставляются из таблицы только при выводе
+CompanyKey = Union[int, str]
+
+
+def _get_column(dataframe: pd.DataFrame, column_name: str, default=None) -> pd.Series:
+    """Возвращает колонку DataFrame или колонку со значением по умолчанию, если ее нет"""
+    if column_name in dataframe.columns:
+        return dataframe[column_name]
+    return pd.Series(default, index=dataframe.index, dtype=object)
+
+
+def build_company_mappings(companies_dataframe: pd.DataFrame) -> tuple[dict[str, int], CrmTable]:
+    """
+    Создает отображение псевдонимов компаний на номера компаний и таблицу CRM с каноническими названиями.
+    Args: companies_dataframe: DataFrame с данными о компаниях
+    Returns: Кортеж (alias_to_company_id, таблица CRM с колонками отчета)
+    """
+    logger.info("Начало построения маппингов компаний")
+
+    # Позиционный индекс нужен для сопоставления псевдонимов со строками
+    companies_dataframe = companies_dataframe.reset_index(drop=True)
+    canonical_names = normalize_series(_get_column(companies_dataframe, "Полное имя", ""))
+    has_canonical_name = canonical_names.ne("").to_numpy()
+    logger.debug("Пропущено строк без канонического названия: %d", (~has_canonical_name).sum())
+
+    companies_with_names = companies_dataframe[has_canonical_name]
+    # Интернированные названия разделяются таблицей CRM и сохраненными упоминаниями
+    canonical_names = canonical_names[has_canonical_name].map(sys.intern)
+
+    # Данные CRM для канонического названия: при повторах остается последняя строка,
+    # порядок компаний — по первому вхождению
+    row_positions = dict(zip(canonical_names, range(len(canonical_names))))
+    canonical_to_crm_data = CrmTable.from_dataframe(list(row_positions),
+                                                    companies_with_names.iloc[list(row_positions.values())])
+    company_ids = canonical_names.map(dict(zip(row_positions, range(len(row_positions)))))
+
+    # Псевдонимы (Also Known As): по одной строке на псевдоним с сохранением порядка исходных строк
+    aka_names = _get_column(companies_with_names, "Also known as (AKA)")
+    aliases = (aka_names[aka_names.notna()]
+               .astype(str)
+               .str.split(",")
+               .explode())
+    alias_pairs = pd.DataFrame({
+        "alias": normalize_series(aliases),
+        "company_id": company_ids.reindex(aliases.index),
+        "row": aliases.index,
+        "order": aliases.groupby(level=0).cumcount(),
+    })
+    canonical_pairs = pd.DataFrame({
+        "alias": canonical_names,
+        "company_id": company_ids,
+        "row": canonical_names.index,
+        "order": -1,
+    })
+    all_pairs = (pd.concat([canonical_pairs, alias_pairs[alias_pairs["alias"].ne("")]])
+                 .sort_values(["row", "order"], kind="stable"))
+
+    # Повторяем порядок построчного обхода: более поздние строки перезаписывают ранние
+    alias_to_company_id = dict(zip(all_pairs["alias"].tolist(), all_pairs["company_id"].astype("int64").tolist()))
+
+    # Очищаем маппинг от невалидных значений
+    valid_two_letter_names = {name for name in canonical_to_crm_data.canonical_names if len(name) == 2}
+    alias_to_company_id = {
+        alias: company_id
+        for alias, company_id in alias_to_company_id.items()
+        if alias not in INVALID_ALIASES and (len(alias) > 2 or alias in valid_two_letter_names)
+    }
+
+    logger.info("Построение маппингов завершено: %d компаний, %d алиасов", len(canonical_to_crm_data),
+                len(alias_to_company_id))
+    return alias_to_company_id, canonical_to_crm_data
+
+
+def find_company_mentions_in_post(post_gpt_text: str, alias_matcher: AliasMatcher) -> list[CompanyKey]:
+    """
+    Находит упоминания компаний в тексте поста.
+    Псевдонимы ищутся по всему тексту за один проход, в том числе внутри длинных фрагментов.
+    Фрагменты без известных псевдонимов сопоставляются нечетко (опечатки, транслитерация),
+    а если похожих псевдонимов нет, считаются свободными упоминаниями.
+    Args: post_gpt_text: Текст поста, обработанный GPT
+        alias_matcher: Автомат поиска псевдонимов, построенный из маппинга компаний
+    Returns: Список найденных компаний без повторов в порядке появления в тексте
+        (номера компаний CRM и валидные свободные упоминания)
+    """
+    if is_missing(post_gpt_text):
+        return []
+
+    # Удаляем префикс перед двоеточием если есть
+    matching_text = prepare_text_for_matching(strip_gpt_prefix(str(post_gpt_text)))
+    return find_company_mentions_in_prepared_text(matching_text, alias_matcher)
+
+
+def find_company_mentions_in_prepared_text(matching_text: str, alias_matcher: AliasMatcher) -> list[CompanyKey]:
+    """
+    Находит упоминания компаний в тексте, уже подготовленном prepare_text_for_matching.
+    Args: matching_text: Подготовленный текст поста
+        alias_matcher: Автомат поиска псевдонимов
+    Returns: Список найденных компаний без повторов в порядке появления в тексте
+    """
+    alias_matches = alias_matcher.find_matches(matching_text)
+
+    # Словарь сохраняет порядок появления и убирает повторы
+    mentioned_companies = {}
+    emitted_index = 0
+    overlap_index = 0
+    for fragment in MENTION_FRAGMENT_PATTERN.finditer(matching_text):
+        # Псевдонимы, начинающиеся до конца фрагмента, добавляем в порядке появления
+        while emitted_index < len(alias_matches) and alias_matches[emitted_index][0] < fragment.end():
+            mentioned_companies[alias_matches[emitted_index][2]] = None
+            emitted_index += 1
+
+        # Фрагменты, пересекающиеся с псевдонимом, не считаются свободными упоминаниями
+        while overlap_index < len(alias_matches) and alias_matches[overlap_index][1] <= fragment.start():
+            overlap_index += 1
+        if overlap_index < len(alias_matches) and alias_matches[overlap_index][0] < fragment.end():
+            continue
+
+        mention = normalize_text(fragment.group())
+        if is_valid_company_name(mention):
+            # Опечатки и транслитерация известных названий сводятся к компании CRM
+            company_id = alias_matcher.find_similar(mention)
+            mentioned_companies[mention if company_id is None else company_id] = None
+
+    # Псевдонимы целиком из символов-разделителей не попадают ни в один фрагмент
+    for _, _, company_id in alias_matches[emitted_index:]:
+        mentioned_companies[company_id] = None
+
+    return list(mentioned_companies)
+
+
+class MentionRecord:
+    """Статистика упоминаний одной компании"""
+
+    __slots__ = ("mention_count", "post_links")
+
+    def __init__(self):
+        self.mention_count = 0
+        # Словарь используется как упорядоченное множество ссылок
+        self.post_links: dict[str, None] = {}
+
+
+class MentionAggregator:
+    """
+    Накопитель упоминаний компаний по постам.
+    Ссылки на посты хранятся без повторов с проверкой за O(1) и в порядке первого появления.
+    """
+
+    def __init__(self, max_links_per_company: int = MAX_POST_LINKS_PER_COMPANY):
+        """
+        Args: max_links_per_company: Сколько ссылок сохранять для компании (0 — без ограничения)
+        """
+        self.max_links_per_company = max_links_per_company
+        self.records: dict[CompanyKey, MentionRecord] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add_post(self, post_link: Optional[str], companies: Sequence[CompanyKey]) -> None:
+        """
+        Учитывает компании, упомянутые в одном посте.
+        Args: post_link: Ссылка на пост (None если ссылки нет)
+            companies: Компании, найденные в посте
+        """
+        for company in companies:
+            record = self.records.get(company)
+            if record is None:
+                record = self.records[company] = MentionRecord()
+
+            record.mention_count += 1
+
+            if post_link and (not self.max_links_per_company
+                              or len(record.post_links) < self.max_links_per_company):
+                record.post_links[post_link] = None
+
+    def merge(self, other: "MentionAggregator") -> None:
+        """
+        Добавляет статистику, накопленную по следующей части постов.
+        Если части объединяются в порядке следования постов, результат совпадает с последовательной
+        обработкой: порядок компаний, порядок ссылок и ограничение их количества сохраняются.
+        Args: other: Накопитель со статистикой по следующей части постов
+        """
+        for company, other_record in other.records.items():
+            record = self.records.get(company)
+            if record is None:
+                record = self.records[company] = MentionRecord()
+
+            record.mention_count += other_record.mention_count
+
+            for post_link in other_record.post_links:
+                if self.max_links_per_company and len(record.post_links) >= self.max_links_per_company:
+                    break
+                record.post_links[post_link] = None
+
+    def iter_sorted_records(self, max_rows: int = 0) -> Iterator[tuple[CompanyKey, MentionRecord]]:
+        """
+        Выдает компании по убыванию количества упоминаний; среди равных — в порядке первого упоминания.
+        Args: max_rows: Сколько компаний выдать (0 — все). Для ограниченного отчета используется
+            куча на max_rows элементов вместо сортировки всех компаний.
+        Returns: Итератор пар (компания, статистика)
+        """
+        if max_rows and max_rows < len(self.records):
+            # nsmallest устойчив так же, как sorted: при равных ключах сохраняется исходный порядок
+            return iter(heapq.nsmallest(max_rows, self.records.items(), key=lambda item: -item[1].mention_count))
+        return iter(sorted(self.records.items(), key=lambda item: -item[1].mention_count))
+
+    def iter_report_rows(self, canonical_to_crm: CrmTable, max_rows: int = 0) -> Iterator[list]:
+        """
+        Выдает строки итогового отчета в порядке колонок REPORT_COLUMNS, не создавая DataFrame.
+        Названия и данные компаний CRM берутся из таблицы по номеру только здесь; компании,
+        накопленные по названию (сводный отчет из хранилища), ищутся в таблице по названию.
+        Args: canonical_to_crm: Таблица CRM
+            max_rows: Сколько строк выдать (0 — все)
+        Returns: Итератор строк отчета, отсортированных по количеству упоминаний
+        """
+        for company, record in self.iter_sorted_records(max_rows):
+            company_id = company if isinstance(company, int) else canonical_to_crm.company_id(company)
+            crm_data = canonical_to_crm.get_row(company_id) if company_id is not None else None
+            yield [
+                crm_data.get("#") if crm_data else "",
+                canonical_to_crm.canonical_names[company_id] if company_id is not None else company,
+                record.mention_count,
+                ", ".join(record.post_links),
+                crm_data.get("Ответственный ДК") if crm_data else "",
+                crm_data.get("Ответственный Media") if crm_data else "",
+                "Да" if crm_data is not None else "Нет",
+            ]
+
+    def build_report(self, canonical_to_crm: CrmTable, max_rows: int = 0) -> pd.DataFrame:
+        """
+        Формирует итоговый отчет по накопленной статистике.
+        Args: canonical_to_crm: Таблица CRM
+            max_rows: Сколько строк оставить в отчете (0 — все)
+        Returns: DataFrame с отчетом, отсортированный по количеству упоминаний
+        """
+        if not self.records:
+            return pd.DataFrame(columns=REPORT_COLUMNS)
+
+        return pd.DataFrame(list(self.iter_report_rows(canonical_to_crm, max_rows)), columns=REPORT_COLUMNS)
@@ -0,0 +1,34 @@
+import os
+from typing import Optional, Sequence
+
+# Описания источников CRM для сообщений пользователю; используются источниками CRM и приветствием бота,
+# которое строится без загрузки ядра обработки
+UPLOAD_CRM_DESCRIPTION = "листа \"для ВПР\" загруженного файла"
+GOOGLE_CRM_DESCRIPTION = "CRM Google Таблицы"
+STORED_INDEX_CRM_DESCRIPTION = "последнего сохраненного индекса"
+
+
+def parse_names(value: Optional[str]) -> tuple[str, ...]:
+    """Разбирает список названий через запятую"""
+    return tuple(name.strip() for name in (value or "").split(",") if name.strip())
+
+
+def describe_crm_file(file_path: str) -> str:
+    """Описание локального файла CRM для сообщений пользователю"""
+    return f"файла {os.path.basename(file_path)}"
+
+
+def describe_crm_sources(source_names: Sequence[str]) -> str:
+    """
+    Описывает источники CRM по переменным окружения CRM_FILE_PATH и GOOGLE_SHEET_KEY
+    (источники настроены так же, как в mention_engine.build_engine_from_environment).
+    Args: source_names: Названия источников CRM в порядке приоритета
+    Returns: Описания настроенных источников через "или"
+    """
+    descriptions = {"upload": UPLOAD_CRM_DESCRIPTION, "index": STORED_INDEX_CRM_DESCRIPTION}
+    crm_file_path = os.getenv("CRM_FILE_PATH")
+    if crm_file_path:
+        descriptions["file"] = describe_crm_file(crm_file_path)
+    if os.getenv("GOOGLE_SHEET_KEY"):
+        descriptions["google"] = GOOGLE_CRM_DESCRIPTION
+    return " или ".join(descriptions[name] for name in source_names if name in descriptions)
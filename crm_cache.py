@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+import pandas as pd
+
+from alias_index import ALIAS_INDEX_DIRECTORY, AliasIndex, AliasIndexStore, hash_companies_dataframe
+from alias_matcher import AliasMatcher
+from company_mentions import build_company_mappings
+from instrumentation import span, timed
+from logger import get_logger
+
+logger = get_logger()
+
+# Время жизни снимка CRM в секундах (0 — проверять изменения при каждой загрузке)
+CRM_CACHE_TTL_SECONDS = int(os.getenv("CRM_CACHE_TTL", "300"))
+
+
+class CrmSnapshot:
+    """
+    Снимок CRM: маппинги компаний и построенный по ним автомат поиска псевдонимов.
+    Автомат строится при первом обращении: сводным отчетам нужны только данные CRM.
+    """
+
+    def __init__(self, alias_index: AliasIndex, revision: Optional[str]):
+        self.content_hash = alias_index.content_hash
+        self.revision = revision
+        self.alias_to_company_id = alias_index.alias_to_company_id
+        self.canonical_to_crm = alias_index.canonical_to_crm
+        self._alias_matcher: Optional[AliasMatcher] = None
+        self._matcher_lock = threading.Lock()
+
+    @property
+    def alias_matcher(self) -> AliasMatcher:
+        """Автомат поиска псевдонимов"""
+        with self._matcher_lock:
+            if self._alias_matcher is None:
+                with span("alias_matcher_build", rows=len(self.alias_to_company_id)):
+                    self._alias_matcher = AliasMatcher(self.alias_to_company_id)
+            return self._alias_matcher
+
+
+class CrmCache:
+    """
+    Потокобезопасный кэш снимка CRM с ограниченным временем жизни.
+    По истечении TTL сначала сверяется ревизия источника (дешевый запрос метаданных),
+    и только при ее изменении данные загружаются заново. Если содержимое не изменилось,
+    маппинги не перестраиваются. Маппинги сохраняются в индекс на диске, поэтому после
+    перезапуска при неизменной ревизии CRM не загружается и не нормализуется повторно.
+    """
+
+    def __init__(self, load_companies: Callable[[], pd.DataFrame],
+                 get_revision: Optional[Callable[[], str]] = None,
+                 ttl_seconds: int = CRM_CACHE_TTL_SECONDS,
+                 index_store: Optional[AliasIndexStore] = None):
+        """
+        Args: load_companies: Функция загрузки данных CRM
+            get_revision: Функция получения ревизии источника (например, времени изменения таблицы)
+            ttl_seconds: Время жизни снимка в секундах
+            index_store: Каталог индексов псевдонимов (по умолчанию ALIAS_INDEX_DIRECTORY, если задан)
+        """
+        self._load_companies = load_companies
+        self._get_revision = get_revision
+        self.ttl_seconds = ttl_seconds
+        if index_store is None and ALIAS_INDEX_DIRECTORY:
+            index_store = AliasIndexStore()
+        self._index_store = index_store
+
+        self._lock = threading.Lock()
+        self._snapshot: Optional[CrmSnapshot] = None
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        """Сбрасывает кэш: следующая загрузка получит данные CRM заново"""
+        with self._lock:
+            self._snapshot = None
+            self._checked_at = 0.0
+        logger.info("Кэш CRM сброшен")
+
+    def _fetch_revision(self) -> Optional[str]:
+        """Получает ревизию источника; при ошибке возвращает None (данные будут загружены заново)"""
+        if self._get_revision is None:
+            return None
+        try:
+            return self._get_revision()
+        except Exception as e:
+            logger.warning("Не удалось получить ревизию CRM: %s", e)
+            return None
+
+    @timed("mapping_build")
+    def _build_index(self, companies_dataframe: pd.DataFrame, content_hash: str,
+                     revision: Optional[str]) -> AliasIndex:
+        """Загружает индекс псевдонимов с диска или строит маппинги заново"""
+        if self._index_store is None:
+            return AliasIndex(*build_company_mappings(companies_dataframe), content_hash)
+        return self._index_store.load_or_build(companies_dataframe, content_hash, revision)
+
+    def get(self) -> CrmSnapshot:
+        """
+        Возвращает актуальный снимок CRM, при необходимости загружая данные заново.
+        Returns: Снимок CRM с маппингами
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - self._checked_at < self.ttl_seconds:
+                logger.debug("Используется кэшированный снимок CRM")
+                return snapshot
+
+            revision = self._fetch_revision()
+            if snapshot is not None and revision is not None and revision == snapshot.revision:
+                logger.info("Ревизия CRM не изменилась (%s), снимок продлен", revision)
+                self._checked_at = time.monotonic()
+                return snapshot
+
+            # Холодный старт: индекс, сохраненный для той же ревизии, загружается без чтения CRM
+            if snapshot is None and revision is not None and self._index_store is not None:
+                alias_index = self._index_store.find_by_revision(revision)
+                if alias_index is not None:
+                    snapshot = self._snapshot = CrmSnapshot(alias_index, revision)
+                    logger.info("Снимок CRM загружен из индекса для ревизии %s", revision)
+                    self._checked_at = time.monotonic()
+                    return snapshot
+
+            companies_dataframe = self._load_companies()
+            content_hash = hash_companies_dataframe(companies_dataframe)
+
+            if snapshot is not None and content_hash == snapshot.content_hash:
+                logger.info("Содержимое CRM не изменилось, маппинги используются повторно")
+                snapshot.revision = revision
+                if revision is not None and self._index_store is not None:
+                    self._index_store.remember_revision(revision, content_hash)
+            else:
+                snapshot = CrmSnapshot(self._build_index(companies_dataframe, content_hash, revision), revision)
+                self._snapshot = snapshot
+                logger.info("Снимок CRM обновлен: %d компаний", len(snapshot.canonical_to_crm))
+
+            self._checked_at = time.monotonic()
+            return snapshot
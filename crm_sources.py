@@ -0,0 +1,245 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from alias_index import ALIAS_INDEX_DIRECTORY, AliasIndexStore, hash_companies_dataframe, load_alias_index
+from config import GOOGLE_CRM_DESCRIPTION, STORED_INDEX_CRM_DESCRIPTION, UPLOAD_CRM_DESCRIPTION, describe_crm_file
+from crm_cache import CrmCache, CrmSnapshot
+from google_client import GoogleSheetsClientHolder
+from instrumentation import span, timed
+from logger import get_logger
+from post_readers import detect_post_format
+
+logger = get_logger()
+
+# Лист с данными CRM в xlsx (загруженном пользователем или локальном файле CRM_FILE_PATH)
+CRM_SHEET_NAME = "для ВПР"
+# Сколько снимков CRM из загруженных файлов держать в памяти (повторные загрузки с той же CRM
+# используют уже построенный автомат поиска)
+UPLOADED_CRM_CACHE_SIZE = int(os.getenv("UPLOADED_CRM_CACHE_SIZE", "2"))
+
+
+def has_crm_sheet(file_path: str) -> bool:
+    """
+    Проверяет, есть ли в xlsx лист с данными CRM. Читается только список листов.
+    Файлы других форматов (CSV, JSONL, Parquet) листов не содержат и пропускаются без предупреждения.
+    Args: file_path: Путь к загруженному файлу
+    Returns: True, если файл — xlsx с листом CRM_SHEET_NAME
+    """
+    try:
+        if detect_post_format(file_path) != "xlsx":
+            return False
+    except (OSError, ValueError):
+        return False
+
+    try:
+        workbook = load_workbook(file_path, read_only=True)
+    except Exception as e:
+        logger.warning("Не удалось прочитать список листов %s: %s", file_path, e)
+        return False
+    try:
+        return CRM_SHEET_NAME in workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+class CrmSource:
+    """Источник данных CRM для поиска упоминаний"""
+
+    # Название источника в настройках (CRM_SOURCES) и в сообщениях
+    name = ""
+    description = ""
+
+    def is_available(self, file_path: Optional[str] = None) -> bool:
+        """
+        Проверяет, можно ли получить данные CRM из источника.
+        Args: file_path: Путь к загруженному файлу (None — отчет без загрузки)
+        """
+        raise NotImplementedError
+
+    def get_snapshot(self, file_path: Optional[str] = None) -> CrmSnapshot:
+        """
+        Возвращает снимок CRM с маппингами и автоматом поиска.
+        Args: file_path: Путь к загруженному файлу (None — отчет без загрузки)
+        Returns: Снимок CRM
+        """
+        raise NotImplementedError
+
+    def invalidate(self) -> None:
+        """Сбрасывает закэшированные данные источника"""
+
+
+class CachedCrmSource(CrmSource):
+    """Источник с постоянным адресом: снимок хранится в CrmCache и обновляется при смене ревизии"""
+
+    def __init__(self):
+        self.crm_cache = CrmCache(self.load_companies, self.get_revision)
+
+    def load_companies(self) -> pd.DataFrame:
+        """Загружает данные CRM"""
+        raise NotImplementedError
+
+    def get_revision(self) -> Optional[str]:
+        """Возвращает ревизию источника (None — ревизия неизвестна)"""
+        return None
+
+    def get_snapshot(self, file_path: Optional[str] = None) -> CrmSnapshot:
+        return self.crm_cache.get()
+
+    def invalidate(self) -> None:
+        self.crm_cache.invalidate()
+
+
+class LocalFileCrmSource(CachedCrmSource):
+    """Лист "для ВПР" локального xlsx файла CRM; ревизия — время изменения и размер файла"""
+
+    name = "file"
+
+    def __init__(self, file_path: str, sheet_name: str = CRM_SHEET_NAME):
+        """
+        Args: file_path: Путь к xlsx файлу CRM
+            sheet_name: Лист с данными CRM
+        """
+        self.file_path = file_path
+        self.sheet_name = sheet_name
+        self.description = describe_crm_file(file_path)
+        super().__init__()
+
+    def is_available(self, file_path: Optional[str] = None) -> bool:
+        return bool(self.file_path)
+
+    def load_companies(self) -> pd.DataFrame:
+        logger.info("Загрузка данных CRM из файла %s, лист: %s", self.file_path, self.sheet_name)
+        return pd.read_excel(self.file_path, sheet_name=self.sheet_name)
+
+    def get_revision(self) -> Optional[str]:
+        file_stat = os.stat(self.file_path)
+        return f"{os.path.abspath(self.file_path)}:{file_stat.st_mtime_ns}:{file_stat.st_size}"
+
+
+class GoogleCrmSource(CachedCrmSource):
+    """Лист CRM в Google Таблице; ревизия — время последнего изменения таблицы"""
+
+    name = "google"
+    description = GOOGLE_CRM_DESCRIPTION
+
+    def __init__(self, client_holder: GoogleSheetsClientHolder, spreadsheet_key: str, sheet_name: str):
+        """
+        Args: client_holder: Общий клиент Google Sheets процесса
+            spreadsheet_key: Ключ Google Таблицы
+            sheet_name: Лист с данными CRM
+        """
+        self.client_holder = client_holder
+        self.spreadsheet_key = spreadsheet_key
+        self.sheet_name = sheet_name
+        super().__init__()
+
+    def is_available(self, file_path: Optional[str] = None) -> bool:
+        return bool(self.spreadsheet_key)
+
+    @timed("crm_fetch")
+    def load_companies(self) -> pd.DataFrame:
+        logger.info("Загрузка данных CRM из Google Таблицы, лист: %s", self.sheet_name)
+        try:
+            worksheet = self.client_holder.open_spreadsheet(self.spreadsheet_key).worksheet(self.sheet_name)
+            companies_dataframe = pd.DataFrame(worksheet.get_all_records())
+        except Exception as e:
+            logger.error("Ошибка загрузки данных CRM из Google Таблицы: %s", e)
+            raise
+
+        logger.info("Успешно загружено %d записей из CRM", len(companies_dataframe))
+        return companies_dataframe
+
+    def get_revision(self) -> Optional[str]:
+        return self.client_holder.open_spreadsheet(self.spreadsheet_key).get_lastUpdateTime()
+
+
+class UploadedWorkbookCrmSource(CrmSource):
+    """
+    Лист "для ВПР" загруженного xlsx. Снимки хранятся по хэшу содержимого CRM,
+    поэтому повторные загрузки с той же CRM не перестраивают маппинги и автомат поиска.
+    """
+
+    name = "upload"
+    description = UPLOAD_CRM_DESCRIPTION
+
+    def __init__(self, max_snapshots: int = UPLOADED_CRM_CACHE_SIZE):
+        """
+        Args: max_snapshots: Сколько последних снимков хранить в памяти
+        """
+        self.max_snapshots = max_snapshots
+        self._lock = threading.Lock()
+        self._snapshots: "OrderedDict[str, CrmSnapshot]" = OrderedDict()
+
+    def is_available(self, file_path: Optional[str] = None) -> bool:
+        return file_path is not None and has_crm_sheet(file_path)
+
+    def get_snapshot(self, file_path: Optional[str] = None) -> CrmSnapshot:
+        if file_path is None:
+            raise ValueError("Для отчета без загрузки файла лист \"для ВПР\" недоступен")
+
+        with span("crm_read") as read_span:
+            companies_dataframe = pd.read_excel(file_path, sheet_name=CRM_SHEET_NAME)
+            read_span.set_rows(len(companies_dataframe))
+        content_hash = hash_companies_dataframe(companies_dataframe)
+
+        with self._lock:
+            snapshot = self._snapshots.get(content_hash)
+            if snapshot is not None:
+                self._snapshots.move_to_end(content_hash)
+                logger.debug("Используется снимок CRM загруженного файла %s", content_hash[:12])
+                return snapshot
+
+        # Маппинги загружаются из индекса на диске, если такая CRM уже встречалась
+        with span("mapping_build"):
+            alias_index = load_alias_index(companies_dataframe, content_hash)
+        snapshot = CrmSnapshot(alias_index, None)
+
+        with self._lock:
+            self._snapshots[content_hash] = snapshot
+            while len(self._snapshots) > max(self.max_snapshots, 1):
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshots.clear()
+
+
+class StoredIndexCrmSource(CrmSource):
+    """Последний индекс псевдонимов, сохраненный в ALIAS_INDEX_DIRECTORY (для отчетов без доступа к CRM)"""
+
+    name = "index"
+    description = STORED_INDEX_CRM_DESCRIPTION
+
+    def __init__(self, index_store: Optional[AliasIndexStore] = None):
+        """
+        Args: index_store: Каталог индексов (по умолчанию ALIAS_INDEX_DIRECTORY)
+        """
+        self.index_store = index_store
+        if self.index_store is None and ALIAS_INDEX_DIRECTORY:
+            self.index_store = AliasIndexStore()
+        self._lock = threading.Lock()
+        self._snapshot: Optional[CrmSnapshot] = None
+
+    def is_available(self, file_path: Optional[str] = None) -> bool:
+        return self.index_store is not None
+
+    def get_snapshot(self, file_path: Optional[str] = None) -> CrmSnapshot:
+        # Индекс отображается в память, поэтому самый свежий файл проверяется при каждом обращении
+        alias_index = self.index_store.load_latest() if self.index_store is not None else None
+        if alias_index is None:
+            raise ValueError("Нет сохраненного индекса псевдонимов (переменная ALIAS_INDEX_DIRECTORY)")
+
+        with self._lock:
+            if self._snapshot is None or self._snapshot.content_hash != alias_index.content_hash:
+                self._snapshot = CrmSnapshot(alias_index, None)
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
@@ -0,0 +1,93 @@
+import sys
+from collections.abc import Mapping
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Колонки CRM, которые попадают в отчет; остальные колонки в снимке CRM не хранятся
+CRM_REPORT_FIELDS = ("#", "Ответственный ДК", "Ответственный Media")
+
+
+class CrmTable(Mapping):
+    """
+    Компактная таблица CRM: номер компании — позиция в списке канонических названий.
+    Названия из CRM интернированы, из строк CRM хранятся только колонки CRM_REPORT_FIELDS,
+    закодированные словарем: уникальные значения колонки и массив кодов uint32 (колонки x компании).
+    Названия, значения и массив кодов могут быть отображены из файла индекса без копирования.
+    По каноническому названию выдается словарь колонок отчета, как у строки CRM.
+    """
+
+    def __init__(self, canonical_names: Sequence[str], fields: Sequence[str], field_values: Sequence[Sequence],
+                 field_codes: np.ndarray):
+        """
+        Args: canonical_names: Канонические названия в порядке номеров компаний
+            fields: Названия хранимых колонок
+            field_values: Уникальные значения каждой колонки
+            field_codes: Коды значений, массив (количество колонок, количество компаний)
+        """
+        # Последовательности не копируются: при загрузке из индекса строки декодируются из файла по обращению
+        self.canonical_names = canonical_names
+        self.fields = tuple(fields)
+        self.field_values = list(field_values)
+        self.field_codes = field_codes.reshape(len(self.fields), len(self.canonical_names))
+        # Колонка, ее значения и коды; индексирование memoryview возвращает int без создания скаляров numpy
+        self._columns = [(field, values, memoryview(codes))
+                         for field, values, codes in zip(self.fields, self.field_values, self.field_codes)]
+        self._company_ids: Optional[dict[str, int]] = None
+
+    @property
+    def company_ids(self) -> dict[str, int]:
+        """Маппинг канонических названий на номера компаний, строится при первом поиске по названию"""
+        if self._company_ids is None:
+            self._company_ids = {name: company_id for company_id, name in enumerate(self.canonical_names)}
+        return self._company_ids
+
+    @classmethod
+    def from_dataframe(cls, canonical_names: Sequence[str], crm_rows: pd.DataFrame,
+                       fields: Sequence[str] = CRM_REPORT_FIELDS) -> "CrmTable":
+        """
+        Кодирует колонки отчета из строк CRM.
+        Args: canonical_names: Канонические названия компаний
+            crm_rows: Строки CRM в том же порядке (по одной на компанию)
+            fields: Хранимые колонки (отсутствующие в CRM колонки хранятся как None)
+        Returns: Таблица CRM
+        """
+        field_values = []
+        field_codes = np.zeros((len(fields), len(canonical_names)), dtype=np.uint32)
+        for field_position, field in enumerate(fields):
+            if field not in crm_rows.columns:
+                field_values.append([None])
+                continue
+            codes, uniques = crm_rows[field].factorize(use_na_sentinel=False)
+            field_values.append([sys.intern(value) if isinstance(value, str) else value
+                                 for value in uniques.tolist()])
+            field_codes[field_position] = codes
+        return cls([sys.intern(name) for name in canonical_names], fields, field_values, field_codes)
+
+    def company_id(self, canonical_name: str) -> Optional[int]:
+        """Номер компании по каноническому названию (None — компании нет в CRM)"""
+        return self.company_ids.get(canonical_name)
+
+    def get_row(self, company_id: int) -> dict:
+        """Колонки отчета компании по ее номеру"""
+        row = {}
+        for field, values, codes in self._columns:
+            row[field] = values[codes[company_id]]
+        return row
+
+    def __getitem__(self, canonical_name: str) -> dict:
+        return self.get_row(self.company_ids[canonical_name])
+
+    def get(self, canonical_name: str, default=None):
+        company_id = self.company_ids.get(canonical_name)
+        return self.get_row(company_id) if company_id is not None else default
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.canonical_names)
+
+    def __len__(self) -> int:
+        return len(self.canonical_names)
+
+    def __contains__(self, canonical_name) -> bool:
+        return canonical_name in self.company_ids
@@ -0,0 +1,160 @@
+import math
+import os
+import re
+from typing import Optional
+
+import numpy as np
+
+from text_normalization import remove_legal_forms
+
+# Минимальное сходство (коэффициент Дайса по триграммам) для нечеткого совпадения.
+# По умолчанию поиск отключен (0): он заметно замедляет обработку каждого поста; рабочее значение — 0.75
+FUZZY_MATCH_THRESHOLD = float(os.getenv("FUZZY_MATCH_THRESHOLD", "0"))
+# Названия короче этой длины (после транслитерации) не сопоставляются нечетко: слишком много ложных совпадений
+FUZZY_MIN_LENGTH = int(os.getenv("FUZZY_MIN_LENGTH", "4"))
+# Все настройки, влияющие на результат нечеткого поиска; входят в версию кэша результатов поиска
+FUZZY_MATCHER_CONFIG = (FUZZY_MATCH_THRESHOLD, FUZZY_MIN_LENGTH)
+
+# Кириллица приводится к латинице, чтобы "сбер" и "sber" имели одинаковое написание
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+}
+TRANSLITERATION_TABLE = str.maketrans(CYRILLIC_TO_LATIN)
+
+# Латинские написания, которые при транслитерации с кириллицы дают другие буквы ("yandex" -> "yandeks")
+LATIN_SPELLING_REPLACEMENTS = [("ck", "k"), ("ph", "f"), ("x", "ks"), ("w", "v"), ("q", "k"), ("c", "k")]
+
+NON_WORD_PATTERN = re.compile(r"[\W_]+")
+
+EMPTY_POSTING = np.zeros(0, dtype=np.int32)
+
+
+def fold_transliteration(company_name: str) -> str:
+    """
+    Приводит нормализованное название к единому латинскому написанию для нечеткого сравнения:
+    удаляет юридические формы и знаки препинания, транслитерирует кириллицу.
+    Args: company_name: Нормализованное название компании
+    Returns: Название в едином написании
+    """
+    folded_name = remove_legal_forms(company_name).translate(TRANSLITERATION_TABLE)
+    for spelling, replacement in LATIN_SPELLING_REPLACEMENTS:
+        folded_name = folded_name.replace(spelling, replacement)
+    return " ".join(NON_WORD_PATTERN.sub(" ", folded_name).split())
+
+
+def get_trigrams(folded_name: str) -> set[str]:
+    """Возвращает множество триграмм названия, дополненного пробелами по краям"""
+    padded_name = f" {folded_name} "
+    return {padded_name[index:index + 3] for index in range(len(padded_name) - 2)}
+
+
+def _contains(posting: np.ndarray, alias_ids: np.ndarray) -> np.ndarray:
+    """Отмечает номера псевдонимов, которые есть в отсортированном списке posting"""
+    # Для многих кандидатов один проход isin быстрее бинарного поиска каждого из них
+    if len(alias_ids) * 4 >= len(posting):
+        return np.isin(alias_ids, posting, assume_unique=True)
+    positions = np.minimum(np.searchsorted(posting, alias_ids), len(posting) - 1)
+    return posting[positions] == alias_ids
+
+
+class FuzzyAliasIndex:
+    """
+    Инвертированный индекс триграмм псевдонимов для приблизительного поиска названий компаний.
+    Кандидаты берутся только из самых коротких списков триграмм запроса (частые триграммы вроде " ba"
+    в кандидатов не разворачиваются), а общие триграммы проверяются бинарным поиском по спискам,
+    поэтому поиск не перебирает псевдонимы CRM. Сокращения ("мега" для "мегафон") не раскрываются:
+    их сходство ниже порога, а начало названия часто совпадает с другой компанией.
+    """
+
+    def __init__(self, alias_to_company_id: dict[str, int], threshold: float, min_length: int = FUZZY_MIN_LENGTH):
+        """
+        Args: alias_to_company_id: Маппинг нормализованных псевдонимов на номера компаний
+            threshold: Минимальный коэффициент Дайса по триграммам (больше 0)
+            min_length: Минимальная длина названия после транслитерации
+        """
+        self.threshold = threshold
+        self.min_length = min_length
+        self._folded_names: list[str] = []
+        self._company_ids: list[int] = []
+        trigram_counts: list[int] = []
+        # Триграмма -> номера псевдонимов, в которых она встречается (по возрастанию)
+        postings: dict[str, list[int]] = {}
+
+        folded_ids: dict[str, int] = {}
+        for alias, company_id in alias_to_company_id.items():
+            folded_name = fold_transliteration(alias)
+            # При совпадении написаний остается первый псевдоним
+            if len(folded_name) < min_length or folded_name in folded_ids:
+                continue
+
+            alias_id = folded_ids[folded_name] = len(self._folded_names)
+            self._folded_names.append(folded_name)
+            self._company_ids.append(company_id)
+            alias_trigrams = get_trigrams(folded_name)
+            trigram_counts.append(len(alias_trigrams))
+            for trigram in alias_trigrams:
+                postings.setdefault(trigram, []).append(alias_id)
+
+        self._trigram_counts = np.array(trigram_counts, dtype=np.int32)
+        self._postings: dict[str, np.ndarray] = {
+            trigram: np.array(alias_ids, dtype=np.int32) for trigram, alias_ids in postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._folded_names)
+
+    def find(self, mention: str) -> Optional[int]:
+        """
+        Находит компанию, псевдоним которой похож на упоминание.
+        Args: mention: Нормализованное упоминание
+        Returns: Номер компании самого похожего псевдонима или None, если похожего псевдонима нет
+        """
+        folded_mention = fold_transliteration(mention)
+        if len(folded_mention) < self.min_length:
+            return None
+
+        alias_id = self._find_similar(folded_mention)
+        return self._company_ids[alias_id] if alias_id is not None else None
+
+    def _get_postings(self, trigrams: set[str]) -> list[np.ndarray]:
+        """Списки псевдонимов для триграмм, от коротких к длинным (триграммы не из индекса дают пустой список)"""
+        return sorted((self._postings.get(trigram, EMPTY_POSTING) for trigram in trigrams), key=len)
+
+    def _find_similar(self, folded_mention: str) -> Optional[int]:
+        """
+        Находит псевдоним с наибольшим коэффициентом Дайса по триграммам.
+        Args: folded_mention: Упоминание в едином написании
+        Returns: Номер псевдонима или None, если сходство ниже порога
+        """
+        postings = self._get_postings(get_trigrams(folded_mention))
+        trigram_count = len(postings)
+
+        # Для сходства не ниже порога t нужно хотя бы k = ceil(t * n / (2 - t)) общих триграмм из n,
+        # поэтому подходящий псевдоним есть хотя бы в одном из n - k + 1 самых коротких списков
+        min_common = max(1, math.ceil(self.threshold * trigram_count / (2 - self.threshold) - 1e-9))
+        candidate_lists = trigram_count - min_common + 1
+        candidates, common_counts = np.unique(np.concatenate(postings[:candidate_lists]), return_counts=True)
+
+        # Длинные списки частых триграмм проверяются только для кандидатов, которые еще могут набрать
+        # нужное число общих триграмм, если найдутся во всех оставшихся списках
+        needed_counts = np.ceil(self.threshold * (trigram_count + self._trigram_counts[candidates]) / 2 - 1e-9)
+        for remaining_lists in range(trigram_count - candidate_lists, 0, -1):
+            reachable = common_counts + remaining_lists >= needed_counts
+            candidates, common_counts, needed_counts = (candidates[reachable], common_counts[reachable],
+                                                        needed_counts[reachable])
+            if not len(candidates):
+                return None
+            common_counts += _contains(postings[-remaining_lists], candidates)
+
+        if not len(candidates):
+            return None
+        similarities = 2 * common_counts / (trigram_count + self._trigram_counts[candidates])
+
+        # Кандидаты отсортированы, argmax возвращает первый максимум: при равном сходстве псевдоним, добавленный раньше
+        best_position = int(np.argmax(similarities))
+        if similarities[best_position] < self.threshold:
+            return None
+        return int(candidates[best_position])
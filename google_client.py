@@ -0,0 +1,134 @@
+import os
+import random
+import threading
+import time
+from http import HTTPStatus
+from typing import Optional
+
+import gspread
+from google.oauth2.service_account import Credentials
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+
+from logger import get_logger
+from metrics import GOOGLE_API_REQUEST_SECONDS, GOOGLE_API_REQUESTS, GOOGLE_API_RETRIES
+
+logger = get_logger()
+
+GOOGLE_API_SCOPES = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+
+# Повторы запросов при превышении квот и временных ошибках Google API
+GOOGLE_API_MAX_RETRIES = int(os.getenv("GOOGLE_API_MAX_RETRIES", "5"))
+GOOGLE_API_BACKOFF_SECONDS = float(os.getenv("GOOGLE_API_BACKOFF_SECONDS", "1"))
+GOOGLE_API_MAX_BACKOFF_SECONDS = float(os.getenv("GOOGLE_API_MAX_BACKOFF_SECONDS", "64"))
+# Ограничение одновременных запросов к API из всех задач процесса
+GOOGLE_API_MAX_CONCURRENCY = int(os.getenv("GOOGLE_API_MAX_CONCURRENCY", "4"))
+
+RETRYABLE_STATUS_CODES = {HTTPStatus.REQUEST_TIMEOUT, HTTPStatus.TOO_MANY_REQUESTS}
+
+_api_semaphore = threading.BoundedSemaphore(GOOGLE_API_MAX_CONCURRENCY)
+
+
+def is_retryable_api_error(error: APIError) -> bool:
+    """
+    Проверяет, стоит ли повторить запрос после ошибки API.
+    Args: error: Ошибка Google API
+    Returns: True для превышения квот, таймаутов и ошибок сервера
+    """
+    if error.code in RETRYABLE_STATUS_CODES or error.code >= HTTPStatus.INTERNAL_SERVER_ERROR:
+        return True
+
+    # Drive API сообщает о превышении квот кодом 403 с доменом usageLimits
+    errors = error.error.get("errors") if isinstance(error.error, dict) else None
+    return error.code == HTTPStatus.FORBIDDEN and bool(errors) and errors[0].get("domain") == "usageLimits"
+
+
+class RetryingHTTPClient(HTTPClient):
+    """
+    HTTP-клиент gspread с повторами при превышении квот (экспоненциальная задержка со случайным
+    разбросом) и ограничением числа одновременных запросов.
+    Сессия requests с keep-alive и автоматическим обновлением токена создается базовым классом.
+    """
+
+    def request(self, method, *args, **kwargs):
+        for attempt in range(GOOGLE_API_MAX_RETRIES + 1):
+            try:
+                with _api_semaphore:
+                    return self._measured_request(method, *args, **kwargs)
+            except APIError as error:
+                if attempt == GOOGLE_API_MAX_RETRIES or not is_retryable_api_error(error):
+                    raise
+
+                GOOGLE_API_RETRIES.inc(status=error.code)
+
+                delay = min(GOOGLE_API_BACKOFF_SECONDS * 2 ** attempt, GOOGLE_API_MAX_BACKOFF_SECONDS)
+                delay *= random.uniform(0.5, 1.0)
+                logger.warning("Ошибка Google API %s, повтор через %.1f с (попытка %d из %d)",
+                               error.code, delay, attempt + 1, GOOGLE_API_MAX_RETRIES)
+                time.sleep(delay)
+
+    def _measured_request(self, method, *args, **kwargs):
+        """Выполняет один запрос и учитывает его в метриках Google API"""
+        start_time = time.perf_counter()
+        status = "error"
+        try:
+            response = super().request(method, *args, **kwargs)
+            status = response.status_code
+            return response
+        except APIError as error:
+            status = error.code
+            raise
+        finally:
+            GOOGLE_API_REQUESTS.inc(method=str(method).upper(), status=status)
+            GOOGLE_API_REQUEST_SECONDS.observe(time.perf_counter() - start_time, method=str(method).upper())
+
+
+class GoogleSheetsClientHolder:
+    """
+    Потокобезопасный держатель одного авторизованного клиента gspread на процесс.
+    Авторизация выполняется один раз, открытые таблицы кэшируются по ключу.
+    """
+
+    def __init__(self, credentials_file: str, scopes: Optional[list[str]] = None):
+        """
+        Args: credentials_file: Путь к JSON-ключу сервисного аккаунта
+            scopes: Области доступа OAuth
+        """
+        self.credentials_file = credentials_file
+        self.scopes = scopes or GOOGLE_API_SCOPES
+
+        self._lock = threading.Lock()
+        self._client: Optional[gspread.Client] = None
+        self._spreadsheets: dict[str, gspread.Spreadsheet] = {}
+
+    def get_client(self) -> gspread.Client:
+        """
+        Возвращает авторизованный клиент, создавая его при первом обращении.
+        Returns: Клиент gspread
+        """
+        with self._lock:
+            if self._client is None:
+                credentials = Credentials.from_service_account_file(self.credentials_file, scopes=self.scopes)
+                self._client = gspread.authorize(credentials, http_client=RetryingHTTPClient)
+                logger.info("Успешное подключение к Google Sheets")
+            return self._client
+
+    def open_spreadsheet(self, spreadsheet_key: str) -> gspread.Spreadsheet:
+        """
+        Открывает таблицу по ключу, повторно используя уже открытую.
+        Args: spreadsheet_key: Ключ Google Таблицы
+        Returns: Объект таблицы gspread
+        """
+        client = self.get_client()
+        with self._lock:
+            spreadsheet = self._spreadsheets.get(spreadsheet_key)
+            if spreadsheet is None:
+                spreadsheet = client.open_by_key(spreadsheet_key)
+                self._spreadsheets[spreadsheet_key] = spreadsheet
+            return spreadsheet
+
+    def reset(self) -> None:
+        """Сбрасывает клиента (например, после замены ключа сервисного аккаунта)"""
+        with self._lock:
+            self._client = None
+            self._spreadsheets.clear()
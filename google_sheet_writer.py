@@ -0,0 +1,248 @@
+import os
+from typing import Optional
+
+import gspread
+import pandas as pd
+from gspread.utils import ValueRenderOption, rowcol_to_a1
+
+from logger import get_logger
+
+logger = get_logger()
+
+# Ограничения на один запрос batch_update, чтобы не превышать лимит размера запроса Sheets API
+SHEETS_WRITE_CHUNK_CELLS = int(os.getenv("SHEETS_WRITE_CHUNK_CELLS", "20000"))
+SHEETS_WRITE_CHUNK_RANGES = int(os.getenv("SHEETS_WRITE_CHUNK_RANGES", "500"))
+
+HEADER_FORMAT = {
+    'textFormat': {'bold': True},
+    'backgroundColor': {'red': 0.9, 'green': 0.9, 'blue': 0.9}
+}
+
+
+class SheetWriteStats:
+    """Итоги записи отчета на лист"""
+
+    def __init__(self, full_rewrite: bool = False):
+        self.full_rewrite = full_rewrite
+        self.updated_rows = 0
+        self.added_rows = 0
+        self.removed_rows = 0
+        self.unchanged_rows = 0
+        self.written_cells = 0
+        self.write_requests = 0
+
+    def __str__(self) -> str:
+        mode = "полная перезапись" if self.full_rewrite else "дельта"
+        return (f"{mode}: изменено {self.updated_rows}, добавлено {self.added_rows}, "
+                f"удалено {self.removed_rows}, без изменений {self.unchanged_rows}, "
+                f"записано ячеек {self.written_cells} за {self.write_requests} запросов")
+
+
+def _cell_value(value) -> str:
+    """
+    Приводит значение ячейки к строке для сравнения отчета с содержимым листа.
+    Целые числа с плавающей точкой (например, 12.0 из Excel) сравниваются как целые.
+    """
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _prepare_rows(dataframe: pd.DataFrame) -> list[list]:
+    """Преобразует DataFrame в список строк для загрузки (пустые значения заменяются на '')"""
+    return dataframe.astype(object).where(dataframe.notna(), "").values.tolist()
+
+
+def _merge_row_blocks(row_updates: list[tuple[int, list]]) -> list[tuple[int, list[list]]]:
+    """
+    Объединяет обновления соседних строк в непрерывные блоки, чтобы уменьшить число диапазонов.
+    Args: row_updates: Пары (номер строки листа, значения строки)
+    Returns: Пары (номер первой строки блока, значения строк блока)
+    """
+    blocks: list[tuple[int, list[list]]] = []
+    for row_number, row_values in sorted(row_updates, key=lambda update: update[0]):
+        if blocks and blocks[-1][0] + len(blocks[-1][1]) == row_number:
+            blocks[-1][1].append(row_values)
+        else:
+            blocks.append((row_number, [row_values]))
+    return blocks
+
+
+def _write_blocks(worksheet: gspread.Worksheet, blocks: list[tuple[int, list[list]]], stats: SheetWriteStats) -> None:
+    """
+    Записывает блоки строк через batch_update, разбивая их на запросы ограниченного размера.
+    Args: worksheet: Лист Google Таблицы
+        blocks: Пары (номер первой строки, значения строк)
+        stats: Итоги записи для обновления счетчиков
+    """
+    batch: list[dict] = []
+    batch_cells = 0
+
+    def flush() -> None:
+        nonlocal batch, batch_cells
+        if batch:
+            worksheet.batch_update(batch)
+            stats.write_requests += 1
+            stats.written_cells += batch_cells
+            batch, batch_cells = [], 0
+
+    for first_row, rows in blocks:
+        column_count = max(len(row) for row in rows)
+        # Длинные блоки делятся так, чтобы каждый кусок помещался в один запрос
+        rows_per_range = max(1, SHEETS_WRITE_CHUNK_CELLS // max(column_count, 1))
+
+        for offset in range(0, len(rows), rows_per_range):
+            chunk = rows[offset:offset + rows_per_range]
+            chunk_cells = len(chunk) * column_count
+            if batch and (batch_cells + chunk_cells > SHEETS_WRITE_CHUNK_CELLS
+                          or len(batch) >= SHEETS_WRITE_CHUNK_RANGES):
+                flush()
+
+            start_row = first_row + offset
+            cell_range = f"{rowcol_to_a1(start_row, 1)}:{rowcol_to_a1(start_row + len(chunk) - 1, column_count)}"
+            batch.append({"range": cell_range, "values": chunk})
+            batch_cells += chunk_cells
+
+    flush()
+
+
+def _ensure_grid_size(worksheet: gspread.Worksheet, row_count: int, column_count: int) -> None:
+    """Увеличивает сетку листа, если записываемые данные в нее не помещаются"""
+    if worksheet.row_count < row_count or worksheet.col_count < column_count:
+        worksheet.resize(rows=max(worksheet.row_count, row_count), cols=max(worksheet.col_count, column_count))
+
+
+def rewrite_worksheet(worksheet: gspread.Worksheet, dataframe: pd.DataFrame) -> SheetWriteStats:
+    """
+    Полностью перезаписывает лист отчетом: очищает его, загружает данные частями и форматирует заголовки.
+    Используется для нового листа или при изменении набора колонок.
+    Args: worksheet: Лист Google Таблицы
+        dataframe: Отчет для записи
+    Returns: Итоги записи
+    """
+    stats = SheetWriteStats(full_rewrite=True)
+    stats.added_rows = len(dataframe)
+
+    worksheet.clear()
+    logger.debug("Лист очищен")
+
+    rows = [dataframe.columns.tolist()] + _prepare_rows(dataframe)
+    _ensure_grid_size(worksheet, len(rows), len(dataframe.columns))
+    _write_blocks(worksheet, [(1, rows)], stats)
+    logger.debug("Данные загружены в таблицу")
+
+    # Форматируем заголовки
+    worksheet.format('A1:Z1', HEADER_FORMAT)
+    logger.debug("Форматирование заголовков применено")
+
+    # Автоматически подбираем ширину колонок
+    try:
+        worksheet.columns_auto_resize(0, len(dataframe.columns))
+        logger.debug("Автоподбор ширины колонок выполнен")
+    except Exception as e:
+        logger.warning("Автоподбор ширины колонок не поддерживается: %s", e)
+
+    return stats
+
+
+def write_report_delta(worksheet: gspread.Worksheet, dataframe: pd.DataFrame, key_column: str = "Компания",
+                       sort_column: Optional[str] = "Количество упоминаний") -> SheetWriteStats:
+    """
+    Записывает отчет на лист, отправляя только изменения относительно текущего содержимого.
+    Лист читается один раз; строки сопоставляются по ключевой колонке. Измененные строки
+    перезаписываются на месте, новые занимают места удаленных или добавляются в конец,
+    оставшиеся лишние строки удаляются. Затем лист сортируется на стороне сервера.
+    Если заголовок листа не совпадает с колонками отчета, лист перезаписывается целиком.
+    Args: worksheet: Лист Google Таблицы
+        dataframe: Отчет для записи
+        key_column: Колонка, по которой сопоставляются строки
+        sort_column: Колонка для сортировки по убыванию после записи (None — без сортировки)
+    Returns: Итоги записи
+    """
+    header = [str(column) for column in dataframe.columns]
+    current_values = worksheet.get_all_values(value_render_option=ValueRenderOption.unformatted)
+
+    current_header = [_cell_value(value) for value in current_values[0]] if current_values else []
+    if current_header[:len(header)] != header or any(current_header[len(header):]):
+        logger.info("Заголовок листа не совпадает с отчетом, лист перезаписывается целиком")
+        return rewrite_worksheet(worksheet, dataframe)
+
+    stats = SheetWriteStats()
+    column_count = len(header)
+    key_index = header.index(key_column)
+
+    # Текущие строки листа по ключу; строки без ключа и повторы считаются освободившимися местами
+    current_rows: dict[str, tuple[int, list[str]]] = {}
+    free_rows: list[int] = []
+    for row_number, row in enumerate(current_values[1:], start=2):
+        row_cells = [_cell_value(value) for value in row[:column_count]]
+        row_cells.extend([""] * (column_count - len(row_cells)))
+        key = row_cells[key_index]
+        if key and key not in current_rows:
+            current_rows[key] = (row_number, row_cells)
+        else:
+            free_rows.append(row_number)
+
+    row_updates: list[tuple[int, list]] = []
+    added_rows: list[list] = []
+    for row_values in _prepare_rows(dataframe):
+        key = _cell_value(row_values[key_index])
+        current_row = current_rows.pop(key, None)
+        if current_row is None:
+            added_rows.append(row_values)
+        elif [_cell_value(value) for value in row_values] != current_row[1]:
+            row_updates.append((current_row[0], row_values))
+            stats.updated_rows += 1
+        else:
+            stats.unchanged_rows += 1
+
+    # Строки компаний, которых больше нет в отчете, освобождают свои места
+    free_rows.extend(row_number for row_number, _ in current_rows.values())
+    stats.removed_rows = len(current_rows)
+    stats.added_rows = len(added_rows)
+    free_rows.sort()
+
+    # Новые строки сначала занимают освободившиеся места, остальные добавляются в конец
+    reused_rows = min(len(added_rows), len(free_rows))
+    row_updates.extend(zip(free_rows[:reused_rows], added_rows[:reused_rows]))
+    free_rows = free_rows[reused_rows:]
+
+    next_row = len(current_values) + 1
+    for row_values in added_rows[reused_rows:]:
+        row_updates.append((next_row, row_values))
+        next_row += 1
+
+    if not row_updates and not free_rows:
+        logger.info("Данные на листе не изменились")
+        return stats
+
+    _ensure_grid_size(worksheet, next_row - 1, column_count)
+    _write_blocks(worksheet, _merge_row_blocks(row_updates), stats)
+
+    # Удаление лишних строк и сортировка выполняются одним структурным запросом
+    structure_requests = [
+        {
+            "deleteDimension": {
+                "range": {"sheetId": worksheet.id, "dimension": "ROWS",
+                          "startIndex": row_number - 1, "endIndex": row_number}
+            }
+        }
+        # Удаляем снизу вверх, чтобы номера оставшихся строк не сдвигались
+        for row_number in reversed(free_rows)
+    ]
+    last_row = next_row - 1 - len(free_rows)
+    if sort_column is not None and sort_column in header and last_row > 2:
+        structure_requests.append({
+            "sortRange": {
+                "range": {"sheetId": worksheet.id, "startRowIndex": 1, "endRowIndex": last_row,
+                          "startColumnIndex": 0, "endColumnIndex": column_count},
+                "sortSpecs": [{"dimensionIndex": header.index(sort_column), "sortOrder": "DESCENDING"}],
+            }
+        })
+    if structure_requests:
+        worksheet.spreadsheet.batch_update({"requests": structure_requests})
+        stats.write_requests += 1
+
+    return stats
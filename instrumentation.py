@@ -0,0 +1,299 @@
+import functools
+import inspect
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Iterator, Optional
+
+from logger import get_logger, get_span_logger
+from metrics import STAGE_DURATION_SECONDS, STAGE_ROWS
+
+try:
+    import resource
+except ImportError:
+    # Модуля resource нет на Windows
+    resource = None
+
+logger = get_logger()
+span_logger = get_span_logger()
+
+# Запись этапов обработки в spans.jsonl и итогов задач в лог (0 — отключено)
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "1") != "0"
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Текущая задача и текущий этап; у каждого потока и задачи asyncio свои значения
+_current_job: ContextVar[Optional["JobTrace"]] = ContextVar("current_job", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def get_rss_bytes() -> Optional[int]:
+    """
+    Возвращает текущий объем резидентной памяти процесса.
+    На Linux читается из /proc, на других системах используется пиковое значение из getrusage.
+    Returns: Объем памяти в байтах или None, если его негде узнать (например, на Windows)
+    """
+    try:
+        with open("/proc/self/statm", "rb") as statm_file:
+            return int(statm_file.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        if resource is None:
+            return None
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def _rss_delta_bytes(start_rss: Optional[int]) -> Optional[int]:
+    """Изменение RSS с момента замера start_rss (None, если RSS недоступен)"""
+    current_rss = get_rss_bytes()
+    return current_rss - start_rss if current_rss is not None and start_rss is not None else None
+
+
+def _megabytes(size_bytes: Optional[int]) -> Optional[float]:
+    """Переводит байты в мегабайты для записи в spans.jsonl"""
+    return round(size_bytes / (1024 * 1024), 2) if size_bytes is not None else None
+
+
+def _emit(record: dict) -> None:
+    """Записывает событие одной строкой JSON"""
+    if not INSTRUMENTATION_ENABLED:
+        return
+    span_logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+class Span:
+    """Замер одного этапа обработки: длительность, количество строк и изменение RSS"""
+
+    def __init__(self, name: str, job: Optional["JobTrace"], parent: Optional["Span"], attributes: dict):
+        self.name = name
+        self.job = job
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.rows: Optional[int] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.started_at = datetime.now(timezone.utc)
+        self._start_time = time.perf_counter()
+        self._start_rss = get_rss_bytes()
+        self.duration_seconds = 0.0
+        self.rss_delta_bytes: Optional[int] = 0
+
+    def set_rows(self, rows: int) -> None:
+        """Задает количество обработанных строк этапа"""
+        self.rows = rows
+
+    def set_attribute(self, key: str, value) -> None:
+        """Добавляет к этапу произвольное значение (имя файла, количество компаний и т.п.)"""
+        self.attributes[key] = value
+
+    def finish(self, duration_seconds: Optional[float] = None) -> None:
+        """Фиксирует длительность и изменение RSS, записывает этап и добавляет его в итоги задачи"""
+        self.duration_seconds = (time.perf_counter() - self._start_time
+                                 if duration_seconds is None else duration_seconds)
+        self.rss_delta_bytes = _rss_delta_bytes(self._start_rss)
+
+        STAGE_DURATION_SECONDS.observe(self.duration_seconds, stage=self.name)
+        if self.rows:
+            STAGE_ROWS.inc(self.rows, stage=self.name)
+
+        _emit({
+            "type": "span",
+            "name": self.name,
+            "job": self.job.name if self.job is not None else None,
+            "job_id": self.job.job_id if self.job is not None else None,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "duration_seconds": round(self.duration_seconds, 6),
+            "rows": self.rows,
+            "rss_delta_mb": _megabytes(self.rss_delta_bytes),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        })
+        if self.job is not None:
+            self.job.add_span(self)
+
+
+@contextmanager
+def span(name: str, rows: Optional[int] = None, **attributes) -> Iterator[Span]:
+    """
+    Замеряет этап обработки внутри блока with.
+    Вложенные этапы получают ссылку на родительский, этапы внутри job_trace попадают в итоги задачи.
+    Args: name: Название этапа (download, parse, crm_load, match и т.п.)
+        rows: Количество строк, если оно известно заранее (можно задать позже через set_rows)
+        attributes: Дополнительные значения для записи
+    Returns: Замер этапа
+    """
+    current_span = Span(name, _current_job.get(), _current_span.get(), attributes)
+    current_span.rows = rows
+    token = _current_span.set(current_span)
+    try:
+        yield current_span
+    except BaseException as error:
+        current_span.status = "error"
+        current_span.error = type(error).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        current_span.finish()
+
+
+def timed(name: Optional[str] = None) -> Callable:
+    """
+    Декоратор: замеряет каждый вызов функции (синхронной или асинхронной) как этап.
+    Args: name: Название этапа (по умолчанию имя функции)
+    """
+    def decorator(function: Callable) -> Callable:
+        span_name = name or function.__name__
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def timed_iter(name: str, iterable: Iterable, **attributes) -> Iterator:
+    """
+    Оборачивает потоковый итератор (например, чтение постов из файла) и замеряет только время,
+    проведенное внутри него: при потоковой обработке чтение чередуется с поиском упоминаний.
+    Этап записывается, когда итератор исчерпан или закрыт.
+    Args: name: Название этапа
+        iterable: Исходный итератор
+        attributes: Дополнительные значения для записи
+    Returns: Итератор с теми же элементами
+    """
+    # Родитель и задача определяются при первом обращении к итератору
+    iterator_span = Span(name, _current_job.get(), _current_span.get(), attributes)
+    iterator = iter(iterable)
+    elapsed_seconds = 0.0
+    rows = 0
+    try:
+        while True:
+            start_time = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed_seconds += time.perf_counter() - start_time
+                break
+            elapsed_seconds += time.perf_counter() - start_time
+            rows += 1
+            yield item
+    except BaseException as error:
+        if not isinstance(error, GeneratorExit):
+            iterator_span.status = "error"
+            iterator_span.error = type(error).__name__
+        raise
+    finally:
+        iterator_span.rows = rows
+        iterator_span.finish(elapsed_seconds)
+
+
+class StageSummary:
+    """Суммарные показатели этапа в рамках задачи"""
+
+    __slots__ = ("calls", "seconds", "rows", "rss_delta_bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.rss_delta_bytes: Optional[int] = 0
+
+
+class JobTrace:
+    """Итоги одной задачи обработки: этапы, их длительность, строки и память"""
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.job_id = uuid.uuid4().hex[:12]
+        self.attributes = attributes
+        self.stages: dict[str, StageSummary] = {}
+        self._start_time = time.perf_counter()
+        self._start_rss = get_rss_bytes()
+
+    def add_span(self, finished_span: Span) -> None:
+        """Учитывает завершенный этап в итогах задачи"""
+        stage = self.stages.get(finished_span.name)
+        if stage is None:
+            stage = self.stages[finished_span.name] = StageSummary()
+        stage.calls += 1
+        stage.seconds += finished_span.duration_seconds
+        stage.rows += finished_span.rows or 0
+        if stage.rss_delta_bytes is not None and finished_span.rss_delta_bytes is not None:
+            stage.rss_delta_bytes += finished_span.rss_delta_bytes
+        else:
+            stage.rss_delta_bytes = None
+
+    def finish(self, status: str) -> None:
+        """Записывает итоги задачи в spans.jsonl и краткую сводку в лог"""
+        duration_seconds = time.perf_counter() - self._start_time
+        rss_delta_bytes = _rss_delta_bytes(self._start_rss)
+
+        _emit({
+            "type": "job",
+            "name": self.name,
+            "job_id": self.job_id,
+            "duration_seconds": round(duration_seconds, 6),
+            "rss_delta_mb": _megabytes(rss_delta_bytes),
+            "status": status,
+            "attributes": self.attributes,
+            "stages": {
+                stage_name: {
+                    "calls": stage.calls,
+                    "seconds": round(stage.seconds, 6),
+                    "share": round(stage.seconds / duration_seconds, 4) if duration_seconds else None,
+                    "rows": stage.rows,
+                    "rss_delta_mb": _megabytes(stage.rss_delta_bytes),
+                }
+                for stage_name, stage in self.stages.items()
+            },
+        })
+
+        stage_descriptions = ", ".join(
+            f"{stage_name} {stage.seconds:.2f} с" + (f" ({stage.rows} строк)" if stage.rows else "")
+            for stage_name, stage in self.stages.items()
+        )
+        rss_description = f"{rss_delta_bytes / (1024 * 1024):+.1f} МБ" if rss_delta_bytes is not None else "н/д"
+        if INSTRUMENTATION_ENABLED:
+            logger.info("Задача %s [%s] %s за %.2f с, RSS %s: %s", self.name, self.job_id, status,
+                        duration_seconds, rss_description, stage_descriptions or "без этапов")
+
+
+@contextmanager
+def job_trace(name: str, **attributes) -> Iterator[JobTrace]:
+    """
+    Объединяет этапы, выполненные внутри блока with, в итоги одной задачи.
+    Args: name: Название задачи
+        attributes: Дополнительные значения для записи (имя файла, формат и т.п.)
+    Returns: Итоги задачи
+    """
+    trace = JobTrace(name, attributes)
+    job_token = _current_job.set(trace)
+    span_token = _current_span.set(None)
+    status = "ok"
+    try:
+        yield trace
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _current_span.reset(span_token)
+        _current_job.reset(job_token)
+        trace.finish(status)
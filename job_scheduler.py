@@ -0,0 +1,282 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.managers import SyncManager
+from typing import Any, Callable, Optional
+
+from logger import get_logger
+from metrics import (
+    JOB_DURATION_SECONDS, JOB_WAIT_SECONDS, JOBS_FINISHED, JOBS_QUEUED, JOBS_REJECTED, JOBS_RUNNING, JOBS_SUBMITTED,
+)
+from progress import JobCancelledError, ProgressChannel
+
+logger = get_logger()
+
+# Настройки пула обработки (можно переопределить через переменные окружения)
+DEFAULT_EXECUTOR_TYPE = os.getenv("PROCESSING_EXECUTOR", "thread")  # thread или process
+DEFAULT_MAX_WORKERS = int(os.getenv("PROCESSING_WORKERS", "0")) or (os.cpu_count() or 1)
+DEFAULT_MAX_QUEUE_SIZE = int(os.getenv("PROCESSING_QUEUE_SIZE", "20"))
+DEFAULT_MAX_JOBS_PER_USER = int(os.getenv("PROCESSING_USER_JOBS_LIMIT", "3"))
+
+
+class QueueFullError(Exception):
+    """Очередь обработки переполнена (общий лимит или лимит пользователя)"""
+
+
+class ProcessingJob:
+    """Задача обработки файла в очереди планировщика"""
+
+    def __init__(self, job_id: int, user_id: int, function: Callable, args: tuple,
+                 result_future: asyncio.Future, progress_channel: Optional[ProgressChannel] = None):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.function = function
+        self.args = args
+        # Канал прогресса, переданный функции задачи; через него выполняемой задаче передается отмена
+        self.progress_channel = progress_channel
+        self.status = "queued"  # queued, running, done, failed, cancelled
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self._result_future = result_future
+
+    async def wait(self) -> Any:
+        """
+        Ожидает завершения задачи.
+        Returns: Результат функции задачи
+        Raises: JobCancelledError если задача была отменена
+        """
+        return await self._result_future
+
+
+class JobScheduler:
+    """
+    Планировщик обработки загруженных файлов.
+    Выполняет задачи в пуле потоков или процессов, не блокируя цикл событий бота.
+    Очередь ограничена по размеру, задачи разных пользователей выбираются по кругу.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS,
+                 executor_type: str = DEFAULT_EXECUTOR_TYPE,
+                 max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+                 max_jobs_per_user: int = DEFAULT_MAX_JOBS_PER_USER):
+        if executor_type not in ("thread", "process"):
+            raise ValueError(f"Неизвестный тип пула обработки: {executor_type}")
+
+        self.max_workers = max_workers
+        self.executor_type = executor_type
+        self.max_queue_size = max_queue_size
+        self.max_jobs_per_user = max_jobs_per_user
+
+        self._executor: Optional[Executor] = None
+        # Менеджер multiprocessing для каналов прогресса задач в пуле процессов
+        self._progress_manager: Optional[SyncManager] = None
+        self._job_ids = itertools.count(1)
+        # Очереди задач по пользователям; порядок ключей задает очередность обхода по кругу
+        self._user_queues: "OrderedDict[int, deque[ProcessingJob]]" = OrderedDict()
+        self._running_jobs: dict[int, ProcessingJob] = {}
+        # Число занятых слотов пула (отмененные задачи занимают слот до фактического завершения)
+        self._busy_workers = 0
+
+    def _get_executor(self, initializer: Optional[Callable] = None, initargs: tuple = ()) -> Executor:
+        """
+        Создает пул обработки при первом обращении.
+        Args: initializer: Функция инициализации процессов пула (только для пула процессов)
+            initargs: Аргументы функции инициализации
+        """
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=initializer,
+                                                     initargs=initargs)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="processing")
+            logger.info("Создан пул обработки: %s, воркеров: %d", self.executor_type, self.max_workers)
+        return self._executor
+
+    def start_workers(self, initializer: Callable, *initargs) -> None:
+        """
+        Заранее запускает процессы пула и подготавливает их функцией инициализации,
+        чтобы первая задача не ждала загрузки модулей и данных. Пул потоков разделяет данные
+        с процессом бота, поэтому для него ничего не делается. Если пул уже создан, вызов ничего не меняет.
+        Args: initializer: Функция инициализации процесса пула (должна импортироваться по имени модуля)
+            initargs: Аргументы функции инициализации
+        """
+        if self.executor_type != "process" or self._executor is not None:
+            return
+        # Процессы пула создаются при первой отправке задачи, поэтому отправляем пустую
+        self._get_executor(initializer, initargs).submit(os.getpid)
+
+    def create_progress_channel(self) -> ProgressChannel:
+        """
+        Создает канал прогресса для задачи: для пула потоков — в памяти процесса,
+        для пула процессов — словарь менеджера multiprocessing, доступный из процесса пула.
+        Returns: Канал прогресса (передается функции задачи аргументом)
+        """
+        if self.executor_type != "process":
+            return ProgressChannel()
+        if self._progress_manager is None:
+            self._progress_manager = multiprocessing.Manager()
+        return ProgressChannel(self._progress_manager.dict())
+
+    @property
+    def queued_count(self) -> int:
+        """Количество задач, ожидающих выполнения"""
+        return sum(len(user_queue) for user_queue in self._user_queues.values())
+
+    def _user_job_count(self, user_id: int) -> int:
+        """Количество активных (ожидающих и выполняемых) задач пользователя"""
+        queued = len(self._user_queues.get(user_id, ()))
+        running = sum(1 for job in self._running_jobs.values() if job.user_id == user_id)
+        return queued + running
+
+    def submit(self, user_id: int, function: Callable, *args,
+               progress_channel: Optional[ProgressChannel] = None) -> ProcessingJob:
+        """
+        Ставит задачу в очередь. Должна вызываться из цикла событий бота.
+        Args: user_id: Идентификатор пользователя Telegram
+            function: Синхронная функция обработки (для пула процессов должна быть picklable)
+            args: Аргументы функции
+            progress_channel: Канал прогресса из args, через который выполняемая задача узнает об отмене
+        Returns: Поставленная в очередь задача
+        Raises: QueueFullError если очередь или лимит пользователя переполнены
+        """
+        if self.queued_count >= self.max_queue_size:
+            JOBS_REJECTED.inc()
+            raise QueueFullError("Очередь обработки переполнена, попробуйте позже")
+        if self._user_job_count(user_id) >= self.max_jobs_per_user:
+            JOBS_REJECTED.inc()
+            raise QueueFullError(
+                f"У вас уже {self.max_jobs_per_user} файла в обработке, дождитесь их завершения"
+            )
+
+        loop = asyncio.get_running_loop()
+        job = ProcessingJob(next(self._job_ids), user_id, function, args, loop.create_future(), progress_channel)
+        self._user_queues.setdefault(user_id, deque()).append(job)
+        logger.info("Задача %d пользователя %s поставлена в очередь", job.job_id, user_id)
+        JOBS_SUBMITTED.inc()
+
+        self._dispatch()
+        return job
+
+    def queue_position(self, job: ProcessingJob) -> int:
+        """
+        Возвращает позицию задачи в очереди с учетом обхода пользователей по кругу.
+        Returns: 0 если задача уже выполняется или завершена, иначе номер в очереди начиная с 1
+        """
+        if job.status != "queued":
+            return 0
+
+        user_queues = [list(user_queue) for user_queue in self._user_queues.values()]
+        dispatch_order = [
+            queued_job
+            for round_jobs in itertools.zip_longest(*user_queues)
+            for queued_job in round_jobs
+            if queued_job is not None
+        ]
+        return dispatch_order.index(job) + 1
+
+    def cancel_user_jobs(self, user_id: int) -> int:
+        """
+        Отменяет все задачи пользователя: ожидающие удаляются из очереди, выполняемым через канал
+        прогресса передается отмена (задача прерывается на ближайшей проверке), их результат отбрасывается.
+        Returns: Количество отмененных задач
+        """
+        cancelled_jobs = list(self._user_queues.pop(user_id, ()))
+        running_jobs = [job for job in self._running_jobs.values() if job.user_id == user_id]
+        cancelled_jobs.extend(running_jobs)
+
+        for job in running_jobs:
+            if job.progress_channel is not None:
+                job.progress_channel.cancel()
+        for job in cancelled_jobs:
+            self._finish_job(job, "cancelled", error=JobCancelledError("Обработка отменена"))
+        self._update_gauges()
+
+        if cancelled_jobs:
+            logger.info("Отменено задач пользователя %s: %d", user_id, len(cancelled_jobs))
+        return len(cancelled_jobs)
+
+    def _next_job(self) -> Optional[ProcessingJob]:
+        """Выбирает следующую задачу, обходя пользователей по кругу"""
+        if not self._user_queues:
+            return None
+
+        user_id, user_queue = self._user_queues.popitem(last=False)
+        job = user_queue.popleft()
+        if user_queue:
+            # Пользователь с оставшимися задачами переходит в конец круга
+            self._user_queues[user_id] = user_queue
+        return job
+
+    def _dispatch(self) -> None:
+        """Запускает задачи из очереди, пока в пуле есть свободные слоты"""
+        while self._busy_workers < self.max_workers:
+            job = self._next_job()
+            if job is None:
+                break
+
+            job.status = "running"
+            job.started_at = time.monotonic()
+            JOB_WAIT_SECONDS.observe(job.started_at - job.submitted_at)
+            self._running_jobs[job.job_id] = job
+            self._busy_workers += 1
+
+            loop = asyncio.get_running_loop()
+            executor_future = loop.run_in_executor(self._get_executor(), job.function, *job.args)
+            executor_future.add_done_callback(
+                lambda completed, started_job=job: self._on_job_completed(started_job, completed)
+            )
+            logger.info("Задача %d пользователя %s запущена", job.job_id, job.user_id)
+
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        """Обновляет метрики длины очереди и количества выполняемых задач"""
+        JOBS_QUEUED.set(self.queued_count)
+        JOBS_RUNNING.set(len(self._running_jobs))
+
+    def _on_job_completed(self, job: ProcessingJob, executor_future: asyncio.Future) -> None:
+        """Обрабатывает завершение задачи в пуле и запускает следующую"""
+        self._busy_workers -= 1
+
+        if job.status == "running":
+            # Future пула отменяется при его остановке; exception() у отмененного future выбросил бы CancelledError
+            if executor_future.cancelled():
+                self._finish_job(job, "cancelled", error=JobCancelledError("Обработка отменена"))
+            elif executor_future.exception() is None:
+                self._finish_job(job, "done", result=executor_future.result())
+            else:
+                self._finish_job(job, "failed", error=executor_future.exception())
+        else:
+            logger.info("Результат отмененной задачи %d отброшен", job.job_id)
+
+        self._dispatch()
+
+    def _finish_job(self, job: ProcessingJob, status: str, result: Any = None,
+                    error: Optional[BaseException] = None) -> None:
+        """Фиксирует итог задачи и передает его ожидающему обработчику"""
+        job.status = status
+        self._running_jobs.pop(job.job_id, None)
+        JOBS_FINISHED.inc(status=status)
+        if job.started_at is not None:
+            JOB_DURATION_SECONDS.observe(time.monotonic() - job.started_at, status=status)
+
+        if job._result_future.done():
+            return
+        if error is not None:
+            job._result_future.set_exception(error)
+        else:
+            job._result_future.set_result(result)
+
+    def shutdown(self) -> None:
+        """Останавливает пул обработки, не дожидаясь выполняемых задач"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._progress_manager is not None:
+            self._progress_manager.shutdown()
+            self._progress_manager = None
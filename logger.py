@@ -1,5 +1,103 @@
+import atexit
+import copy
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Уровень логирования (DEBUG, INFO, WARNING, ...); DEBUG включается явно на время отладки
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Сколько отладочных сообщений с одной строки кода записывать за секунду (0 — без ограничения)
+LOG_DEBUG_RATE_LIMIT = int(os.getenv("LOG_DEBUG_RATE_LIMIT", "20"))
+
+# Очереди логгеров: (логгер, обработчик очереди, обработчик файла, фоновый поток записи)
+_queue_pipelines: list[tuple[logging.Logger, QueueHandler, logging.Handler, QueueListener]] = []
+
+
+class DebugRateLimitFilter(logging.Filter):
+    """
+    Ограничивает частоту отладочных сообщений с одной строки кода (например, по сообщению на пост).
+    Лишние сообщения отбрасываются до форматирования, а количество пропущенных
+    добавляется к следующему записанному сообщению с той же строки.
+    """
+
+    def __init__(self, max_records_per_second: int = LOG_DEBUG_RATE_LIMIT):
+        super().__init__()
+        self.max_records_per_second = max_records_per_second
+        self._lock = threading.Lock()
+        # (файл, строка) -> [начало текущей секунды, записано сообщений, пропущено сообщений]
+        self._windows: dict[tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.max_records_per_second <= 0:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get((record.pathname, record.lineno))
+            if window is None or now - window[0] >= 1:
+                skipped_records = window[2] if window is not None else 0
+                self._windows[(record.pathname, record.lineno)] = [now, 1, 0]
+            elif window[1] < self.max_records_per_second:
+                window[1] += 1
+                skipped_records = 0
+            else:
+                window[2] += 1
+                return False
+
+        if skipped_records:
+            record.msg = f"{record.msg} (пропущено похожих сообщений: {skipped_records})"
+        return True
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Обработчик, передающий записи в очередь фонового потока.
+    В вызывающем потоке только подставляются аргументы сообщения; время, формат строки
+    и трассировка исключения оформляются и записываются на диск в фоновом потоке.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Аргументы подставляются сразу: изменяемые объекты могут измениться до записи
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _attach_queue_pipeline(logger: logging.Logger, file_handler: logging.Handler) -> None:
+    """Подключает к логгеру обработчик файла через очередь и фоновый поток записи"""
+    record_queue = queue.SimpleQueue()
+    queue_handler = BackgroundQueueHandler(record_queue)
+    listener = QueueListener(record_queue, file_handler, respect_handler_level=True)
+    listener.start()
+
+    logger.addHandler(queue_handler)
+    _queue_pipelines.append((logger, queue_handler, file_handler, listener))
+
+
+def _stop_queue_pipelines() -> None:
+    """Дописывает оставшиеся в очередях записи при завершении процесса"""
+    for _, _, _, listener in _queue_pipelines:
+        listener.stop()
+
+
+def _use_direct_handlers_in_child() -> None:
+    """
+    В дочернем процессе после fork фоновых потоков записи нет, а процессы пулов завершаются
+    без atexit, поэтому логгеры пишут в файлы напрямую.
+    """
+    for logger, queue_handler, file_handler, _ in _queue_pipelines:
+        logger.removeHandler(queue_handler)
+        logger.addHandler(file_handler)
+    _queue_pipelines.clear()
+
+
+atexit.register(_stop_queue_pipelines)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_use_direct_handlers_in_child)
 
 
 def get_logger() -> logging.Logger:
@@ -9,7 +107,9 @@ def get_logger() -> logging.Logger:
     # Проверяем, не настроен ли уже логгер (чтобы избежать дублирования обработчиков)
 
     if not logger.hasHandlers():
-        logger.setLevel(logging.DEBUG)  # Уровень логирования можно настроить на DEBUG для максимального охвата
+        logger.setLevel(LOG_LEVEL)  # По умолчанию INFO, DEBUG задается через LOG_LEVEL
+        # Частые отладочные сообщения отбрасываются до форматирования
+        logger.addFilter(DebugRateLimitFilter())
         # Формат логирования
         log_formatter = logging.Formatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -28,7 +128,30 @@ def get_logger() -> logging.Logger:
         # Устанавливаем формат и уровень для обработчика файлов
         file_handler.setFormatter(log_formatter)
         file_handler.setLevel(logging.DEBUG)  # Логировать все сообщения начиная с DEBUG
-        # Добавляем обработчик в логгер
-        logger.addHandler(file_handler)
+        # Запись на диск выполняется в фоновом потоке, не блокируя цикл событий и обработку
+        _attach_queue_pipeline(logger, file_handler)
 
     return logger
+
+
+def get_span_logger() -> logging.Logger:
+    """Функция для получения логгера этапов обработки (JSON lines в отдельном файле)"""
+    # Дочерний логгер не передает записи в app.log
+    span_logger = logging.getLogger('my_app.spans')
+
+    if not span_logger.handlers:
+        span_logger.setLevel(logging.INFO)
+        span_logger.propagate = False
+
+        # Каждая запись — одна строка JSON без префиксов
+        file_handler = RotatingFileHandler(
+            'spans.jsonl',
+            maxBytes=10000000,  # Максимальный размер файла 10 МБ
+            backupCount=5,
+            encoding='utf-8',
+            delay=True         # Файл создается при первой записи
+        )
+        file_handler.setFormatter(logging.Formatter('%(message)s'))
+        _attach_queue_pipeline(span_logger, file_handler)
+
+    return span_logger
@@ -0,0 +1,257 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from alias_index import ALIAS_INDEX_VERSION
+from alias_matcher import AliasMatcher
+from company_mentions import CompanyKey, find_company_mentions_in_post
+from fuzzy_matcher import FUZZY_MATCHER_CONFIG
+from logger import get_logger
+from text_normalization import is_missing
+
+logger = get_logger()
+
+# Размер кэша результатов поиска упоминаний (0 — кэш отключен)
+MENTION_CACHE_SIZE = int(os.getenv("MENTION_CACHE_SIZE", "100000"))
+# Файл для сохранения кэша между запусками (пустое значение — кэш только в памяти)
+MENTION_CACHE_PATH = os.getenv("MENTION_CACHE_PATH", "")
+
+# Версия логики поиска упоминаний. Увеличивается при изменении find_company_mentions_in_post,
+# чтобы ранее сохраненные результаты не использовались.
+MENTION_MATCHING_VERSION = 3
+MENTION_CACHE_FORMAT_VERSION = 1
+
+
+def build_matcher_version(crm_version: str) -> str:
+    """
+    Возвращает версию результатов поиска: данные CRM, формат индекса, логика поиска и настройки нечеткого поиска.
+    Args: crm_version: Хэш исходных строк CRM
+    Returns: Строка версии
+    """
+    return f"{crm_version}:{ALIAS_INDEX_VERSION}:{MENTION_MATCHING_VERSION}:{FUZZY_MATCHER_CONFIG}"
+
+
+class MentionCache:
+    """
+    Потокобезопасный LRU-кэш результатов поиска упоминаний: хэш (версия + текст GPT) -> компании.
+    Может сохраняться в файл и загружаться при следующем запуске.
+    """
+
+    def __init__(self, max_size: int = MENTION_CACHE_SIZE, persist_path: Optional[str] = MENTION_CACHE_PATH):
+        """
+        Args: max_size: Максимальное количество записей
+            persist_path: Файл для сохранения кэша (None или пустая строка — не сохранять)
+        """
+        self.max_size = max_size
+        self.persist_path = persist_path or None
+        self._lock = threading.Lock()
+        # Порядок словаря — от давно использованных записей к недавним
+        self._entries: OrderedDict[bytes, tuple[CompanyKey, ...]] = OrderedDict()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+        if self.persist_path:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: bytes) -> Optional[tuple[CompanyKey, ...]]:
+        """Возвращает компании для ключа или None, если результата нет в кэше"""
+        with self._lock:
+            companies = self._entries.get(key)
+            if companies is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return companies
+
+    def put(self, key: bytes, companies: tuple[CompanyKey, ...]) -> None:
+        """Сохраняет компании для ключа"""
+        with self._lock:
+            self._entries[key] = companies
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def _load(self) -> None:
+        """Загружает сохраненный кэш; поврежденный или устаревший файл игнорируется"""
+        try:
+            with open(self.persist_path, "rb") as cache_file:
+                format_version, entries = pickle.load(cache_file)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning("Не удалось загрузить кэш упоминаний %s: %s", self.persist_path, e)
+            return
+
+        if format_version != MENTION_CACHE_FORMAT_VERSION:
+            return
+        # Записи сохранены от давних к свежим, поэтому порядок вытеснения восстанавливается
+        self._entries.update(entries[-self.max_size:])
+        logger.info("Кэш упоминаний загружен: %d записей", len(self._entries))
+
+    def save(self) -> None:
+        """Сохраняет кэш в файл атомарно, если он изменился с последнего сохранения"""
+        if not self.persist_path:
+            return
+
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = list(self._entries.items())
+            self._dirty = False
+
+        directory = os.path.dirname(self.persist_path) or "."
+        temporary_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(file_descriptor, "wb") as cache_file:
+                pickle.dump((MENTION_CACHE_FORMAT_VERSION, entries), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, self.persist_path)
+        except OSError as e:
+            logger.warning("Не удалось сохранить кэш упоминаний: %s", e)
+            if temporary_path is not None and os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+
+class MentionFinder:
+    """Поиск упоминаний компаний в постах без кэширования"""
+
+    def __init__(self, alias_matcher: AliasMatcher):
+        """
+        Args: alias_matcher: Автомат поиска псевдонимов
+        """
+        self.alias_matcher = alias_matcher
+
+    def __call__(self, post_gpt_text) -> Sequence[CompanyKey]:
+        """
+        Находит упоминания компаний в тексте поста.
+        Args: post_gpt_text: Текст поста, обработанный GPT
+        Returns: Компании без повторов в порядке появления в тексте
+        """
+        return find_company_mentions_in_post(post_gpt_text, self.alias_matcher)
+
+    def finish(self) -> None:
+        """Завершает обработку загрузки"""
+
+
+class CachedMentionFinder(MentionFinder):
+    """
+    Поиск упоминаний в постах с кэшированием по тексту GPT.
+    Повторяющиеся тексты (репосты, шаблонные вакансии, один пост в нескольких группах)
+    обрабатываются один раз, дальше стоят одного вычисления хэша.
+    """
+
+    def __init__(self, alias_matcher: AliasMatcher, crm_version: str, mention_cache: MentionCache,
+                 record_new_entries: bool = False):
+        """
+        Args: alias_matcher: Автомат поиска псевдонимов
+            crm_version: Хэш исходных строк CRM, по которой построен автомат
+            mention_cache: Кэш результатов
+            record_new_entries: Запоминать новые записи кэша в new_entries (процессы пула передают их родителю)
+        """
+        super().__init__(alias_matcher)
+        self.mention_cache = mention_cache
+        self.hits = 0
+        self.misses = 0
+        self.new_entries: Optional[list[tuple[bytes, tuple[CompanyKey, ...]]]] = [] if record_new_entries else None
+        # Хэш версии вычисляется один раз, для каждого текста копируется и дополняется
+        self._version_hash = hashlib.blake2b(build_matcher_version(crm_version).encode("utf-8") + b"\x00",
+                                             digest_size=16)
+
+    def lookup(self, post_gpt_text) -> tuple[Optional[bytes], Optional[tuple[CompanyKey, ...]]]:
+        """
+        Ищет результат в кэше, не выполняя поиск.
+        Args: post_gpt_text: Текст поста, обработанный GPT
+        Returns: Пара (ключ кэша, компании или None при промахе); для пустого текста ключа нет, компаний тоже
+        """
+        if is_missing(post_gpt_text):
+            return None, ()
+
+        text_hash = self._version_hash.copy()
+        text_hash.update(str(post_gpt_text).encode("utf-8"))
+        key = text_hash.digest()
+
+        companies = self.mention_cache.get(key)
+        if companies is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return key, companies
+
+    def add_entries(self, entries: Sequence[tuple[bytes, tuple[CompanyKey, ...]]]) -> None:
+        """Сохраняет в кэш результаты, найденные в другом процессе"""
+        for key, companies in entries:
+            self.mention_cache.put(key, companies)
+
+    def __call__(self, post_gpt_text) -> tuple[CompanyKey, ...]:
+        """
+        Находит упоминания компаний в тексте поста, используя кэш.
+        Args: post_gpt_text: Текст поста, обработанный GPT
+        Returns: Компании без повторов в порядке появления в тексте
+        """
+        key, companies = self.lookup(post_gpt_text)
+        if companies is not None:
+            return companies
+        return self.find_and_store(key, post_gpt_text)
+
+    def find_and_store(self, key: bytes, post_gpt_text) -> tuple[CompanyKey, ...]:
+        """
+        Находит упоминания в тексте, которого нет в кэше, и сохраняет результат.
+        Args: key: Ключ кэша, полученный из lookup
+            post_gpt_text: Текст поста, обработанный GPT
+        Returns: Компании без повторов в порядке появления в тексте
+        """
+        companies = tuple(find_company_mentions_in_post(post_gpt_text, self.alias_matcher))
+        self.mention_cache.put(key, companies)
+        if self.new_entries is not None:
+            self.new_entries.append((key, companies))
+        return companies
+
+    def finish(self) -> None:
+        """Записывает статистику попаданий в лог и сохраняет кэш на диск, если это настроено"""
+        lookups = self.hits + self.misses
+        if lookups:
+            logger.info("Кэш упоминаний: попаданий %d из %d (%.1f%%), записей в кэше %d",
+                        self.hits, lookups, self.hits / lookups * 100, len(self.mention_cache))
+        self.mention_cache.save()
+
+
+_default_cache: Optional[MentionCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_mention_cache() -> Optional[MentionCache]:
+    """
+    Возвращает общий для процесса кэш упоминаний, создавая его при первом обращении.
+    Returns: Кэш или None, если он отключен
+    """
+    global _default_cache
+    if MENTION_CACHE_SIZE <= 0:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = MentionCache()
+        return _default_cache
+
+
+def create_mention_finder(alias_matcher: AliasMatcher, crm_version: Optional[str]) -> MentionFinder:
+    """
+    Создает функцию поиска упоминаний в посте: с кэшем, если он включен и известна версия CRM.
+    Args: alias_matcher: Автомат поиска псевдонимов
+        crm_version: Хэш исходных строк CRM (None — без кэша)
+    Returns: Функция текст GPT -> компании
+    """
+    mention_cache = get_mention_cache()
+    if mention_cache is None or crm_version is None:
+        return MentionFinder(alias_matcher)
+    return CachedMentionFinder(alias_matcher, crm_version, mention_cache)
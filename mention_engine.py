@@ -0,0 +1,338 @@
+import os
+import threading
+from datetime import datetime
+from typing import Optional, Sequence
+
+from company_mentions import MentionAggregator
+from crm_cache import CrmSnapshot
+from crm_table import CrmTable
+from crm_sources import (
+    CrmSource, GoogleCrmSource, LocalFileCrmSource, StoredIndexCrmSource, UploadedWorkbookCrmSource,
+)
+from google_client import GoogleSheetsClientHolder
+from instrumentation import job_trace, span, timed_iter
+from logger import get_logger
+from mention_store import describe_report_period, get_mention_store
+from parallel_matching import MatchingPool, aggregate_posts
+from post_readers import estimate_post_count, iter_posts
+from progress import ProgressChannel, ProgressTracker
+from report_sinks import (
+    PROCESSED_REPORT, SUMMARY_REPORT, FileReportSink, GoogleSheetReportSink, ReportOutput, ReportSink,
+)
+from report_writer import REPORT_FORMAT, REPORT_WRITERS
+
+logger = get_logger()
+
+CREDENTIALS_FILE = "credentials.json"
+
+
+class MentionEngine:
+    """
+    Общее ядро обработки для всех вариантов бота: источники CRM, поиск упоминаний и получатели отчета.
+    Снимки CRM, автоматы поиска, пул процессов поиска упоминаний и клиент Google Sheets создаются один раз
+    на процесс, поэтому один процесс обслуживает и выгрузку в файл, и запись в Google Таблицу.
+    """
+
+    def __init__(self, crm_sources: Sequence[CrmSource], report_sinks: Sequence[ReportSink]):
+        """
+        Args: crm_sources: Доступные источники CRM
+            report_sinks: Доступные получатели отчета
+        """
+        self.crm_sources = {crm_source.name: crm_source for crm_source in crm_sources}
+        self.report_sinks = {report_sink.name: report_sink for report_sink in report_sinks}
+        # Процессы поиска упоминаний переиспользуются между файлами, пока не сменится версия CRM
+        self.matching_pool = MatchingPool()
+        self._lock = threading.Lock()
+
+    def get_report_sink(self, sink_name: str) -> ReportSink:
+        """
+        Возвращает получателя отчета по названию. Файловые получатели (xlsx, csv, parquet) создаются по запросу,
+        "file" означает файл в формате REPORT_FORMAT.
+        Args: sink_name: Название получателя
+        Returns: Получатель отчета
+        Raises: ValueError если получатель не настроен
+        """
+        if sink_name == "file":
+            sink_name = REPORT_FORMAT
+        with self._lock:
+            report_sink = self.report_sinks.get(sink_name)
+            if report_sink is None and sink_name in REPORT_WRITERS:
+                report_sink = self.report_sinks[sink_name] = FileReportSink(sink_name)
+        if report_sink is None:
+            raise ValueError(f"Получатель отчета {sink_name} не настроен")
+        return report_sink
+
+    def select_crm_source(self, source_names: Sequence[str], file_path: Optional[str] = None) -> CrmSource:
+        """
+        Выбирает первый доступный источник CRM из списка.
+        Args: source_names: Названия источников в порядке приоритета
+            file_path: Путь к загруженному файлу (None — отчет без загрузки)
+        Returns: Источник CRM
+        Raises: ValueError если ни один источник недоступен
+        """
+        for source_name in source_names:
+            crm_source = self.crm_sources.get(source_name)
+            if crm_source is not None and crm_source.is_available(file_path):
+                return crm_source
+
+        if file_path is not None:
+            raise ValueError("Нет данных CRM: загрузите xlsx с листом 'для ВПР' "
+                             "или задайте CRM_FILE_PATH / GOOGLE_SHEET_KEY")
+        raise ValueError("Нет данных CRM для отчета: задайте CRM_FILE_PATH, GOOGLE_SHEET_KEY "
+                         "или ALIAS_INDEX_DIRECTORY")
+
+    def load_crm(self, source_names: Sequence[str], file_path: Optional[str] = None) -> CrmSnapshot:
+        """
+        Загружает снимок CRM из первого доступного источника.
+        Args: source_names: Названия источников в порядке приоритета
+            file_path: Путь к загруженному файлу
+        Returns: Снимок CRM
+        """
+        crm_source = self.select_crm_source(source_names, file_path)
+        with span("crm_load", source=crm_source.name) as crm_span:
+            crm_snapshot = crm_source.get_snapshot(file_path)
+            crm_span.set_rows(len(crm_snapshot.canonical_to_crm))
+        logger.info("Загружено компаний из CRM (%s): %d", crm_source.name, len(crm_snapshot.canonical_to_crm))
+        return crm_snapshot
+
+    def match_file(self, file_path: str, post_format: Optional[str], crm_snapshot: CrmSnapshot,
+                   progress_tracker: Optional[ProgressTracker] = None) -> MentionAggregator:
+        """
+        Находит упоминания компаний в файле по уже загруженному снимку CRM.
+        Args: file_path: Путь к файлу с постами
+            post_format: Формат файла с постами (если не указан, определяется автоматически)
+            crm_snapshot: Снимок CRM
+            progress_tracker: Счетчик прогресса для сообщений пользователю
+        Returns: Накопитель со статистикой упоминаний
+        """
+        # Посты читаются потоково и сразу учитываются в статистике;
+        # уже известные хранилищу посты повторно не обрабатываются
+        # (время чтения файла учитывается отдельным этапом parse внутри match)
+        posts = timed_iter("parse", iter_posts(file_path, post_format), format=post_format)
+        mention_aggregator = MentionAggregator()
+        if progress_tracker is not None:
+            progress_tracker.aggregator = mention_aggregator
+            progress_tracker.company_names = crm_snapshot.canonical_to_crm.canonical_names
+            posts = progress_tracker.track(posts)
+
+        mention_store = get_mention_store()
+        with span("match") as match_span:
+            if mention_store is not None:
+                mention_store.ingest_posts(posts, crm_snapshot.alias_matcher, crm_snapshot.canonical_to_crm,
+                                           crm_snapshot.content_hash, mention_aggregator, self.matching_pool)
+            else:
+                # Повторяющиеся тексты GPT обрабатываются один раз, большие выгрузки — в нескольких процессах
+                aggregate_posts(posts, crm_snapshot.alias_matcher, crm_snapshot.content_hash, mention_aggregator,
+                                self.matching_pool)
+            match_span.set_attribute("companies", len(mention_aggregator))
+
+        return mention_aggregator
+
+    def write_reports(self, mention_aggregator: MentionAggregator, canonical_to_crm: CrmTable, report_kind: str,
+                      path_prefix: str, sink_names: Sequence[str]) -> list[ReportOutput]:
+        """
+        Записывает отчет во все указанные получатели.
+        Args: mention_aggregator: Накопитель со статистикой упоминаний
+            canonical_to_crm: Таблица CRM
+            report_kind: Вид отчета (PROCESSED_REPORT, SUMMARY_REPORT или MERGED_REPORT)
+            path_prefix: Префикс пути для файлов отчета
+            sink_names: Названия получателей
+        Returns: Результаты записи в порядке sink_names
+        """
+        report_sinks = [self.get_report_sink(sink_name) for sink_name in sink_names]
+        return [report_sink.write(mention_aggregator, canonical_to_crm, report_kind, path_prefix)
+                for report_sink in report_sinks]
+
+    def process_file(self, file_path: str, post_format: Optional[str], source_names: Sequence[str],
+                     sink_names: Sequence[str],
+                     progress_channel: Optional[ProgressChannel] = None) -> list[ReportOutput]:
+        """
+        Обрабатывает загруженный файл и записывает отчет. Файлы отчета сохраняются рядом с загруженным.
+        Args: file_path: Путь к загруженному файлу
+            post_format: Формат файла с постами
+            source_names: Названия источников CRM в порядке приоритета
+            sink_names: Названия получателей отчета
+            progress_channel: Канал, в который публикуется прогресс для пользователя
+        Returns: Результаты записи отчета
+        """
+        logger.info("Начало обработки файла: %s", file_path)
+        progress_tracker = None
+        if progress_channel is not None:
+            progress_tracker = ProgressTracker(progress_channel, estimate_post_count(file_path, post_format))
+            progress_tracker.start_stage("crm_load")
+
+        crm_snapshot = self.load_crm(source_names, file_path)
+        mention_aggregator = self.match_file(file_path, post_format, crm_snapshot, progress_tracker)
+
+        if progress_tracker is not None:
+            progress_tracker.start_stage("write_report")
+        report_outputs = self.write_reports(mention_aggregator, crm_snapshot.canonical_to_crm, PROCESSED_REPORT,
+                                            os.path.splitext(file_path)[0], sink_names)
+        logger.info("Формирование отчета завершено: %d записей", len(mention_aggregator))
+        return report_outputs
+
+    def build_summary_report(self, since: Optional[datetime], until: Optional[datetime], path_prefix: str,
+                             source_names: Sequence[str], sink_names: Sequence[str]) -> list[ReportOutput]:
+        """
+        Строит отчет по всем постам из хранилища упоминаний за период.
+        Args: since: Начало периода (None — без ограничения)
+            until: Конец периода (None — без ограничения)
+            path_prefix: Префикс пути для файлов отчета
+            source_names: Названия источников CRM в порядке приоритета
+            sink_names: Названия получателей отчета
+        Returns: Результаты записи отчета
+        """
+        mention_store = get_mention_store()
+        if mention_store is None:
+            raise ValueError("Хранилище упоминаний отключено (переменная MENTION_STORE_PATH)")
+
+        # Загруженного файла нет, поэтому после остальных источников используется последний сохраненный индекс
+        summary_source_names = [name for name in source_names if name != UploadedWorkbookCrmSource.name]
+        summary_source_names.append(StoredIndexCrmSource.name)
+        crm_snapshot = self.load_crm(summary_source_names)
+
+        with span("aggregate") as aggregate_span:
+            mention_aggregator = mention_store.aggregate_mentions(since, until)
+            aggregate_span.set_rows(len(mention_aggregator))
+        logger.info("Сводный отчет %s: %d записей", describe_report_period(since, until), len(mention_aggregator))
+
+        return self.write_reports(mention_aggregator, crm_snapshot.canonical_to_crm, SUMMARY_REPORT,
+                                  path_prefix, sink_names)
+
+    def _select_permanent_source(self, source_names: Sequence[str]) -> Optional[CrmSource]:
+        """
+        Выбирает первый доступный источник CRM, не зависящий от загруженного файла.
+        Args: source_names: Названия источников CRM в порядке приоритета
+        Returns: Источник CRM или None, если постоянных источников нет (только загруженные файлы)
+        """
+        for source_name in source_names:
+            if source_name == UploadedWorkbookCrmSource.name:
+                continue
+            crm_source = self.crm_sources.get(source_name)
+            if crm_source is not None and crm_source.is_available():
+                return crm_source
+        return None
+
+    def refresh_crm(self, source_names: Sequence[str]) -> Optional[CrmSnapshot]:
+        """
+        Сбрасывает кэши источников CRM и загружает данные заново из первого доступного постоянного источника.
+        Args: source_names: Названия источников CRM
+        Returns: Новый снимок CRM или None, если постоянных источников нет (только загруженные файлы)
+        """
+        for source_name in source_names:
+            crm_source = self.crm_sources.get(source_name)
+            if crm_source is not None:
+                crm_source.invalidate()
+
+        crm_source = self._select_permanent_source(source_names)
+        return crm_source.get_snapshot() if crm_source is not None else None
+
+    def prewarm(self, source_names: Sequence[str]) -> Optional[CrmSnapshot]:
+        """
+        Заранее загружает снимок CRM из первого доступного постоянного источника и строит по нему автомат поиска,
+        чтобы первый файл не ждал чтения CRM и построения индекса псевдонимов.
+        Args: source_names: Названия источников CRM в порядке приоритета
+        Returns: Снимок CRM или None, если постоянных источников нет
+        """
+        crm_source = self._select_permanent_source(source_names)
+        if crm_source is None:
+            return None
+        with span("prewarm", source=crm_source.name) as prewarm_span:
+            crm_snapshot = crm_source.get_snapshot()
+            # Автомат поиска строится при первом обращении к снимку
+            crm_snapshot.alias_matcher
+            prewarm_span.set_rows(len(crm_snapshot.canonical_to_crm))
+        return crm_snapshot
+
+    def close(self) -> None:
+        """Останавливает процессы поиска упоминаний"""
+        self.matching_pool.close()
+
+
+def build_engine_from_environment() -> MentionEngine:
+    """
+    Создает ядро по переменным окружения GOOGLE_SHEET_KEY, GOOGLE_CRM_SHEET_NAME и CRM_FILE_PATH.
+    Переменные читаются при вызове, чтобы учесть значения из .env.
+    Returns: Ядро обработки
+    """
+    google_sheet_key = os.getenv("GOOGLE_SHEET_KEY")
+    crm_file_path = os.getenv("CRM_FILE_PATH")
+
+    crm_sources: list[CrmSource] = [UploadedWorkbookCrmSource(), StoredIndexCrmSource()]
+    report_sinks: list[ReportSink] = [FileReportSink(REPORT_FORMAT)]
+    if crm_file_path:
+        crm_sources.append(LocalFileCrmSource(crm_file_path))
+    if google_sheet_key:
+        # Один авторизованный клиент на процесс для чтения CRM и записи отчетов
+        client_holder = GoogleSheetsClientHolder(CREDENTIALS_FILE)
+        crm_sources.append(GoogleCrmSource(client_holder, google_sheet_key,
+                                           os.getenv("GOOGLE_CRM_SHEET_NAME", "СРМ")))
+        report_sinks.append(GoogleSheetReportSink(client_holder, google_sheet_key))
+    return MentionEngine(crm_sources, report_sinks)
+
+
+_engine: Optional[MentionEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> MentionEngine:
+    """
+    Возвращает ядро обработки процесса, создавая его при первом обращении
+    (в том числе в процессах пула обработки).
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = build_engine_from_environment()
+        return _engine
+
+
+def close_engine() -> None:
+    """Останавливает процессы поиска упоминаний ядра процесса, если ядро было создано"""
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+
+
+def prewarm_engine(source_names: Sequence[str]) -> None:
+    """
+    Подготавливает ядро процесса: загружает модули обработки, снимок CRM и автомат поиска.
+    Используется для инициализации процессов пула, поэтому ошибки CRM только записываются в лог
+    (данные будут загружены при обработке первого файла).
+    Args: source_names: Названия источников CRM в порядке приоритета
+    """
+    try:
+        get_engine().prewarm(source_names)
+    except Exception as error:
+        logger.warning("Не удалось заранее загрузить CRM: %s", error)
+
+
+def process_file_job(file_path: str, post_format: Optional[str], source_names: Sequence[str],
+                     sink_names: Sequence[str],
+                     progress_channel: Optional[ProgressChannel] = None) -> list[ReportOutput]:
+    """
+    Задача пула обработки: обрабатывает загруженный файл и записывает отчет.
+    Args: file_path: Путь к загруженному файлу
+        post_format: Формат файла с постами
+        source_names: Названия источников CRM в порядке приоритета
+        sink_names: Названия получателей отчета
+        progress_channel: Канал, в который публикуется прогресс для пользователя
+    Returns: Результаты записи отчета
+    """
+    with job_trace("process_file", file=os.path.basename(file_path), format=post_format):
+        return get_engine().process_file(file_path, post_format, source_names, sink_names, progress_channel)
+
+
+def summary_report_job(path_prefix: str, since: Optional[datetime], until: Optional[datetime],
+                       source_names: Sequence[str], sink_names: Sequence[str]) -> list[ReportOutput]:
+    """
+    Задача пула обработки: сводный отчет по хранилищу упоминаний за период.
+    Args: path_prefix: Префикс пути для файлов отчета
+        since: Начало периода (None — без ограничения)
+        until: Конец периода (None — без ограничения)
+        source_names: Названия источников CRM в порядке приоритета
+        sink_names: Названия получателей отчета
+    Returns: Результаты записи отчета
+    """
+    with job_trace("summary_report", since=since, until=until):
+        return get_engine().build_summary_report(since, until, path_prefix, source_names, sink_names)
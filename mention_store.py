@@ -0,0 +1,356 @@
+import hashlib
+import json
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from itertools import groupby, islice
+from typing import Iterable, Optional, Sequence
+
+from alias_matcher import AliasMatcher
+from company_mentions import CompanyKey, MentionAggregator
+from crm_table import CrmTable
+from logger import get_logger
+from mention_cache import build_matcher_version
+from parallel_matching import MatchingPool, ParallelMentionMatcher
+from post_readers import GroupLink
+from text_normalization import is_missing
+
+logger = get_logger()
+
+# Файл базы накопленных упоминаний (пустое значение отключает хранилище)
+MENTION_STORE_PATH = os.getenv("MENTION_STORE_PATH", os.path.join("data", "mentions.sqlite3"))
+# Сколько постов сверяется с базой за один запрос
+MENTION_STORE_BATCH_SIZE = int(os.getenv("MENTION_STORE_BATCH_SIZE", "5000"))
+
+REPORT_DATE_FORMAT = "%Y-%m-%d"
+
+# posts.link — ключ поста: ссылка на пост или, для постов только со ссылкой на группу, "ссылка хэш_текста";
+# posts.group_link — ссылка на группу для таких постов (она и выводится в отчете)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    link TEXT PRIMARY KEY,
+    text_hash TEXT NOT NULL,
+    group_link TEXT,
+    matcher_version TEXT NOT NULL,
+    first_seen_at TEXT NOT NULL,
+    last_seen_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_first_seen_at ON posts (first_seen_at);
+CREATE TABLE IF NOT EXISTS post_mentions (
+    link TEXT NOT NULL REFERENCES posts (link) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    company TEXT NOT NULL,
+    PRIMARY KEY (link, position)
+) WITHOUT ROWID;
+"""
+
+
+def hash_post_text(gpt_text) -> str:
+    """
+    Вычисляет хэш текста поста, чтобы обнаруживать посты, текст которых изменился при повторной выгрузке.
+    Args: gpt_text: Текст поста, обработанный GPT
+    Returns: Хэш текста в шестнадцатеричном виде
+    """
+    text = "" if is_missing(gpt_text) else str(gpt_text)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def build_post_key(post_link: str, text_hash: str) -> str:
+    """
+    Возвращает ключ поста в хранилище. Ссылка на пост определяет пост однозначно, а ссылка на группу
+    общая для всех постов группы, поэтому такие посты различаются еще и хэшем текста.
+    Args: post_link: Ссылка на пост (GroupLink, если вместо нее подставлена ссылка на группу)
+        text_hash: Хэш текста поста
+    Returns: Ключ поста
+    """
+    if isinstance(post_link, GroupLink):
+        return f"{post_link} {text_hash}"
+    return post_link
+
+
+def _utc_now() -> str:
+    """Возвращает текущее время UTC в формате ISO 8601"""
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class IngestStats:
+    """Итоги загрузки постов в хранилище"""
+
+    def __init__(self):
+        self.new_posts = 0
+        self.stored_posts = 0
+        self.posts_without_link = 0
+        self.posts_with_group_link = 0
+
+    def __str__(self) -> str:
+        return (f"новых постов {self.new_posts}, взято из хранилища {self.stored_posts}, "
+                f"без ссылки {self.posts_without_link}, только со ссылкой на группу {self.posts_with_group_link}")
+
+
+class MentionStore:
+    """
+    Накопительное хранилище упоминаний компаний в SQLite.
+    Для каждого поста (по ссылке, см. build_post_key) хранятся найденные компании, хэш текста и версия CRM, с которой
+    они найдены. Повторно выгруженные посты с тем же текстом и той же CRM не обрабатываются заново.
+    Компании хранятся по названию, а не по номеру в таблице CRM: номера меняются вместе с CRM.
+    Каждая операция открывает свое соединение, поэтому хранилище можно использовать из потоков и процессов пула.
+    """
+
+    def __init__(self, database_path: str = MENTION_STORE_PATH):
+        """
+        Args: database_path: Путь к файлу базы SQLite
+        """
+        self.database_path = database_path
+
+        database_directory = os.path.dirname(database_path)
+        if database_directory:
+            os.makedirs(database_directory, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.executescript(SCHEMA)
+            self._add_group_link_column(connection)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открывает соединение с базой"""
+        connection = sqlite3.connect(self.database_path, timeout=30)
+        connection.execute("PRAGMA foreign_keys = ON")
+        return connection
+
+    @staticmethod
+    def _add_group_link_column(connection: sqlite3.Connection) -> None:
+        """Добавляет колонку group_link в базы, созданные до ее появления"""
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(posts)")}
+        if "group_link" in columns:
+            return
+        try:
+            connection.execute("ALTER TABLE posts ADD COLUMN group_link TEXT")
+        except sqlite3.OperationalError as error:
+            # Колонку мог одновременно добавить другой процесс
+            if "duplicate column" not in str(error):
+                raise
+
+    @staticmethod
+    def _load_stored_mentions(connection: sqlite3.Connection, links: list[str], matcher_version: str,
+                              canonical_to_crm: CrmTable) -> dict[str, tuple[str, list[CompanyKey]]]:
+        """
+        Загружает сохраненные упоминания для ключей постов, обработанных текущей версией CRM.
+        Ключи передаются одним параметром JSON, поэтому размер пакета не ограничен числом параметров SQLite.
+        Названия компаний CRM заменяются номерами, как в результатах поиска.
+        Returns: Словарь ключ поста -> (хэш текста, компании в порядке появления)
+        """
+        stored_posts: dict[str, tuple[str, list[CompanyKey]]] = {}
+        for link, text_hash, company in connection.execute(
+            "SELECT posts.link, posts.text_hash, post_mentions.company FROM posts "
+            "LEFT JOIN post_mentions ON post_mentions.link = posts.link "
+            "WHERE posts.matcher_version = ? AND posts.link IN (SELECT value FROM json_each(?)) "
+            "ORDER BY posts.link, post_mentions.position",
+            (matcher_version, json.dumps(links)),
+        ):
+            stored_post = stored_posts.get(link)
+            if stored_post is None:
+                stored_post = stored_posts[link] = (text_hash, [])
+            if company is not None:
+                company_id = canonical_to_crm.company_id(company)
+                stored_post[1].append(company if company_id is None else company_id)
+        return stored_posts
+
+    def ingest_posts(self, posts: Iterable[tuple[Optional[str], object]], alias_matcher: AliasMatcher,
+                     canonical_to_crm: CrmTable, crm_version: str, aggregator: Optional[MentionAggregator] = None,
+                     matching_pool: Optional[MatchingPool] = None) -> MentionAggregator:
+        """
+        Учитывает посты загрузки: новые и изменившиеся посты обрабатываются и сохраняются,
+        для уже известных постов компании берутся из хранилища.
+        Посты без ссылки обрабатываются, но не сохраняются (их нельзя сопоставить между загрузками).
+        Посты только со ссылкой на группу сохраняются под ключом из ссылки и хэша текста (build_post_key).
+        Args: posts: Итерируемый набор пар (ссылка на пост, текст GPT)
+            alias_matcher: Автомат поиска псевдонимов
+            canonical_to_crm: Таблица CRM, по которой построен автомат
+            crm_version: Версия данных CRM (хэш исходных строк), с которой ищутся упоминания
+            aggregator: Накопитель статистики загрузки (по умолчанию создается новый)
+            matching_pool: Долгоживущий пул процессов поиска (по умолчанию пул создается на время загрузки)
+        Returns: Накопитель со статистикой упоминаний по всем постам загрузки
+        """
+        aggregator = aggregator if aggregator is not None else MentionAggregator()
+        matcher_version = build_matcher_version(crm_version)
+        stats = IngestStats()
+        posts_iterator = iter(posts)
+
+        # Новые посты обрабатываются через кэш результатов и, если включено, в нескольких процессах
+        with ParallelMentionMatcher(alias_matcher, crm_version, matching_pool) as mention_matcher, \
+                closing(self._connect()) as connection:
+            batch_size = max(MENTION_STORE_BATCH_SIZE, mention_matcher.batch_size)
+            while True:
+                batch = list(islice(posts_iterator, batch_size))
+                if not batch:
+                    break
+
+                seen_at = _utc_now()
+                text_hashes = [hash_post_text(gpt_text) if post_link else None for post_link, gpt_text in batch]
+                post_keys = [
+                    build_post_key(post_link, text_hash) if post_link else None
+                    for (post_link, _), text_hash in zip(batch, text_hashes)
+                ]
+                links = list({post_key for post_key in post_keys if post_key})
+                stored_posts = (self._load_stored_mentions(connection, links, matcher_version, canonical_to_crm)
+                                if links else {})
+
+                # Для известных постов компании берутся из хранилища, остальные посты обрабатываются пакетом
+                post_companies: list[Optional[Sequence[CompanyKey]]] = [None] * len(batch)
+                pending_indexes = []
+                for post_index, (post_link, _) in enumerate(batch):
+                    if not post_link:
+                        stats.posts_without_link += 1
+                        pending_indexes.append(post_index)
+                        continue
+                    if isinstance(post_link, GroupLink):
+                        stats.posts_with_group_link += 1
+
+                    text_hash = text_hashes[post_index]
+                    stored_post = stored_posts.get(post_keys[post_index])
+                    if stored_post is not None and stored_post[0] == text_hash:
+                        post_companies[post_index] = stored_post[1]
+                        stats.stored_posts += 1
+                    else:
+                        pending_indexes.append(post_index)
+                        stats.new_posts += 1
+
+                pending_texts = [batch[post_index][1] for post_index in pending_indexes]
+                matched_companies = mention_matcher.match_texts(pending_texts)
+
+                new_posts = {}
+                for post_index, companies in zip(pending_indexes, matched_companies):
+                    post_companies[post_index] = companies
+                    post_link = batch[post_index][0]
+                    if post_link:
+                        group_link = str(post_link) if isinstance(post_link, GroupLink) else None
+                        new_posts[post_keys[post_index]] = (text_hashes[post_index], companies, group_link)
+
+                for (post_link, _), companies in zip(batch, post_companies):
+                    aggregator.add_post(post_link, companies)
+
+                with connection:
+                    self._save_posts(connection, new_posts, canonical_to_crm, matcher_version, seen_at)
+                    connection.execute(
+                        "UPDATE posts SET last_seen_at = ? WHERE link IN (SELECT value FROM json_each(?))",
+                        (seen_at, json.dumps([link for link in stored_posts if link not in new_posts])),
+                    )
+
+        logger.info("Посты загружены в хранилище упоминаний: %s", stats)
+        return aggregator
+
+    @staticmethod
+    def _save_posts(connection: sqlite3.Connection,
+                    new_posts: dict[str, tuple[str, Sequence[CompanyKey], Optional[str]]],
+                    canonical_to_crm: CrmTable, matcher_version: str, seen_at: str) -> None:
+        """
+        Сохраняет (или заменяет) упоминания постов: ключ поста -> (хэш текста, компании, ссылка на группу).
+        Компании CRM сохраняются под каноническими названиями.
+        """
+        if not new_posts:
+            return
+
+        canonical_names = canonical_to_crm.canonical_names
+
+        connection.executemany(
+            "INSERT INTO posts (link, text_hash, group_link, matcher_version, first_seen_at, last_seen_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (link) DO UPDATE SET text_hash = excluded.text_hash, "
+            "matcher_version = excluded.matcher_version, last_seen_at = excluded.last_seen_at",
+            (
+                (link, text_hash, group_link, matcher_version, seen_at, seen_at)
+                for link, (text_hash, _, group_link) in new_posts.items()
+            ),
+        )
+        connection.executemany("DELETE FROM post_mentions WHERE link = ?", ((link,) for link in new_posts))
+        connection.executemany(
+            "INSERT INTO post_mentions (link, position, company) VALUES (?, ?, ?)",
+            (
+                (link, position, canonical_names[company] if isinstance(company, int) else company)
+                for link, (_, companies, _) in new_posts.items()
+                for position, company in enumerate(companies)
+            ),
+        )
+
+    def aggregate_mentions(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                           aggregator: Optional[MentionAggregator] = None) -> MentionAggregator:
+        """
+        Собирает статистику по всем сохраненным постам, впервые загруженным в указанном интервале.
+        Args: since: Начало интервала включительно (None — без ограничения)
+            until: Конец интервала не включительно (None — без ограничения)
+            aggregator: Накопитель статистики (по умолчанию создается новый)
+        Returns: Накопитель со статистикой упоминаний
+        """
+        aggregator = aggregator if aggregator is not None else MentionAggregator()
+
+        conditions = []
+        parameters = []
+        if since is not None:
+            conditions.append("posts.first_seen_at >= ?")
+            parameters.append(since.astimezone(timezone.utc).isoformat(timespec="seconds"))
+        if until is not None:
+            conditions.append("posts.first_seen_at < ?")
+            parameters.append(until.astimezone(timezone.utc).isoformat(timespec="seconds"))
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with closing(self._connect()) as connection:
+            # Для постов только со ссылкой на группу в отчет попадает ссылка на группу, а не ключ поста
+            rows = connection.execute(
+                "SELECT posts.link, COALESCE(posts.group_link, posts.link), post_mentions.company FROM posts "
+                "JOIN post_mentions ON post_mentions.link = posts.link "
+                f"{where_clause} ORDER BY posts.first_seen_at, posts.rowid, post_mentions.position",
+                parameters,
+            )
+            for _, post_rows in groupby(rows, key=lambda row: row[0]):
+                post_rows = list(post_rows)
+                aggregator.add_post(post_rows[0][1], [company for _, _, company in post_rows])
+
+        return aggregator
+
+
+_default_store: Optional[MentionStore] = None
+
+
+def get_mention_store() -> Optional[MentionStore]:
+    """
+    Возвращает хранилище упоминаний по пути MENTION_STORE_PATH, открывая его при первом обращении.
+    Returns: Хранилище или None, если оно отключено
+    """
+    global _default_store
+    if _default_store is None and MENTION_STORE_PATH:
+        _default_store = MentionStore(MENTION_STORE_PATH)
+    return _default_store
+
+
+def parse_report_period(arguments: Sequence[str]) -> tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Разбирает период отчета из аргументов команды: [дата начала] [дата окончания] в формате ГГГГ-ММ-ДД.
+    Дата окончания включается в период целиком.
+    Args: arguments: Аргументы команды
+    Returns: Пара (начало, конец) для aggregate_mentions
+    Raises: ValueError если даты указаны неверно
+    """
+    if len(arguments) > 2:
+        raise ValueError("Укажите не более двух дат: начало и конец периода")
+    try:
+        dates = [datetime.strptime(argument, REPORT_DATE_FORMAT) for argument in arguments]
+    except ValueError as error:
+        raise ValueError("Даты указываются в формате ГГГГ-ММ-ДД") from error
+
+    since = dates[0] if dates else None
+    until = dates[1] + timedelta(days=1) if len(dates) > 1 else None
+    if since is not None and until is not None and since >= until:
+        raise ValueError("Дата начала периода позже даты окончания")
+    return since, until
+
+
+def describe_report_period(since: Optional[datetime], until: Optional[datetime]) -> str:
+    """Возвращает описание периода отчета для сообщений пользователю"""
+    if since is None and until is None:
+        return "за все время"
+    parts = []
+    if since is not None:
+        parts.append(f"с {since.strftime(REPORT_DATE_FORMAT)}")
+    if until is not None:
+        parts.append(f"по {(until - timedelta(days=1)).strftime(REPORT_DATE_FORMAT)}")
+    return " ".join(parts)
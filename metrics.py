@@ -0,0 +1,291 @@
+import bisect
+import os
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Sequence
+
+from logger import get_logger
+
+logger = get_logger()
+
+# Порт HTTP-эндпоинта /metrics в формате Prometheus (пустое значение или 0 — эндпоинт не запускается)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0") or "0")
+# Адрес, на котором слушает эндпоинт (по умолчанию только локальные подключения)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+API_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape_label_value(value) -> str:
+    """Экранирует значение метки по правилам текстового формата Prometheus"""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(label_names: Sequence[str], label_values: tuple, extra: str = "") -> str:
+    """Формирует блок меток {name="value",...}"""
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    """Форматирует число: целые без дробной части"""
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """Базовый класс метрики с метками; значения хранятся по кортежу значений меток"""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        """
+        Args: name: Имя метрики
+            documentation: Описание для строки HELP
+            label_names: Имена меток
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: dict) -> tuple:
+        """Возвращает значения меток в порядке label_names"""
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.label_names}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> list[str]:
+        """Возвращает строки метрики в текстовом формате Prometheus"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик"""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Увеличивает счетчик для набора меток"""
+        if amount < 0:
+            raise ValueError("Счетчик может только увеличиваться")
+        label_values = self._label_values(labels)
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, **labels) -> float:
+        """Возвращает текущее значение счетчика"""
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def _render_samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}"
+                for label_values, value in values]
+
+
+class Gauge(Metric):
+    """Значение, которое может расти и уменьшаться (например, длина очереди)"""
+
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: dict[tuple, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        """Устанавливает значение для набора меток"""
+        label_values = self._label_values(labels)
+        with self._lock:
+            self._values[label_values] = value
+
+    def get(self, **labels) -> float:
+        """Возвращает текущее значение"""
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def _render_samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}"
+                for label_values, value in values]
+
+
+class Histogram(Metric):
+    """Распределение значений (длительностей) по корзинам с суммой и количеством наблюдений"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS):
+        """
+        Args: name: Имя метрики
+            documentation: Описание для строки HELP
+            label_names: Имена меток
+            buckets: Верхние границы корзин по возрастанию (корзина +Inf добавляется автоматически)
+        """
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Метки -> (количество в каждой корзине без накопления, сумма, количество)
+        self._values: dict[tuple, tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        """Добавляет наблюдение"""
+        label_values = self._label_values(labels)
+        bucket_index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            bucket_counts, total, count = self._values.get(label_values) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            bucket_counts[bucket_index] += 1
+            self._values[label_values] = (bucket_counts, total + value, count + 1)
+
+    def get_count(self, **labels) -> int:
+        """Возвращает количество наблюдений"""
+        with self._lock:
+            values = self._values.get(self._label_values(labels))
+            return values[2] if values else 0
+
+    def _render_samples(self) -> list[str]:
+        with self._lock:
+            values = sorted((label_values, (list(bucket_counts), total, count))
+                            for label_values, (bucket_counts, total, count) in self._values.items())
+
+        lines = []
+        for label_values, (bucket_counts, total, count) in values:
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative_count += bucket_count
+                bucket_label = f'le="{_format_value(upper_bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, label_values, bucket_label)} "
+                             f"{cumulative_count}")
+            labels_block = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels_block} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels_block} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик процесса, отдаваемый эндпоинтом /metrics"""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Регистрирует метрику; имя должно быть уникальным"""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Возвращает все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = [line for metric in metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Загрузки файлов в обработчиках handle_file_upload
+UPLOADS = REGISTRY.register(Counter(
+    "bot_uploads_total", "Загруженные файлы по итогу обработки (ok, error, cancelled, rejected, unsupported)",
+    ["outcome"],
+))
+
+# Очередь обработки (JobScheduler)
+JOBS_SUBMITTED = REGISTRY.register(Counter(
+    "processing_jobs_submitted_total", "Задачи, поставленные в очередь обработки",
+))
+JOBS_REJECTED = REGISTRY.register(Counter(
+    "processing_jobs_rejected_total", "Задачи, не поставленные в очередь из-за ее переполнения",
+))
+JOBS_FINISHED = REGISTRY.register(Counter(
+    "processing_jobs_finished_total", "Завершенные задачи по статусу (done, failed, cancelled)", ["status"],
+))
+JOBS_QUEUED = REGISTRY.register(Gauge("processing_jobs_queued", "Задачи, ожидающие в очереди"))
+JOBS_RUNNING = REGISTRY.register(Gauge("processing_jobs_running", "Выполняемые задачи"))
+JOB_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "processing_job_wait_seconds", "Время ожидания задачи в очереди",
+))
+JOB_DURATION_SECONDS = REGISTRY.register(Histogram(
+    "processing_job_duration_seconds", "Время выполнения задачи в пуле по статусу", ["status"],
+))
+
+# Этапы обработки (instrumentation); при пуле процессов учитываются только этапы родительского процесса
+STAGE_DURATION_SECONDS = REGISTRY.register(Histogram(
+    "processing_stage_duration_seconds", "Длительность этапа обработки", ["stage"],
+))
+STAGE_ROWS = REGISTRY.register(Counter(
+    "processing_stage_rows_total", "Строки, обработанные этапом (для stage=\"parse\" — прочитанные посты)",
+    ["stage"],
+))
+
+# Запросы к Google API (google_client)
+GOOGLE_API_REQUESTS = REGISTRY.register(Counter(
+    "google_api_requests_total", "Запросы к Google API по методу и коду ответа", ["method", "status"],
+))
+GOOGLE_API_RETRIES = REGISTRY.register(Counter(
+    "google_api_retries_total", "Повторы запросов к Google API после временных ошибок", ["status"],
+))
+GOOGLE_API_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "google_api_request_duration_seconds", "Длительность запроса к Google API", ["method"],
+    buckets=API_DURATION_BUCKETS,
+))
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Отдает метрики реестра по GET /metrics"""
+
+    registry = REGISTRY
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        body = self.registry.render().encode("utf-8")
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # Запросы сборщика метрик не пишутся в лог
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """
+    Запускает HTTP-эндпоинт /metrics в фоновом потоке.
+    Args: port: Порт (0 — не запускать)
+        host: Адрес для прослушивания
+    Returns: Запущенный сервер или None, если эндпоинт отключен
+    """
+    if not port:
+        return None
+
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Эндпоинт метрик запущен: http://%s:%d/metrics", host, server.server_port)
+    return server
@@ -0,0 +1,314 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Optional, Sequence
+
+from alias_matcher import AliasMatcher
+from company_mentions import CompanyKey, MentionAggregator
+from logger import get_logger
+from mention_cache import (MENTION_CACHE_SIZE, CachedMentionFinder, MentionCache, MentionFinder,
+                           create_mention_finder)
+
+logger = get_logger()
+
+# Количество процессов для поиска упоминаний (1 — без параллельной обработки, 0 — по числу ядер)
+MATCHING_WORKERS = int(os.getenv("MATCHING_WORKERS", "1"))
+# Количество постов в одной части, отправляемой процессу
+MATCHING_CHUNK_SIZE = int(os.getenv("MATCHING_CHUNK_SIZE", "5000"))
+# Способ запуска процессов (пустое значение — выбирается автоматически, см. resolve_start_method)
+MATCHING_START_METHOD = os.getenv("MATCHING_START_METHOD", "")
+
+# Поиск упоминаний в процессе пула
+_worker_finder: Optional[MentionFinder] = None
+
+
+def resolve_start_method() -> str:
+    """
+    Возвращает способ запуска процессов пула: MATCHING_START_METHOD, если он задан, иначе fork,
+    пока в процессе нет других потоков (автомат псевдонимов наследуется без сериализации).
+    При работающих потоках (бот, пул обработки) fork небезопасен: дочерний процесс получает копии блокировок,
+    захваченных другими потоками, и может зависнуть, поэтому используется forkserver или spawn.
+    Returns: Название способа запуска multiprocessing
+    """
+    if MATCHING_START_METHOD:
+        return MATCHING_START_METHOD
+    start_methods = multiprocessing.get_all_start_methods()
+    if "fork" in start_methods and threading.active_count() == 1:
+        return "fork"
+    return "forkserver" if "forkserver" in start_methods else "spawn"
+
+
+def _init_worker(alias_matcher: AliasMatcher, crm_version: Optional[str]) -> None:
+    """
+    Подготавливает процесс пула: при запуске через fork автомат наследуется от родителя,
+    иначе передается один раз при старте процесса. Процесс живет, пока не сменится версия CRM,
+    поэтому его кэш результатов переиспользуется между файлами; новые записи кэша
+    возвращаются родителю вместе с результатом части. При отключенном кэше (MENTION_CACHE_SIZE <= 0)
+    процесс ищет упоминания без кэша, как и родитель.
+    """
+    global _worker_finder
+    if crm_version is None or MENTION_CACHE_SIZE <= 0:
+        _worker_finder = MentionFinder(alias_matcher)
+    else:
+        _worker_finder = CachedMentionFinder(alias_matcher, crm_version, MentionCache(persist_path=None),
+                                             record_new_entries=True)
+
+
+def _take_new_entries() -> list[tuple[bytes, tuple[CompanyKey, ...]]]:
+    """Забирает записи кэша, добавленные процессом с прошлой части"""
+    if not isinstance(_worker_finder, CachedMentionFinder):
+        return []
+    new_entries, _worker_finder.new_entries = _worker_finder.new_entries, []
+    return new_entries
+
+
+def _aggregate_chunk(
+        posts: list[tuple[Optional[str], object]], max_links_per_company: int,
+) -> tuple[MentionAggregator, list[tuple[bytes, tuple[CompanyKey, ...]]]]:
+    """Находит упоминания в части постов и возвращает ее частичную статистику и новые записи кэша"""
+    aggregator = MentionAggregator(max_links_per_company)
+    for post_link, gpt_text in posts:
+        aggregator.add_post(post_link, _worker_finder(gpt_text))
+    return aggregator, _take_new_entries()
+
+
+def _match_chunk(gpt_texts: list) -> tuple[list[Sequence[CompanyKey]], list[tuple[bytes, tuple[CompanyKey, ...]]]]:
+    """Находит упоминания для каждого текста части и возвращает их вместе с новыми записями кэша"""
+    return [_worker_finder(gpt_text) for gpt_text in gpt_texts], _take_new_entries()
+
+
+def _resolve_worker_count(workers: int) -> int:
+    """Возвращает количество процессов (0 — по числу ядер)"""
+    return workers if workers > 0 else os.cpu_count() or 1
+
+
+class MatchingPool:
+    """
+    Долгоживущий пул процессов поиска упоминаний, которым владеет ядро обработки.
+    Процессы получают автомат псевдонимов один раз при запуске и обрабатывают все файлы с той же версией CRM.
+    Пул выдается в аренду на время обработки файла: при смене версии CRM запускается пул с новым автоматом,
+    а пул прежней версии останавливается, как только его перестают использовать.
+    """
+
+    def __init__(self, workers: int = MATCHING_WORKERS):
+        """
+        Args: workers: Количество процессов (1 — без параллельной обработки, 0 — по числу ядер)
+        """
+        self.workers = _resolve_worker_count(workers)
+        self._lock = threading.Lock()
+        # Версия CRM -> [пул процессов, количество аренд]
+        self._executors: dict[Optional[str], list] = {}
+        self._latest_version: Optional[str] = None
+
+    def acquire(self, alias_matcher: AliasMatcher, crm_version: Optional[str]) -> ProcessPoolExecutor:
+        """
+        Выдает пул процессов для версии CRM, запуская его при первом обращении.
+        Args: alias_matcher: Автомат поиска псевдонимов
+            crm_version: Хэш исходных строк CRM
+        Returns: Пул процессов; после использования возвращается через release
+        """
+        with self._lock:
+            self._latest_version = crm_version
+            entry = self._executors.get(crm_version)
+            if entry is None:
+                start_method = resolve_start_method()
+                logger.info("Запуск пула поиска упоминаний: %d процессов (%s)", self.workers, start_method)
+                entry = self._executors[crm_version] = [ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(start_method),
+                    initializer=_init_worker,
+                    initargs=(alias_matcher, crm_version),
+                ), 0]
+            entry[1] += 1
+            self._shutdown_stale()
+            return entry[0]
+
+    def release(self, crm_version: Optional[str]) -> None:
+        """Возвращает пул, выданный acquire"""
+        with self._lock:
+            self._executors[crm_version][1] -= 1
+            self._shutdown_stale()
+
+    def _shutdown_stale(self) -> None:
+        """Останавливает неиспользуемые пулы прежних версий CRM"""
+        for crm_version, (executor, leases) in list(self._executors.items()):
+            if crm_version != self._latest_version and leases == 0:
+                logger.info("Версия CRM сменилась, пул поиска упоминаний прежней версии остановлен")
+                executor.shutdown(wait=False)
+                del self._executors[crm_version]
+
+    def close(self) -> None:
+        """Останавливает все процессы пула"""
+        with self._lock:
+            executors = [executor for executor, _ in self._executors.values()]
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown()
+
+
+class ParallelMentionMatcher:
+    """
+    Поиск упоминаний в постах одной загрузки, распределенный по частям между процессами пула.
+    Пул берется в аренду только для выгрузок больше одной части, небольшие файлы обрабатываются в текущем процессе.
+    Части объединяются в порядке следования постов, поэтому отчет совпадает с последовательной обработкой.
+    Результаты, найденные процессами, сохраняются в кэш текущего процесса.
+    Используется как контекстный менеджер: при выходе пул возвращается владельцу.
+    """
+
+    def __init__(self, alias_matcher: AliasMatcher, crm_version: Optional[str],
+                 matching_pool: Optional[MatchingPool] = None, chunk_size: int = MATCHING_CHUNK_SIZE):
+        """
+        Args: alias_matcher: Автомат поиска псевдонимов
+            crm_version: Хэш исходных строк CRM (для кэша результатов)
+            matching_pool: Пул процессов (по умолчанию создается пул на время загрузки с MATCHING_WORKERS процессов)
+            chunk_size: Количество постов в одной части
+        """
+        self.alias_matcher = alias_matcher
+        self.crm_version = crm_version
+        self._owns_pool = matching_pool is None
+        self.matching_pool = matching_pool if matching_pool is not None else MatchingPool()
+        self.workers = self.matching_pool.workers
+        self.chunk_size = chunk_size
+        self._local_finder = create_mention_finder(alias_matcher, crm_version)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "ParallelMentionMatcher":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def batch_size(self) -> int:
+        """Рекомендуемый размер пакета текстов для match_texts, чтобы загрузить все процессы"""
+        return self.chunk_size * self.workers
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Берет пул процессов в аренду при первом обращении"""
+        if self._executor is None:
+            self._executor = self.matching_pool.acquire(self.alias_matcher, self.crm_version)
+        return self._executor
+
+    def _add_cache_entries(self, entries: list[tuple[bytes, tuple[CompanyKey, ...]]]) -> None:
+        """Сохраняет в кэш текущего процесса результаты, найденные процессами пула"""
+        if entries and isinstance(self._local_finder, CachedMentionFinder):
+            self._local_finder.add_entries(entries)
+
+    def aggregate(self, posts: Iterable[tuple[Optional[str], object]],
+                  aggregator: Optional[MentionAggregator] = None) -> MentionAggregator:
+        """
+        Находит упоминания в потоке постов и накапливает статистику.
+        Посты читаются частями; в работе одновременно не больше двух частей на процесс.
+        Args: posts: Итерируемый набор пар (ссылка на пост, текст GPT)
+            aggregator: Накопитель статистики (по умолчанию создается новый)
+        Returns: Накопитель со статистикой упоминаний
+        """
+        aggregator = aggregator if aggregator is not None else MentionAggregator()
+        posts_iterator = iter(posts)
+        chunk = list(islice(posts_iterator, self.chunk_size))
+
+        # Выгрузка помещается в одну часть (или параллельный режим выключен) — пул не нужен
+        if self.workers <= 1 or len(chunk) < self.chunk_size:
+            for post_link, gpt_text in chunk:
+                aggregator.add_post(post_link, self._local_finder(gpt_text))
+            for post_link, gpt_text in posts_iterator:
+                aggregator.add_post(post_link, self._local_finder(gpt_text))
+            return aggregator
+
+        executor = self._get_executor()
+        pending_chunks = deque()
+        processed_chunks = 0
+        while chunk:
+            pending_chunks.append(executor.submit(_aggregate_chunk, chunk, aggregator.max_links_per_company))
+            if len(pending_chunks) >= self.workers * 2:
+                self._merge_chunk(aggregator, pending_chunks.popleft().result())
+                processed_chunks += 1
+            chunk = list(islice(posts_iterator, self.chunk_size))
+
+        # Части объединяются строго в порядке отправки
+        while pending_chunks:
+            self._merge_chunk(aggregator, pending_chunks.popleft().result())
+            processed_chunks += 1
+
+        logger.info("Параллельный поиск упоминаний: %d частей, %d процессов", processed_chunks, self.workers)
+        return aggregator
+
+    def _merge_chunk(self, aggregator: MentionAggregator,
+                     chunk_result: tuple[MentionAggregator, list[tuple[bytes, tuple[CompanyKey, ...]]]]) -> None:
+        """Объединяет статистику части и сохраняет найденные для нее записи кэша"""
+        chunk_aggregator, new_entries = chunk_result
+        aggregator.merge(chunk_aggregator)
+        self._add_cache_entries(new_entries)
+
+    def match_texts(self, gpt_texts: list) -> list[Sequence[CompanyKey]]:
+        """
+        Находит упоминания для списка текстов, распределяя их между процессами, если текстов больше одной части.
+        Тексты, результат для которых уже есть в кэше текущего процесса, процессам не отправляются.
+        Args: gpt_texts: Тексты постов, обработанные GPT
+        Returns: Компании для каждого текста в том же порядке
+        """
+        if self.workers <= 1 or len(gpt_texts) <= self.chunk_size:
+            return [self._local_finder(gpt_text) for gpt_text in gpt_texts]
+
+        # Процессам отправляются только тексты, результатов для которых нет в кэше текущего процесса
+        matched_companies: list[Optional[Sequence[CompanyKey]]] = [None] * len(gpt_texts)
+        pending_indexes = list(range(len(gpt_texts)))
+        if isinstance(self._local_finder, CachedMentionFinder):
+            pending_indexes, pending_keys = [], []
+            for text_index, gpt_text in enumerate(gpt_texts):
+                key, matched_companies[text_index] = self._local_finder.lookup(gpt_text)
+                if matched_companies[text_index] is None:
+                    pending_indexes.append(text_index)
+                    pending_keys.append(key)
+
+            if len(pending_indexes) <= self.chunk_size:
+                for text_index, key in zip(pending_indexes, pending_keys):
+                    matched_companies[text_index] = self._local_finder.find_and_store(key, gpt_texts[text_index])
+                return matched_companies
+
+        # Части делятся поровну между процессами, но не меньше chunk_size / 4 текстов
+        part_size = max(self.chunk_size // 4, -(-len(pending_indexes) // self.workers))
+        executor = self._get_executor()
+        futures = [
+            (part_indexes, executor.submit(_match_chunk, [gpt_texts[text_index] for text_index in part_indexes]))
+            for part_indexes in (pending_indexes[start:start + part_size]
+                                 for start in range(0, len(pending_indexes), part_size))
+        ]
+
+        for part_indexes, future in futures:
+            part_companies, new_entries = future.result()
+            for text_index, companies in zip(part_indexes, part_companies):
+                matched_companies[text_index] = companies
+            self._add_cache_entries(new_entries)
+        return matched_companies
+
+    def close(self) -> None:
+        """Возвращает пул процессов владельцу (или останавливает собственный пул) и завершает работу с кэшем"""
+        self._local_finder.finish()
+        if self._executor is not None:
+            self.matching_pool.release(self.crm_version)
+            self._executor = None
+        if self._owns_pool:
+            self.matching_pool.close()
+
+
+def aggregate_posts(posts: Iterable[tuple[Optional[str], object]], alias_matcher: AliasMatcher,
+                    crm_version: Optional[str], aggregator: Optional[MentionAggregator] = None,
+                    matching_pool: Optional[MatchingPool] = None) -> MentionAggregator:
+    """
+    Находит упоминания компаний в потоке постов: с кэшем результатов и, если включено, в нескольких процессах.
+    Args: posts: Итерируемый набор пар (ссылка на пост, текст GPT)
+        alias_matcher: Автомат поиска псевдонимов
+        crm_version: Хэш исходных строк CRM
+        aggregator: Накопитель статистики (по умолчанию создается новый)
+        matching_pool: Долгоживущий пул процессов (по умолчанию пул создается на время обработки)
+    Returns: Накопитель со статистикой упоминаний
+    """
+    with ParallelMentionMatcher(alias_matcher, crm_version, matching_pool) as mention_matcher:
+        aggregator = mention_matcher.aggregate(posts, aggregator)
+
+    logger.info("Обработка постов завершена. Упоминаний найдено: %d", len(aggregator))
+    return aggregator
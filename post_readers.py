@@ -0,0 +1,287 @@
+import csv
+import gzip
+import importlib.util
+import io
+import json
+import os
+from typing import Callable, Iterator, Optional
+
+from openpyxl import load_workbook
+
+from text_normalization import is_missing
+
+# Колонки листа с постами, необходимые для обработки
+POST_LINK_COLUMN = "Пост"
+GROUP_LINK_COLUMN = "Группа"
+GPT_COLUMN = "GPT"
+
+POSTS_SHEET_NAME = "vk"
+
+# Сигнатуры файлов для определения формата по содержимому
+GZIP_MAGIC = b"\x1f\x8b"
+ZIP_MAGIC = b"PK\x03\x04"
+PARQUET_MAGIC = b"PAR1"
+
+CSV_DELIMITERS = ",;\t"
+CSV_SNIFF_SIZE = 64 * 1024
+PARQUET_BATCH_SIZE = 10000
+LINE_COUNT_BLOCK_SIZE = 1024 * 1024
+
+PYARROW_MISSING_MESSAGE = ("Файлы Parquet не поддерживаются: на сервере не установлен пакет pyarrow. "
+                           "Загрузите файл в формате xlsx, csv или jsonl")
+
+
+class GroupLink(str):
+    """
+    Ссылка на группу, подставленная вместо пустой ссылки на пост.
+    В отчете выглядит как обычная ссылка, но не определяет пост однозначно: она общая для всех постов группы.
+    """
+
+    __slots__ = ()
+
+
+def resolve_post_link(post_link, group_link) -> Optional[str]:
+    """
+    Определяет ссылку на пост: значение колонки "Пост", а если оно пустое — колонки "Группа" (как GroupLink).
+    Args: post_link: Значение колонки "Пост"
+        group_link: Значение колонки "Группа"
+    Returns: Строковая ссылка или None, если ссылки нет
+    """
+    if not is_missing(post_link) and str(post_link).strip():
+        return str(post_link)
+
+    if is_missing(group_link) or not group_link:
+        return None
+    return GroupLink(group_link)
+
+
+def iter_xlsx_posts(file_path: str, sheet_name: str = POSTS_SHEET_NAME) -> Iterator[tuple[Optional[str], object]]:
+    """
+    Потоково читает посты из листа xlsx, не загружая лист целиком в память.
+    Читаются только колонки "Пост", "Группа" и "GPT".
+    Args: file_path: Путь к файлу xlsx
+        sheet_name: Название листа с постами
+    Returns: Итератор пар (ссылка на пост, текст GPT)
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        if sheet_name not in workbook.sheetnames:
+            raise ValueError(f"В файле нет листа '{sheet_name}' с постами")
+
+        worksheet = workbook[sheet_name]
+        header = next(worksheet.iter_rows(max_row=1, values_only=True), ())
+
+        # Индексы нужных колонок (при повторах берется первая, как в pandas)
+        column_indexes = {}
+        for column_index, column_name in enumerate(header):
+            column_indexes.setdefault(column_name, column_index)
+
+        needed_indexes = [
+            column_indexes.get(column_name) for column_name in (POST_LINK_COLUMN, GROUP_LINK_COLUMN, GPT_COLUMN)
+        ]
+        present_indexes = [column_index for column_index in needed_indexes if column_index is not None]
+        if not present_indexes:
+            return
+
+        # Читаем только диапазон колонок, в котором лежат нужные
+        first_column = min(present_indexes)
+        post_index, group_index, gpt_index = (
+            None if column_index is None else column_index - first_column for column_index in needed_indexes
+        )
+        rows = worksheet.iter_rows(min_row=2, min_col=first_column + 1, max_col=max(present_indexes) + 1,
+                                   values_only=True)
+
+        for row in rows:
+            post_link = row[post_index] if post_index is not None else None
+            group_link = row[group_index] if group_index is not None else None
+            gpt_text = row[gpt_index] if gpt_index is not None else None
+
+            yield resolve_post_link(post_link, group_link), gpt_text
+    finally:
+        workbook.close()
+
+
+def _open_text_file(file_path: str) -> io.TextIOBase:
+    """Открывает текстовый файл на чтение, распаковывая gzip при необходимости"""
+    with open(file_path, "rb") as binary_file:
+        is_gzip = binary_file.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+
+    if is_gzip:
+        return gzip.open(file_path, "rt", encoding="utf-8-sig", newline="")
+    return open(file_path, "r", encoding="utf-8-sig", newline="")
+
+
+def iter_csv_posts(file_path: str) -> Iterator[tuple[Optional[str], object]]:
+    """
+    Потоково читает посты из CSV (в том числе сжатого gzip). Разделитель определяется автоматически.
+    Args: file_path: Путь к файлу CSV
+    Returns: Итератор пар (ссылка на пост, текст GPT)
+    """
+    with _open_text_file(file_path) as text_file:
+        sample = text_file.read(CSV_SNIFF_SIZE)
+        text_file.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS)
+        except csv.Error:
+            dialect = csv.excel
+
+        for row in csv.DictReader(text_file, dialect=dialect):
+            yield resolve_post_link(row.get(POST_LINK_COLUMN), row.get(GROUP_LINK_COLUMN)), row.get(GPT_COLUMN)
+
+
+def iter_jsonl_posts(file_path: str) -> Iterator[tuple[Optional[str], object]]:
+    """
+    Потоково читает посты из JSON Lines (в том числе сжатого gzip): один объект на строку.
+    Args: file_path: Путь к файлу JSONL
+    Returns: Итератор пар (ссылка на пост, текст GPT)
+    """
+    with _open_text_file(file_path) as text_file:
+        for line_number, line in enumerate(text_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                post = json.loads(line)
+            except json.JSONDecodeError as error:
+                raise ValueError(f"Некорректный JSON в строке {line_number}: {error}") from error
+
+            yield resolve_post_link(post.get(POST_LINK_COLUMN), post.get(GROUP_LINK_COLUMN)), post.get(GPT_COLUMN)
+
+
+def iter_parquet_posts(file_path: str) -> Iterator[tuple[Optional[str], object]]:
+    """
+    Читает посты из Parquet пакетами, загружая только нужные колонки. Требует pyarrow.
+    Args: file_path: Путь к файлу Parquet
+    Returns: Итератор пар (ссылка на пост, текст GPT)
+    """
+    try:
+        import pyarrow.parquet as parquet
+    except ImportError as error:
+        raise ValueError(PYARROW_MISSING_MESSAGE) from error
+
+    parquet_file = parquet.ParquetFile(file_path)
+    needed_columns = [
+        column_name for column_name in (POST_LINK_COLUMN, GROUP_LINK_COLUMN, GPT_COLUMN)
+        if column_name in parquet_file.schema_arrow.names
+    ]
+    if not needed_columns:
+        return
+
+    for batch in parquet_file.iter_batches(batch_size=PARQUET_BATCH_SIZE, columns=needed_columns):
+        columns = batch.to_pydict()
+        missing_values = [None] * batch.num_rows
+        post_links = columns.get(POST_LINK_COLUMN, missing_values)
+        group_links = columns.get(GROUP_LINK_COLUMN, missing_values)
+        gpt_texts = columns.get(GPT_COLUMN, missing_values)
+
+        for post_link, group_link, gpt_text in zip(post_links, group_links, gpt_texts):
+            yield resolve_post_link(post_link, group_link), gpt_text
+
+
+# Читатели постов по форматам; новый формат подключается добавлением функции в словарь
+POST_READERS: dict[str, Callable[[str], Iterator[tuple[Optional[str], object]]]] = {
+    "xlsx": iter_xlsx_posts,
+    "csv": iter_csv_posts,
+    "jsonl": iter_jsonl_posts,
+    "parquet": iter_parquet_posts,
+}
+
+FORMATS_BY_EXTENSION = {
+    ".xlsx": "xlsx",
+    ".xlsm": "xlsx",
+    ".csv": "csv",
+    ".tsv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+
+def detect_post_format(file_path: str) -> str:
+    """
+    Определяет формат файла с постами по сигнатуре и расширению.
+    Args: file_path: Путь к файлу
+    Returns: Название формата (ключ POST_READERS)
+    Raises: ValueError если формат не поддерживается
+    """
+    with open(file_path, "rb") as binary_file:
+        magic = binary_file.read(len(ZIP_MAGIC))
+
+    if magic.startswith(ZIP_MAGIC):
+        return "xlsx"
+    if magic.startswith(PARQUET_MAGIC):
+        # pyarrow необязателен: без него файл отклоняется сразу, до постановки задачи в очередь
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ValueError(PYARROW_MISSING_MESSAGE)
+        return "parquet"
+
+    # Для текстовых и сжатых gzip файлов формат определяется расширением без ".gz"
+    base_name = file_path.lower()
+    if base_name.endswith(".gz"):
+        base_name = base_name[:-len(".gz")]
+    extension = os.path.splitext(base_name)[1]
+
+    post_format = FORMATS_BY_EXTENSION.get(extension)
+    if post_format in ("csv", "jsonl"):
+        return post_format
+    if magic.startswith(GZIP_MAGIC):
+        # Сжатый файл без известного расширения считаем CSV
+        return "csv"
+
+    raise ValueError(
+        "Неподдерживаемый формат файла. Поддерживаются xlsx, csv, csv.gz, parquet и jsonl"
+    )
+
+
+def iter_posts(file_path: str, post_format: Optional[str] = None) -> Iterator[tuple[Optional[str], object]]:
+    """
+    Читает посты из файла любого поддерживаемого формата.
+    Args: file_path: Путь к файлу
+        post_format: Формат файла (если не указан, определяется автоматически)
+    Returns: Итератор пар (ссылка на пост, текст GPT)
+    """
+    return POST_READERS[post_format or detect_post_format(file_path)](file_path)
+
+
+def _count_lines(file_path: str) -> int:
+    """Считает строки несжатого файла, читая его блоками"""
+    line_count = 0
+    with open(file_path, "rb") as binary_file:
+        for block in iter(lambda: binary_file.read(LINE_COUNT_BLOCK_SIZE), b""):
+            line_count += block.count(b"\n")
+    return line_count
+
+
+def estimate_post_count(file_path: str, post_format: Optional[str] = None) -> Optional[int]:
+    """
+    Оценивает количество постов в файле без его разбора (для прогресса и оставшегося времени):
+    для xlsx — по размеру листа из заголовка, для Parquet — по метаданным, для несжатого JSONL — по числу строк.
+    В CSV тексты GPT могут содержать переводы строк, поэтому для него оценки нет.
+    Args: file_path: Путь к файлу
+        post_format: Формат файла (если не указан, определяется автоматически)
+    Returns: Оценка количества постов или None, если ее не получить дешево
+    """
+    post_format = post_format or detect_post_format(file_path)
+    try:
+        if post_format == "xlsx":
+            workbook = load_workbook(file_path, read_only=True)
+            try:
+                if POSTS_SHEET_NAME not in workbook.sheetnames:
+                    return None
+                max_row = workbook[POSTS_SHEET_NAME].max_row
+            finally:
+                workbook.close()
+            return max_row - 1 if max_row else None
+
+        if post_format == "parquet":
+            import pyarrow.parquet as parquet
+            return parquet.ParquetFile(file_path).metadata.num_rows
+
+        if post_format == "jsonl":
+            with open(file_path, "rb") as binary_file:
+                if binary_file.read(len(GZIP_MAGIC)) == GZIP_MAGIC:
+                    return None
+            return _count_lines(file_path)
+    except (ImportError, OSError, ValueError, KeyError):
+        return None
+    return None
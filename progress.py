@@ -0,0 +1,204 @@
+import os
+import time
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, Sequence
+
+if TYPE_CHECKING:
+    # Модуль импортируется процессом бота до загрузки pandas, поэтому накопитель нужен только для аннотаций
+    from company_mentions import MentionAggregator
+
+# Как часто задача публикует прогресс и бот обновляет сообщение пользователю, секунды
+PROGRESS_INTERVAL_SECONDS = float(os.getenv("PROGRESS_INTERVAL", "5"))
+# Сколько компаний показывать в промежуточных результатах (0 — не показывать)
+PROGRESS_TOP_COMPANIES = int(os.getenv("PROGRESS_TOP_COMPANIES", "5"))
+# Через сколько постов проверяется время публикации: в цикле по постам остается только счетчик
+PROGRESS_CHECK_EVERY_POSTS = 256
+
+# Этапы задачи, о которых сообщается пользователю
+STAGE_DESCRIPTIONS = {
+    "crm_load": "Загрузка данных CRM",
+    "match": "Поиск упоминаний",
+    "write_report": "Запись отчета",
+}
+
+
+class JobCancelledError(Exception):
+    """Задача была отменена пользователем"""
+
+
+class ProgressUpdate:
+    """Состояние выполнения задачи: этап, обработанные посты, скорость, оставшееся время и лидеры по упоминаниям"""
+
+    def __init__(self, stage: str, posts_done: int = 0, total_posts: Optional[int] = None,
+                 elapsed_seconds: float = 0.0, top_companies: Optional[list[tuple[str, int]]] = None):
+        """
+        Args: stage: Этап (ключ STAGE_DESCRIPTIONS)
+            posts_done: Обработано постов
+            total_posts: Оценка общего количества постов (None — неизвестно)
+            elapsed_seconds: Время с начала поиска упоминаний
+            top_companies: Промежуточные лидеры (компания, количество упоминаний)
+        """
+        self.stage = stage
+        self.posts_done = posts_done
+        self.total_posts = total_posts
+        self.elapsed_seconds = elapsed_seconds
+        self.top_companies = top_companies or []
+
+    @property
+    def posts_per_second(self) -> float:
+        """Скорость обработки постов"""
+        return self.posts_done / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """Оценка оставшегося времени поиска упоминаний (None — неизвестно)"""
+        if not self.total_posts or not self.posts_per_second:
+            return None
+        return max(self.total_posts - self.posts_done, 0) / self.posts_per_second
+
+
+class ProgressChannel:
+    """
+    Последнее состояние прогресса задачи, которое задача публикует, а цикл событий бота читает,
+    и флаг отмены, который передается в обратную сторону.
+    Для пула потоков хранилище — обычный словарь, для пула процессов — словарь менеджера multiprocessing.
+    Публикация и отмена — одна запись по ключу, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, storage=None):
+        """
+        Args: storage: Словарь для хранения состояния (по умолчанию обычный dict)
+        """
+        self._storage = storage if storage is not None else {}
+
+    def publish(self, progress_update: ProgressUpdate) -> None:
+        """Сохраняет новое состояние"""
+        self._storage["latest"] = progress_update
+
+    def latest(self) -> Optional[ProgressUpdate]:
+        """Возвращает последнее опубликованное состояние"""
+        return self._storage.get("latest")
+
+    def cancel(self) -> None:
+        """Просит задачу остановиться: задача проверяет флаг между этапами и по ходу обработки постов"""
+        self._storage["cancelled"] = True
+
+    def is_cancelled(self) -> bool:
+        """Проверяет, была ли задача отменена"""
+        return self._storage.get("cancelled", False)
+
+
+class ProgressTracker:
+    """
+    Считает посты в потоке и не чаще раза в interval_seconds публикует прогресс в канал.
+    Промежуточные лидеры берутся из накопителя, который заполняется в том же потоке.
+    Если задачу отменили через канал, обработка прерывается исключением JobCancelledError.
+    """
+
+    def __init__(self, channel: ProgressChannel, total_posts: Optional[int] = None,
+                 aggregator: Optional["MentionAggregator"] = None,
+                 interval_seconds: float = PROGRESS_INTERVAL_SECONDS, top_companies: int = PROGRESS_TOP_COMPANIES):
+        """
+        Args: channel: Канал прогресса задачи
+            total_posts: Оценка общего количества постов
+            aggregator: Накопитель статистики, заполняемый по мере обработки
+            interval_seconds: Минимальный интервал между публикациями
+            top_companies: Сколько лидеров включать в прогресс
+        """
+        self.channel = channel
+        self.total_posts = total_posts
+        self.aggregator = aggregator
+        # Канонические названия компаний CRM: в накопителе компании CRM хранятся номерами
+        self.company_names: Sequence[str] = ()
+        self.interval_seconds = interval_seconds
+        self.top_companies = top_companies
+        self.posts_done = 0
+        self._start_time = time.perf_counter()
+        # Длительность поиска упоминаний после его завершения (скорость на следующих этапах не меняется)
+        self._match_seconds: Optional[float] = None
+        self._published_at = 0.0
+
+    def start_stage(self, stage: str) -> None:
+        """
+        Публикует переход к новому этапу.
+        Raises: JobCancelledError если задачу отменили
+        """
+        self.check_cancelled()
+        self._publish(stage)
+
+    def check_cancelled(self) -> None:
+        """
+        Прерывает задачу, если ее отменили.
+        Raises: JobCancelledError если задачу отменили
+        """
+        if self.channel.is_cancelled():
+            raise JobCancelledError("Обработка отменена")
+
+    def _publish(self, stage: str) -> None:
+        top_companies = []
+        if self.aggregator is not None and self.top_companies > 0:
+            for company, record in self.aggregator.iter_sorted_records(self.top_companies):
+                company_name = self.company_names[company] if isinstance(company, int) else company
+                top_companies.append((company_name, record.mention_count))
+        elapsed_seconds = self._match_seconds
+        if elapsed_seconds is None:
+            elapsed_seconds = time.perf_counter() - self._start_time
+        self.channel.publish(ProgressUpdate(stage, self.posts_done, self.total_posts, elapsed_seconds, top_companies))
+        self._published_at = time.monotonic()
+
+    def track(self, posts: Iterable) -> Iterator:
+        """
+        Оборачивает поток постов: каждый пост только увеличивает счетчик,
+        время и флаг отмены проверяются раз в PROGRESS_CHECK_EVERY_POSTS постов.
+        Args: posts: Исходный поток постов
+        Returns: Поток с теми же постами
+        Raises: JobCancelledError если задачу отменили
+        """
+        self._start_time = time.perf_counter()
+        self._publish("match")
+        next_check = PROGRESS_CHECK_EVERY_POSTS
+        for post in posts:
+            self.posts_done += 1
+            if self.posts_done >= next_check:
+                next_check += PROGRESS_CHECK_EVERY_POSTS
+                self.check_cancelled()
+                if time.monotonic() - self._published_at >= self.interval_seconds:
+                    self._publish("match")
+            yield post
+        self._match_seconds = time.perf_counter() - self._start_time
+
+
+def _format_duration(seconds: float) -> str:
+    """Форматирует длительность: 1 ч 05 мин, 3 мин 20 с, 45 с"""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600} ч {seconds % 3600 // 60:02d} мин"
+    if seconds >= 60:
+        return f"{seconds // 60} мин {seconds % 60:02d} с"
+    return f"{seconds} с"
+
+
+def format_progress_message(progress_update: ProgressUpdate, file_name: str) -> str:
+    """
+    Формирует текст сообщения о ходе обработки для пользователя.
+    Args: progress_update: Состояние задачи
+        file_name: Имя загруженного файла
+    Returns: Текст сообщения
+    """
+    lines = [f"⏳ {file_name}: {STAGE_DESCRIPTIONS.get(progress_update.stage, progress_update.stage)}"]
+
+    if progress_update.posts_done:
+        posts_line = f"Обработано постов: {progress_update.posts_done:,}".replace(",", " ")
+        if progress_update.total_posts:
+            percent = min(progress_update.posts_done / progress_update.total_posts, 1.0) * 100
+            posts_line += f" из ~{progress_update.total_posts:,} ({percent:.0f}%)".replace(",", " ")
+        lines.append(posts_line)
+        speed_line = f"Скорость: {progress_update.posts_per_second:,.0f} постов/с".replace(",", " ")
+        if progress_update.stage == "match" and progress_update.eta_seconds is not None:
+            speed_line += f", осталось ~{_format_duration(progress_update.eta_seconds)}"
+        lines.append(speed_line)
+
+    if progress_update.top_companies:
+        lines.append("Лидеры по упоминаниям:")
+        lines.extend(f"{position}. {company} — {mention_count}"
+                     for position, (company, mention_count) in enumerate(progress_update.top_companies, start=1))
+    return "\n".join(lines)
@@ -0,0 +1,151 @@
+import os
+from typing import Optional
+
+import gspread
+
+from company_mentions import MentionAggregator
+from crm_table import CrmTable
+from google_client import GoogleSheetsClientHolder
+from google_sheet_writer import rewrite_worksheet, write_report_delta
+from instrumentation import span
+from logger import get_logger
+from report_writer import REPORT_FORMAT, REPORT_MAX_ROWS, report_file_name, write_report
+
+logger = get_logger()
+
+# Виды отчетов: по загруженному файлу, сводный за период и объединенный по пакету файлов
+PROCESSED_REPORT = "processed"
+SUMMARY_REPORT = "summary"
+MERGED_REPORT = "merged"
+
+# Имена файлов отчетов (расширение заменяется на расширение формата)
+REPORT_FILENAMES = {
+    PROCESSED_REPORT: "processed_report.xlsx",
+    SUMMARY_REPORT: "summary_report.xlsx",
+    MERGED_REPORT: "merged_report.xlsx",
+}
+# Листы Google Таблицы для отчетов
+REPORT_SHEET_NAMES = {
+    PROCESSED_REPORT: "Обработанные данные",
+    SUMMARY_REPORT: os.getenv("GOOGLE_SUMMARY_SHEET_NAME", "Сводный отчет"),
+    MERGED_REPORT: os.getenv("GOOGLE_BATCH_SHEET_NAME", "Пакетная обработка"),
+}
+
+
+class ReportOutput:
+    """Результат записи отчета: файл для отправки пользователю или ссылка на лист"""
+
+    def __init__(self, sink_name: str, rows: int, description: str, file_path: Optional[str] = None,
+                 file_name: Optional[str] = None, url: Optional[str] = None, sheet_name: Optional[str] = None):
+        """
+        Args: sink_name: Название получателя отчета
+            rows: Количество строк отчета
+            description: Куда записан отчет, для сообщения пользователю (например, "файл processed_report.xlsx")
+            file_path: Путь к файлу отчета (для файловых получателей)
+            file_name: Имя файла для отправки пользователю
+            url: Ссылка на лист (для Google Таблицы)
+            sheet_name: Название листа
+        """
+        self.sink_name = sink_name
+        self.rows = rows
+        self.description = description
+        self.file_path = file_path
+        self.file_name = file_name
+        self.url = url
+        self.sheet_name = sheet_name
+
+
+class ReportSink:
+    """Получатель отчета по накопленной статистике упоминаний"""
+
+    # Название получателя в настройках (REPORT_SINKS)
+    name = ""
+
+    def write(self, aggregator: MentionAggregator, canonical_to_crm: CrmTable, report_kind: str,
+              path_prefix: str) -> ReportOutput:
+        """
+        Записывает отчет.
+        Args: aggregator: Накопитель со статистикой упоминаний
+            canonical_to_crm: Таблица CRM
+            report_kind: Вид отчета (PROCESSED_REPORT, SUMMARY_REPORT или MERGED_REPORT)
+            path_prefix: Префикс пути для файлов отчета (например, путь загруженного файла без расширения)
+        Returns: Результат записи
+        """
+        raise NotImplementedError
+
+
+class FileReportSink(ReportSink):
+    """Файл отчета (xlsx, csv или parquet), который бот отправляет пользователю"""
+
+    def __init__(self, report_format: str = REPORT_FORMAT, max_rows: int = REPORT_MAX_ROWS):
+        """
+        Args: report_format: Формат файла (ключ REPORT_WRITERS)
+            max_rows: Сколько строк записать (0 — все)
+        """
+        self.name = report_format
+        self.report_format = report_format
+        self.max_rows = max_rows
+
+    def write(self, aggregator: MentionAggregator, canonical_to_crm: CrmTable, report_kind: str,
+              path_prefix: str) -> ReportOutput:
+        file_name = report_file_name(REPORT_FILENAMES[report_kind], self.report_format)
+        file_path = f"{path_prefix}_{file_name}"
+        with span("write_report", format=self.report_format) as write_span:
+            rows = write_report(aggregator, canonical_to_crm, file_path, self.report_format, self.max_rows)
+            write_span.set_rows(rows)
+        return ReportOutput(self.name, rows, f"файл {file_name}", file_path=file_path, file_name=file_name)
+
+
+class GoogleSheetReportSink(ReportSink):
+    """
+    Лист Google Таблицы. На существующий лист записываются только изменившиеся строки,
+    новый лист заполняется целиком.
+    """
+
+    name = "google"
+
+    def __init__(self, client_holder: GoogleSheetsClientHolder, spreadsheet_key: str,
+                 max_rows: int = REPORT_MAX_ROWS):
+        """
+        Args: client_holder: Общий клиент Google Sheets процесса
+            spreadsheet_key: Ключ Google Таблицы
+            max_rows: Сколько строк записать (0 — все)
+        """
+        self.client_holder = client_holder
+        self.spreadsheet_key = spreadsheet_key
+        self.max_rows = max_rows
+
+    def write(self, aggregator: MentionAggregator, canonical_to_crm: CrmTable, report_kind: str,
+              path_prefix: str) -> ReportOutput:
+        worksheet_name = REPORT_SHEET_NAMES[report_kind]
+        # Для записи изменений нужен весь отчет, чтобы сравнить его со строками листа
+        with span("aggregate") as aggregate_span:
+            dataframe = aggregator.build_report(canonical_to_crm, self.max_rows)
+            aggregate_span.set_rows(len(dataframe))
+        logger.info("Начало сохранения данных в Google Sheets. Записей: %d", len(dataframe))
+
+        try:
+            with span("upload", rows=len(dataframe), worksheet=worksheet_name) as upload_span:
+                spreadsheet = self.client_holder.open_spreadsheet(self.spreadsheet_key)
+
+                try:
+                    # Пытаемся получить существующий лист
+                    worksheet = spreadsheet.worksheet(worksheet_name)
+                    logger.info("Лист '%s' найден, записываем изменения...", worksheet_name)
+                    write_stats = write_report_delta(worksheet, dataframe)
+                except gspread.WorksheetNotFound:
+                    # Если лист не существует, создаем новый
+                    logger.info("Лист '%s' не найден, создаем новый...", worksheet_name)
+                    worksheet = spreadsheet.add_worksheet(title=worksheet_name, rows=len(dataframe) + 1,
+                                                          cols=len(dataframe.columns))
+                    write_stats = rewrite_worksheet(worksheet, dataframe)
+
+                upload_span.set_attribute("write_stats", str(write_stats))
+        except Exception as e:
+            logger.error("Ошибка при сохранении в Google Sheets: %s", e)
+            raise
+
+        logger.info("Данные успешно загружены на лист '%s' (%s)", worksheet_name, write_stats)
+        url = f"https://docs.google.com/spreadsheets/d/{self.spreadsheet_key}/edit#gid={worksheet.id}"
+        return ReportOutput(self.name, len(dataframe), f"лист '{worksheet_name}' Google Таблицы", url=url,
+                            sheet_name=worksheet_name)
@@ -0,0 +1,158 @@
+import csv
+import os
+from typing import Callable, Iterable, Optional
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from company_mentions import REPORT_COLUMNS, MentionAggregator
+from crm_table import CrmTable
+from text_normalization import is_missing
+
+# Формат файла отчета в Excel-боте: xlsx, csv или parquet
+REPORT_FORMAT = os.getenv("REPORT_FORMAT", "xlsx")
+# Ограничение количества строк отчета (0 — все компании); первые строки выбираются кучей без полной сортировки
+REPORT_MAX_ROWS = int(os.getenv("REPORT_MAX_ROWS", "0"))
+# Количество строк в одной группе строк Parquet
+PARQUET_ROW_GROUP_SIZE = 50000
+
+COUNT_COLUMN_INDEX = REPORT_COLUMNS.index("Количество упоминаний")
+
+
+def _cell_value(value):
+    """Заменяет пустые значения (None, NaN) на None, чтобы ячейка осталась пустой"""
+    return None if is_missing(value) else value
+
+
+def _text_value(value) -> Optional[str]:
+    """Приводит значение к строке для колонок Parquet; целые числа из Excel (12.0) пишутся как целые"""
+    if is_missing(value) or value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def write_xlsx_report(rows: Iterable[list], file_path: str) -> int:
+    """
+    Записывает строки отчета в xlsx в режиме write-only: строки сразу сериализуются
+    в XML, поэтому память не зависит от размера отчета.
+    Args: rows: Строки отчета в порядке REPORT_COLUMNS
+        file_path: Путь к файлу отчета
+    Returns: Количество записанных строк
+    """
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+
+    header_font = Font(bold=True)
+    header = []
+    for column_name in REPORT_COLUMNS:
+        header_cell = WriteOnlyCell(worksheet, value=column_name)
+        header_cell.font = header_font
+        header.append(header_cell)
+    worksheet.append(header)
+
+    rows_count = 0
+    for row in rows:
+        worksheet.append([_cell_value(value) for value in row])
+        rows_count += 1
+
+    workbook.save(file_path)
+    return rows_count
+
+
+def write_csv_report(rows: Iterable[list], file_path: str) -> int:
+    """
+    Записывает строки отчета в CSV построчно (UTF-8 с BOM, чтобы Excel открывал кириллицу).
+    Args: rows: Строки отчета в порядке REPORT_COLUMNS
+        file_path: Путь к файлу отчета
+    Returns: Количество записанных строк
+    """
+    rows_count = 0
+    with open(file_path, "w", encoding="utf-8-sig", newline="") as report_file:
+        writer = csv.writer(report_file)
+        writer.writerow(REPORT_COLUMNS)
+        for row in rows:
+            writer.writerow(["" if is_missing(value) else value for value in row])
+            rows_count += 1
+    return rows_count
+
+
+def write_parquet_report(rows: Iterable[list], file_path: str) -> int:
+    """
+    Записывает строки отчета в Parquet группами строк по PARQUET_ROW_GROUP_SIZE. Требует pyarrow.
+    Args: rows: Строки отчета в порядке REPORT_COLUMNS
+        file_path: Путь к файлу отчета
+    Returns: Количество записанных строк
+    """
+    try:
+        import pyarrow as arrow
+        import pyarrow.parquet as parquet
+    except ImportError as error:
+        raise ValueError("Отчет в формате Parquet недоступен: не установлен пакет pyarrow. "
+                         "Установите его (pip install pyarrow) или выберите формат xlsx или csv") from error
+
+    schema = arrow.schema([
+        (column_name, arrow.int64() if column_index == COUNT_COLUMN_INDEX else arrow.string())
+        for column_index, column_name in enumerate(REPORT_COLUMNS)
+    ])
+
+    rows_count = 0
+    with parquet.ParquetWriter(file_path, schema) as writer:
+        columns: list[list] = [[] for _ in REPORT_COLUMNS]
+
+        def flush() -> None:
+            if columns[0]:
+                writer.write_table(arrow.Table.from_arrays(
+                    [arrow.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+                ))
+                for values in columns:
+                    values.clear()
+
+        for row in rows:
+            for column_index, value in enumerate(row):
+                columns[column_index].append(value if column_index == COUNT_COLUMN_INDEX else _text_value(value))
+            rows_count += 1
+            if len(columns[0]) >= PARQUET_ROW_GROUP_SIZE:
+                flush()
+        flush()
+
+    return rows_count
+
+
+# Функции записи отчета по формату
+REPORT_WRITERS: dict[str, Callable[[Iterable[list], str], int]] = {
+    "xlsx": write_xlsx_report,
+    "csv": write_csv_report,
+    "parquet": write_parquet_report,
+}
+
+
+def report_file_name(file_name: str, report_format: str = REPORT_FORMAT) -> str:
+    """
+    Заменяет расширение имени файла отчета на расширение формата.
+    Args: file_name: Имя файла (например, processed_report.xlsx)
+        report_format: Формат отчета
+    Returns: Имя файла с расширением формата
+    """
+    return f"{os.path.splitext(file_name)[0]}.{report_format}"
+
+
+def write_report(aggregator: MentionAggregator, canonical_to_crm: CrmTable, file_path: str,
+                 report_format: str = REPORT_FORMAT, max_rows: int = REPORT_MAX_ROWS) -> int:
+    """
+    Записывает отчет по накопленной статистике в файл, не создавая DataFrame:
+    строки формируются по одной в порядке убывания количества упоминаний.
+    Args: aggregator: Накопитель со статистикой упоминаний
+        canonical_to_crm: Таблица CRM
+        file_path: Путь к файлу отчета
+        report_format: Формат файла (ключ REPORT_WRITERS)
+        max_rows: Сколько строк записать (0 — все)
+    Returns: Количество записанных строк
+    """
+    writer = REPORT_WRITERS.get(report_format)
+    if writer is None:
+        raise ValueError(f"Неизвестный формат отчета: {report_format}. "
+                         f"Поддерживаются: {', '.join(REPORT_WRITERS)}")
+    return writer(aggregator.iter_report_rows(canonical_to_crm, max_rows), file_path)
@@ -0,0 +1,117 @@
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from alias_index import (AliasIndexStore, INDEX_HEADER, hash_companies_dataframe, read_alias_index,
+                         write_alias_index)
+from alias_matcher import AliasMatcher
+from company_mentions import build_company_mappings
+
+COMPANIES = pd.DataFrame({
+    "Полное имя": ["Альфа-Банк", "МТС", "Ёлки-Палки", "", "МТС"],
+    "Also known as (AKA)": ["Альфа банк, альфа", None, "елки палки", "Без названия", "мобильные телесистемы"],
+    "#": [1, 2, 3, 4, 5],
+    "Ответственный ДК": ["Иванов", "Петров", "Иванов", None, "Сидоров"],
+})
+POST_TEXT = "альфа банк, мобильные телесистемы и елки палки"
+
+
+def test_index_file_round_trip(tmp_path):
+    """Индекс, прочитанный из файла, совпадает с маппингами, построенными в памяти"""
+    alias_to_company_id, canonical_to_crm = build_company_mappings(COMPANIES)
+    content_hash = hash_companies_dataframe(COMPANIES)
+    file_path = tmp_path / "companies.idx"
+
+    write_alias_index(str(file_path), alias_to_company_id, canonical_to_crm, content_hash)
+    alias_index = read_alias_index(str(file_path))
+
+    assert alias_index.content_hash == content_hash
+    assert alias_index.alias_to_company_id == alias_to_company_id
+    loaded_crm = alias_index.canonical_to_crm
+    assert list(loaded_crm.canonical_names) == canonical_to_crm.canonical_names
+    assert loaded_crm.fields == canonical_to_crm.fields
+    assert np.array_equal(loaded_crm.field_codes, canonical_to_crm.field_codes)
+    assert dict(loaded_crm) == dict(canonical_to_crm)
+    assert loaded_crm["мтс"] == {"#": 5, "Ответственный ДК": "Сидоров", "Ответственный Media": None}
+
+    in_memory_matches = AliasMatcher(alias_to_company_id).find_matches(POST_TEXT)
+    assert AliasMatcher(alias_index.alias_to_company_id).find_matches(POST_TEXT) == in_memory_matches
+    assert [loaded_crm.canonical_names[company_id] for _, _, company_id in in_memory_matches] == [
+        "альфа-банк", "мтс", "елки-палки",
+    ]
+
+
+def test_field_values_keep_their_types_without_pickle(tmp_path):
+    """Значения колонок хранятся в таблице строк индекса и читаются с исходными типами"""
+    companies = pd.DataFrame({
+        "Полное имя": ["Альфа", "Бета", "Гамма", "Дельта"],
+        "#": [1.5, float("nan"), 3.0, 1.5],
+        "Ответственный ДК": ["Иванов", None, "Ёлкин", "Иванов"],
+        "Ответственный Media": [7, 8, 9, 7],
+    })
+    alias_to_company_id, canonical_to_crm = build_company_mappings(companies)
+    file_path = tmp_path / "companies.idx"
+
+    write_alias_index(str(file_path), alias_to_company_id, canonical_to_crm, hash_companies_dataframe(companies))
+    loaded_crm = read_alias_index(str(file_path)).canonical_to_crm
+
+    assert loaded_crm["альфа"] == {"#": 1.5, "Ответственный ДК": "Иванов", "Ответственный Media": 7}
+    assert type(loaded_crm["гамма"]["Ответственный Media"]) is int
+    assert pd.isna(loaded_crm["бета"]["Ответственный ДК"])
+    assert np.isnan(loaded_crm["бета"]["#"])
+    assert loaded_crm["гамма"]["Ответственный ДК"] == "Ёлкин"
+    assert loaded_crm.company_id("дельта") == 3
+    assert loaded_crm.get("эпсилон") is None
+
+
+def test_index_of_other_version_is_rejected_and_rebuilt(tmp_path):
+    store = AliasIndexStore(str(tmp_path))
+    content_hash = hash_companies_dataframe(COMPANIES)
+    store.load_or_build(COMPANIES, content_hash)
+    file_path = store._index_path(content_hash)
+
+    # Версия формата записана сразу после сигнатуры
+    with open(file_path, "r+b") as index_file:
+        index_file.seek(8)
+        index_file.write(struct.pack("<I", 1))
+
+    with pytest.raises(ValueError):
+        read_alias_index(file_path)
+    assert store.load(content_hash) is None
+
+    alias_index = store.load_or_build(COMPANIES, content_hash)
+    assert alias_index.alias_to_company_id == build_company_mappings(COMPANIES)[0]
+    assert read_alias_index(file_path).content_hash == content_hash
+
+
+def test_truncated_index_is_rejected(tmp_path):
+    file_path = tmp_path / "companies.idx"
+    file_path.write_bytes(b"\x00" * (INDEX_HEADER.size - 1))
+
+    with pytest.raises(ValueError):
+        read_alias_index(str(file_path))
+
+
+def test_index_is_found_by_source_revision(tmp_path):
+    """После перезапуска индекс загружается по ревизии источника без чтения CRM"""
+    content_hash = hash_companies_dataframe(COMPANIES)
+    AliasIndexStore(str(tmp_path)).load_or_build(COMPANIES, content_hash, revision="2024-05-01T10:00:00")
+
+    store = AliasIndexStore(str(tmp_path))
+    alias_index = store.find_by_revision("2024-05-01T10:00:00")
+
+    assert alias_index is not None and alias_index.content_hash == content_hash
+    assert alias_index.alias_to_company_id == build_company_mappings(COMPANIES)[0]
+    assert store.find_by_revision("2024-05-02T10:00:00") is None
+
+
+def test_old_indexes_and_their_revisions_are_removed(tmp_path):
+    store = AliasIndexStore(str(tmp_path), keep_files=1)
+    old_companies = COMPANIES.iloc[:2]
+    store.load_or_build(old_companies, revision="old")
+    store.load_or_build(COMPANIES, revision="new")
+
+    assert store.find_by_revision("old") is None
+    assert store.find_by_revision("new").content_hash == hash_companies_dataframe(COMPANIES)
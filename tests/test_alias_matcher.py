@@ -0,0 +1,83 @@
+from alias_matcher import AliasMatcher
+from company_mentions import find_company_mentions_in_post
+
+ALIAS_TO_CANONICAL = {
+    "альфа": "Альфа",
+    "альфа банк": "Альфа-Банк",
+    "банк санкт-петербург": "Банк Санкт-Петербург",
+    "мтс": "МТС",
+    "елки-палки": "Ёлки-Палки",
+    "сбербанк": "Сбербанк",
+}
+COMPANY_NAMES = list(dict.fromkeys(ALIAS_TO_CANONICAL.values()))
+ALIAS_TO_COMPANY_ID = {alias: COMPANY_NAMES.index(name) for alias, name in ALIAS_TO_CANONICAL.items()}
+
+
+def find_matches(matcher: AliasMatcher, text: str) -> list[tuple[int, int, str]]:
+    """Совпадения псевдонимов с названиями компаний вместо номеров"""
+    return [(start, end, COMPANY_NAMES[company_id]) for start, end, company_id in matcher.find_matches(text)]
+
+
+def find_mentions(post_text: str, matcher: AliasMatcher) -> list[str]:
+    """Упоминания в посте: номера компаний заменены названиями, свободные упоминания остаются текстом"""
+    return [COMPANY_NAMES[company] if isinstance(company, int) else company
+            for company in find_company_mentions_in_post(post_text, matcher)]
+
+
+def test_overlapping_aliases_use_leftmost_longest():
+    """Из пересекающихся псевдонимов берется самый левый, а среди них самый длинный"""
+    matcher = AliasMatcher(ALIAS_TO_COMPANY_ID)
+
+    assert find_matches(matcher, "альфа банк санкт-петербург") == [(0, 10, "Альфа-Банк")]
+    assert find_matches(matcher, "альфа и банк санкт-петербург") == [
+        (0, 5, "Альфа"), (8, 28, "Банк Санкт-Петербург"),
+    ]
+
+
+def test_aliases_match_only_whole_words():
+    matcher = AliasMatcher(ALIAS_TO_COMPANY_ID)
+
+    assert find_matches(matcher, "мтсбанк 5мтс мтс5") == []
+    assert find_matches(matcher, "мтс, мтс-банк") == [(0, 3, "МТС"), (5, 8, "МТС")]
+
+
+def test_post_text_is_folded_before_matching():
+    """Регистр и "ё" в тексте поста не мешают найти нормализованные псевдонимы"""
+    matcher = AliasMatcher(ALIAS_TO_COMPANY_ID)
+
+    assert find_mentions("Компании: ЁЛКИ-ПАЛКИ, СберБанк", matcher) == ["Ёлки-Палки", "Сбербанк"]
+    assert find_mentions("Ёлки-палки и ещё раз елки-палки", matcher) == ["Ёлки-Палки"]
+
+
+def test_unknown_fragments_fall_back_to_fuzzy_search():
+    matcher = AliasMatcher(ALIAS_TO_COMPANY_ID, fuzzy_threshold=0.75)
+
+    assert COMPANY_NAMES[matcher.find_similar("сбербанкк")] == "Сбербанк"
+    assert matcher.find_similar("рога и копыта") is None
+    assert find_mentions("Компании: Сбербанкк, Рога и копыта", matcher) == [
+        "Сбербанк", "рога и копыта",
+    ]
+
+
+def test_fuzzy_search_can_be_disabled():
+    matcher = AliasMatcher(ALIAS_TO_COMPANY_ID, fuzzy_threshold=0)
+
+    assert matcher.fuzzy_index is None
+    assert matcher.find_similar("сбербанкк") is None
+    assert find_mentions("Компании: Сбербанкк", matcher) == ["сбербанкк"]
+
+
+def test_fuzzy_match_of_first_company_is_kept():
+    """Номер 0 — обычный номер компании, а не отсутствие совпадения"""
+    matcher = AliasMatcher({"сбербанк": 0}, fuzzy_threshold=0.75)
+
+    assert find_company_mentions_in_post("Компании: Сбербанкк", matcher) == [0]
+
+
+def test_whitespace_and_yo_are_normalized_before_matching():
+    """Лишние пробелы, табуляция и Ё не мешают найти псевдоним, переводы строк остаются разделителями"""
+    matcher = AliasMatcher(ALIAS_TO_COMPANY_ID)
+
+    assert find_mentions("Компании:  Альфа\t Банк \n  ЁЛКИ-ПАЛКИ\nновая   фирма ", matcher) == [
+        "Альфа-Банк", "Ёлки-Палки", "новая фирма",
+    ]
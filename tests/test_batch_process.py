@@ -0,0 +1,133 @@
+import sys
+
+import pandas as pd
+import pytest
+
+import alias_index
+import batch_process
+import mention_engine
+import mention_store
+from batch_process import build_path_prefixes, collect_input_files, main, run_batch
+from crm_sources import CRM_SHEET_NAME, UploadedWorkbookCrmSource
+from mention_engine import MentionEngine
+
+COMPANIES = pd.DataFrame({
+    "#": [1, 2],
+    "Полное имя": ["МТС", "Сбер"],
+    "Also known as (AKA)": ["мобильные телесистемы", None],
+    "Ответственный ДК": ["Иванов", "Петров"],
+})
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """Ядро только с листом "для ВПР" из пакета; индекс не сохраняется, хранилище упоминаний — во временном каталоге"""
+    monkeypatch.setattr(alias_index, "ALIAS_INDEX_DIRECTORY", "")
+    monkeypatch.setattr(mention_store, "MENTION_STORE_PATH", str(tmp_path / "mentions.sqlite3"))
+    monkeypatch.setattr(mention_store, "_default_store", None)
+    batch_engine = MentionEngine([UploadedWorkbookCrmSource()], [])
+    monkeypatch.setattr(mention_engine, "_engine", batch_engine)
+    yield batch_engine
+    batch_engine.close()
+
+
+def write_batch(directory) -> list[str]:
+    """Пишет пакет: xlsx с постами и CRM и csv только с постами"""
+    directory.mkdir()
+    workbook_path = directory / "first.xlsx"
+    with pd.ExcelWriter(workbook_path) as writer:
+        pd.DataFrame({
+            "Пост": ["https://vk.com/wall-1_1", "https://vk.com/wall-1_2"],
+            "GPT": ["Компании: МТС, Сбер", "мобильные телесистемы"],
+        }).to_excel(writer, sheet_name="vk", index=False)
+        COMPANIES.to_excel(writer, sheet_name=CRM_SHEET_NAME, index=False)
+    csv_path = directory / "second.csv"
+    pd.DataFrame({
+        "Пост": ["https://vk.com/wall-2_1", "https://vk.com/wall-2_2"],
+        "GPT": ["Компании: Сбер, Рога и копыта", None],
+    }).to_csv(csv_path, sep=";", index=False)
+    return [str(workbook_path), str(csv_path)]
+
+
+def read_report(file_path: str) -> dict[str, int]:
+    report = pd.read_csv(file_path)
+    return dict(zip(report["Компания"], report["Количество упоминаний"]))
+
+
+def test_collect_input_files(tmp_path):
+    """Каталоги и шаблоны раскрываются без повторов, неподдерживаемые файлы и каталог отчетов пропускаются"""
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "reports").mkdir()
+    for file_name in ("b.csv", "a.jsonl", "notes.txt", "nested/c.csv", "reports/report.csv"):
+        (tmp_path / file_name).write_text('{"GPT": "МТС"}\n' if file_name.endswith(".jsonl") else "GPT\nМТС\n",
+                                          encoding="utf-8")
+
+    reports_directory = str(tmp_path / "reports")
+    assert collect_input_files([str(tmp_path)], exclude_directory=reports_directory) == [
+        str(tmp_path / "a.jsonl"), str(tmp_path / "b.csv"),
+    ]
+    assert collect_input_files([str(tmp_path)], recursive=True, exclude_directory=reports_directory) == [
+        str(tmp_path / "a.jsonl"), str(tmp_path / "b.csv"), str(tmp_path / "nested" / "c.csv"),
+    ]
+    assert collect_input_files([str(tmp_path / "b.csv"), str(tmp_path / "*.csv")]) == [str(tmp_path / "b.csv")]
+    assert collect_input_files([str(tmp_path / "missing")]) == []
+
+
+def test_path_prefixes_do_not_collide():
+    assert build_path_prefixes(["a/posts.xlsx", "b/posts.csv.gz", "c/other.csv"], "out") == [
+        "out/posts", "out/posts_2", "out/other",
+    ]
+
+
+def test_batch_writes_per_file_and_merged_reports(tmp_path, engine):
+    file_paths = write_batch(tmp_path / "exports")
+    output_directory = str(tmp_path / "reports")
+
+    file_results, merged_outputs = run_batch(file_paths, output_directory, ("upload",), ("csv",), ("csv",), 1)
+
+    assert [file_result.error for file_result in file_results] == [None, None]
+    assert read_report(file_results[0].report_outputs[0].file_path) == {"мтс": 2, "сбер": 1}
+    assert read_report(file_results[1].report_outputs[0].file_path) == {"сбер": 1, "рога и копыта": 1}
+    assert merged_outputs[0].file_path == f"{output_directory}/batch_merged_report.csv"
+    assert read_report(merged_outputs[0].file_path) == {"мтс": 2, "сбер": 2, "рога и копыта": 1}
+    # Посты пакета попадают в хранилище упоминаний, как при загрузке через бота
+    stored_aggregator = mention_store.get_mention_store().aggregate_mentions()
+    assert len(stored_aggregator) == 3
+
+
+def test_failed_file_does_not_stop_batch(tmp_path, engine):
+    file_paths = write_batch(tmp_path / "exports")
+    broken_path = tmp_path / "exports" / "broken.xlsx"
+    broken_path.write_bytes(b"PK\x03\x04 not a workbook")
+
+    file_results, merged_outputs = run_batch([file_paths[0], str(broken_path)], str(tmp_path / "reports"),
+                                             ("upload",), (), ("csv",), 1)
+
+    assert file_results[0].error is None
+    assert file_results[0].report_outputs == []
+    assert file_results[1].error is not None
+    assert read_report(merged_outputs[0].file_path) == {"мтс": 2, "сбер": 1}
+
+
+def test_main_exits_with_error_without_input_files(tmp_path, engine, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["batch_process.py", str(tmp_path / "missing")])
+
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+
+    assert exit_info.value.code == 1
+    assert "Нет файлов для обработки" in capsys.readouterr().out
+
+
+def test_main_processes_directory(tmp_path, engine, monkeypatch, capsys):
+    write_batch(tmp_path / "exports")
+    output_directory = tmp_path / "reports"
+    monkeypatch.setattr(sys, "argv", ["batch_process.py", str(tmp_path / "exports"), "--output-dir",
+                                      str(output_directory), "--formats", "csv", "--crm-sources", "upload",
+                                      "--workers", "1", "--no-per-file"])
+
+    main()
+
+    assert "Обработано файлов: 2 из 2" in capsys.readouterr().out
+    assert sorted(path.name for path in output_directory.iterdir()) == ["batch_merged_report.csv"]
+    assert batch_process._batch_snapshot is not None
@@ -0,0 +1,67 @@
+import pandas as pd
+
+from alias_matcher import AliasMatcher
+from benchmarks.normalization_benchmark import (SAMPLE_COMPANIES, generate_posts, prepare_posts_current,
+                                                prepare_posts_legacy)
+from benchmarks.pipeline_benchmark import (compare_with_baseline, generate_crm_dataframe, generate_posts_dataframe,
+                                           run_scale)
+from company_mentions import build_company_mappings, find_company_mentions_in_post
+from text_normalization import normalize_text
+
+STAGE_NAMES = {
+    "read_excel_posts", "read_xlsx_posts_stream", "read_excel_crm", "build_company_mappings", "build_alias_matcher",
+    "find_mentions", "aggregate", "write_report_csv", "build_report_dataframe", "report_sheet_rows",
+}
+
+
+def test_synthetic_data_is_reproducible():
+    """Одно и то же зерно дает одинаковые листы CRM и постов"""
+    crm_dataframe = generate_crm_dataframe(50, seed=7)
+    posts_dataframe = generate_posts_dataframe(200, crm_dataframe, seed=7)
+
+    assert crm_dataframe.equals(generate_crm_dataframe(50, seed=7))
+    assert posts_dataframe.equals(generate_posts_dataframe(200, crm_dataframe, seed=7))
+    assert crm_dataframe["Полное имя"].is_unique
+    assert list(posts_dataframe.columns) == ["Пост", "Группа", "GPT"]
+    assert len(posts_dataframe) == 200
+
+
+def test_run_scale_measures_every_stage():
+    results = run_scale(200, 50, 7, ("csv",))
+
+    assert results["posts"] == 200
+    assert results["companies"] == 50
+    assert results["report_rows"] > 0
+    assert set(results["stages"]) == STAGE_NAMES
+    assert all(stage["seconds"] >= 0 for stage in results["stages"].values())
+    assert results["stages"]["find_mentions"]["rows"] == 200
+
+
+def test_compare_with_baseline_reports_only_slowdowns_over_tolerance():
+    baseline = {"scales": {"1000": {"stages": {"find_mentions": {"seconds": 1.0}, "aggregate": {"seconds": 1.0},
+                                               "build_alias_matcher": {"seconds": 0.0}}}}}
+    results = {"scales": {"1000": {"stages": {"find_mentions": {"seconds": 1.5}, "aggregate": {"seconds": 1.2},
+                                              "build_alias_matcher": {"seconds": 9.0},
+                                              "read_excel_crm": {"seconds": 9.0}}}}}
+
+    regressions = compare_with_baseline(results, baseline, 0.25)
+
+    assert len(regressions) == 1
+    assert regressions[0].startswith("1000 / find_mentions")
+
+
+def test_normalization_benchmark_posts_are_found_in_mention_order():
+    """Синтетические посты микробенчмарка находятся рабочим поиском под каноническими названиями"""
+    alias_to_company_id, canonical_to_crm = build_company_mappings(pd.DataFrame({"Полное имя": SAMPLE_COMPANIES}))
+    alias_matcher = AliasMatcher(alias_to_company_id)
+    generated_posts = generate_posts(50, seed=3)
+
+    for post, companies in generated_posts:
+        expected_mentions = [normalize_text(company) for company in companies
+                             if normalize_text(company) in alias_to_company_id]
+        found_mentions = [canonical_to_crm.canonical_names[company_id]
+                          for company_id in find_company_mentions_in_post(post, alias_matcher)]
+        assert found_mentions == expected_mentions
+    posts = [post for post, _ in generated_posts]
+    assert prepare_posts_current(posts) > 0
+    assert prepare_posts_legacy(posts) > 0
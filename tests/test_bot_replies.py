@@ -0,0 +1,47 @@
+import asyncio
+
+from bot import reply_with_report
+from report_sinks import ReportOutput
+
+
+class FakeMessage:
+    """Сообщение Telegram, запоминающее ответы бота"""
+
+    def __init__(self):
+        self.documents = []
+        self.texts = []
+
+    async def reply_document(self, document, filename: str) -> None:
+        self.documents.append(filename)
+
+    async def reply_text(self, text: str) -> None:
+        self.texts.append(text)
+
+
+def test_reply_describes_only_sinks_that_ran(tmp_path):
+    report_path = tmp_path / "processed_report.xlsx"
+    report_path.write_bytes(b"")
+    message = FakeMessage()
+
+    asyncio.run(reply_with_report(message, [
+        ReportOutput("xlsx", 3, "файл processed_report.xlsx", file_path=str(report_path),
+                     file_name="processed_report.xlsx"),
+    ], "✅ Обработка завершена! Отчет сохранен"))
+
+    assert message.documents == ["processed_report.xlsx"]
+    assert message.texts == ["✅ Обработка завершена! Отчет сохранен: файл processed_report.xlsx"]
+
+
+def test_reply_lists_sheet_links():
+    message = FakeMessage()
+
+    asyncio.run(reply_with_report(message, [
+        ReportOutput("google", 3, "лист 'Сводный отчет' Google Таблицы", url="https://example.com/sheet",
+                     sheet_name="Сводный отчет"),
+    ], "Отчет за все время сохранен"))
+
+    assert message.documents == []
+    assert message.texts == [
+        "Отчет за все время сохранен: лист 'Сводный отчет' Google Таблицы\n"
+        "📊 Лист 'Сводный отчет':\nhttps://example.com/sheet"
+    ]
@@ -0,0 +1,146 @@
+import pandas as pd
+
+from alias_matcher import AliasMatcher
+from company_mentions import (INVALID_ALIASES, MentionAggregator, build_company_mappings,
+                              find_company_mentions_in_post)
+from text_normalization import normalize_text
+
+COMPANIES = pd.DataFrame({
+    "Полное имя": ["Альфа-Банк", "МТС", None, "  ", "Ёлки-Палки", "мтс", "ВК", "ИП"],
+    "Also known as (AKA)": ["Альфа банк, альфа,, ", "мобильные телесистемы, ao", "Без названия", "Пусто",
+                            "елки палки, альфа", None, "vk, вк", "ип"],
+    "#": [1, 2, 3, 4, 5, 6, 7, 8],
+    "Ответственный ДК": ["Иванов", "Петров", None, None, "Иванов", "Сидоров", None, "Орлов"],
+    "Лишняя колонка": list("abcdefgh"),
+}, index=[10, 11, 12, 13, 14, 15, 16, 17])
+
+
+def build_company_mappings_by_rows(companies_dataframe: pd.DataFrame) -> tuple[dict[str, str], dict[str, dict]]:
+    """Исходный построчный обход: псевдоним -> каноническое название и название -> строка CRM"""
+    alias_to_canonical = {}
+    canonical_to_crm_data = {}
+    for _, company_row in companies_dataframe.iterrows():
+        canonical_name = normalize_text(company_row.get("Полное имя", ""))
+        if not canonical_name:
+            continue
+        canonical_to_crm_data[canonical_name] = company_row.to_dict()
+        alias_to_canonical[canonical_name] = canonical_name
+
+        aka_names = company_row.get("Also known as (AKA)", "")
+        if not pd.isna(aka_names):
+            for alias in str(aka_names).split(","):
+                normalized_alias = normalize_text(alias)
+                if normalized_alias:
+                    alias_to_canonical[normalized_alias] = canonical_name
+
+    valid_two_letter_names = {name for name in canonical_to_crm_data if len(name) == 2}
+    alias_to_canonical = {
+        alias: canonical_name for alias, canonical_name in alias_to_canonical.items()
+        if alias not in INVALID_ALIASES and (len(alias) > 2 or alias in valid_two_letter_names)
+    }
+    return alias_to_canonical, canonical_to_crm_data
+
+
+def test_vectorized_mappings_match_row_by_row_build():
+    alias_to_company_id, canonical_to_crm = build_company_mappings(COMPANIES)
+    expected_aliases, expected_crm_data = build_company_mappings_by_rows(COMPANIES)
+
+    assert {alias: canonical_to_crm.canonical_names[company_id]
+            for alias, company_id in alias_to_company_id.items()} == expected_aliases
+    assert list(alias_to_company_id) == list(expected_aliases)
+    assert list(canonical_to_crm) == list(expected_crm_data)
+    for canonical_name, crm_row in expected_crm_data.items():
+        for field in ("#", "Ответственный ДК"):
+            value, expected_value = canonical_to_crm[canonical_name][field], crm_row[field]
+            # Пустые ячейки могут прийти как None или NaN, в отчете они одинаково пустые
+            assert value == expected_value or (pd.isna(value) and pd.isna(expected_value))
+
+
+def test_later_rows_win_for_duplicate_names_and_aliases():
+    alias_to_company_id, canonical_to_crm = build_company_mappings(COMPANIES)
+    names = canonical_to_crm.canonical_names
+
+    # Повторное "мтс" сохраняет позицию первой строки, но данные последней
+    assert list(names) == ["альфа-банк", "мтс", "елки-палки", "вк", "ип"]
+    assert canonical_to_crm["мтс"]["#"] == 6
+    # Псевдоним "альфа" перезаписан более поздней строкой
+    assert names[alias_to_company_id["альфа"]] == "елки-палки"
+    # Двухбуквенные псевдонимы остаются, только если так называется компания; vk и вк исключены всегда
+    assert "ип" in alias_to_company_id and "ao" not in alias_to_company_id
+    assert "vk" not in alias_to_company_id and "вк" not in alias_to_company_id
+
+
+def test_mappings_without_alias_column():
+    alias_to_company_id, canonical_to_crm = build_company_mappings(pd.DataFrame({"Полное имя": ["Сбер", "Ozon"]}))
+
+    assert alias_to_company_id == {"сбер": 0, "ozon": 1}
+    assert canonical_to_crm["ozon"] == {"#": None, "Ответственный ДК": None, "Ответственный Media": None}
+
+
+def test_mentions_are_found_by_aliases_and_kept_as_free_text():
+    alias_to_company_id, canonical_to_crm = build_company_mappings(COMPANIES)
+    alias_matcher = AliasMatcher(alias_to_company_id)
+
+    companies = find_company_mentions_in_post(
+        "Компании: ООО Мобильные Телесистемы; Альфа-Банк, ВКонтакте • Рога и копыта, стажировка, vk", alias_matcher,
+    )
+
+    assert [canonical_to_crm.canonical_names[company] if isinstance(company, int) else company
+            for company in companies] == ["мтс", "альфа-банк", "вконтакте", "рога и копыта"]
+    assert find_company_mentions_in_post(None, alias_matcher) == []
+
+
+POSTS = [
+    ("https://vk.com/wall-1_1", [0, "рога и копыта"]),
+    ("https://vk.com/wall-1_2", [1, 0]),
+    ("https://vk.com/wall-1_1", [0]),
+    (None, [1]),
+    ("https://vk.com/wall-1_3", [1, 2]),
+    ("https://vk.com/wall-1_4", [0]),
+]
+
+
+def aggregate(posts, max_links_per_company: int = 0) -> MentionAggregator:
+    aggregator = MentionAggregator(max_links_per_company)
+    for post_link, companies in posts:
+        aggregator.add_post(post_link, companies)
+    return aggregator
+
+
+def test_aggregator_counts_mentions_and_keeps_unique_links_in_order():
+    aggregator = aggregate(POSTS)
+
+    assert {company: record.mention_count for company, record in aggregator.records.items()} == {
+        0: 4, "рога и копыта": 1, 1: 3, 2: 1,
+    }
+    assert list(aggregator.records[0].post_links) == [
+        "https://vk.com/wall-1_1", "https://vk.com/wall-1_2", "https://vk.com/wall-1_4",
+    ]
+    assert list(aggregator.records[1].post_links) == ["https://vk.com/wall-1_2", "https://vk.com/wall-1_3"]
+
+
+def test_aggregator_limits_links_but_not_mention_counts():
+    aggregator = aggregate(POSTS, max_links_per_company=2)
+
+    assert aggregator.records[0].mention_count == 4
+    assert list(aggregator.records[0].post_links) == ["https://vk.com/wall-1_1", "https://vk.com/wall-1_2"]
+
+
+def test_merged_parts_match_sequential_aggregation():
+    """Объединение частей в порядке постов дает тот же результат, что и последовательный проход"""
+    for max_links_per_company in (0, 2):
+        merged = aggregate(POSTS[:3], max_links_per_company)
+        merged.merge(aggregate(POSTS[3:], max_links_per_company))
+        expected = aggregate(POSTS, max_links_per_company)
+
+        assert list(merged.records) == list(expected.records)
+        for company, record in expected.records.items():
+            assert merged.records[company].mention_count == record.mention_count
+            assert list(merged.records[company].post_links) == list(record.post_links)
+
+
+def test_records_are_sorted_by_count_with_stable_ties():
+    aggregator = aggregate(POSTS)
+
+    assert [company for company, _ in aggregator.iter_sorted_records()] == [0, 1, "рога и копыта", 2]
+    assert [company for company, _ in aggregator.iter_sorted_records(max_rows=3)] == [0, 1, "рога и копыта"]
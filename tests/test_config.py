@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+from config import describe_crm_sources, parse_names
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_parse_names_skips_blanks():
+    assert parse_names(" upload, google,,file ") == ("upload", "google", "file")
+    assert parse_names(None) == ()
+
+
+def test_describe_crm_sources_uses_configured_sources(monkeypatch):
+    monkeypatch.delenv("GOOGLE_SHEET_KEY", raising=False)
+    monkeypatch.setenv("CRM_FILE_PATH", os.path.join("crm", "companies.xlsx"))
+
+    assert describe_crm_sources(("upload", "google", "file")) == \
+        "листа \"для ВПР\" загруженного файла или файла companies.xlsx"
+
+    monkeypatch.setenv("GOOGLE_SHEET_KEY", "key")
+    monkeypatch.delenv("CRM_FILE_PATH")
+    assert describe_crm_sources(("google", "file")) == "CRM Google Таблицы"
+
+
+def test_start_reply_does_not_load_processing_engine(tmp_path):
+    """Ответ на /start строится без импорта ядра обработки (pandas, openpyxl, gspread)"""
+    script = (
+        "import asyncio, sys\n"
+        "import bot\n"
+        "class Message:\n"
+        "    async def reply_text(self, text):\n"
+        "        print(text)\n"
+        "class User:\n"
+        "    id = 1\n"
+        "class Update:\n"
+        "    effective_user = User()\n"
+        "    message = Message()\n"
+        "asyncio.run(bot.start_command(Update(), None))\n"
+        "assert 'mention_engine' not in sys.modules and 'pandas' not in sys.modules\n"
+    )
+    completed = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True,
+                               env={**os.environ, "PYTHONPATH": REPOSITORY_DIRECTORY}, timeout=60)
+
+    assert completed.returncode == 0, completed.stderr
+    assert "Данные о компаниях берутся из" in completed.stdout
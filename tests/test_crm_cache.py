@@ -0,0 +1,89 @@
+import pandas as pd
+
+from alias_index import AliasIndexStore
+from crm_cache import CrmCache
+
+COMPANIES = pd.DataFrame({"Полное имя": ["Сбер", "Яндекс"], "Also known as (AKA)": ["Сбербанк", None]})
+
+
+class FakeCrmSource:
+    """Источник CRM, считающий загрузки данных и запросы ревизии"""
+
+    def __init__(self):
+        self.companies = COMPANIES
+        self.revision = "r1"
+        self.loads = 0
+        self.revision_requests = 0
+
+    def load_companies(self) -> pd.DataFrame:
+        self.loads += 1
+        return self.companies
+
+    def get_revision(self) -> str:
+        self.revision_requests += 1
+        if self.revision is None:
+            raise ConnectionError("Google API недоступен")
+        return self.revision
+
+
+def test_snapshot_is_reused_within_ttl(tmp_path):
+    source = FakeCrmSource()
+    crm_cache = CrmCache(source.load_companies, source.get_revision, ttl_seconds=3600,
+                         index_store=AliasIndexStore(str(tmp_path)))
+
+    snapshot = crm_cache.get()
+    source.revision = "r2"
+
+    assert crm_cache.get() is snapshot
+    assert (source.loads, source.revision_requests) == (1, 1)
+
+    crm_cache.invalidate()
+    assert crm_cache.get() is not snapshot
+    assert source.loads == 2
+
+
+def test_expired_snapshot_is_reloaded_only_when_revision_changes(tmp_path):
+    source = FakeCrmSource()
+    crm_cache = CrmCache(source.load_companies, source.get_revision, ttl_seconds=0,
+                         index_store=AliasIndexStore(str(tmp_path)))
+
+    snapshot = crm_cache.get()
+    alias_matcher = snapshot.alias_matcher
+    assert crm_cache.get() is snapshot
+    assert source.loads == 1
+
+    # Ревизия изменилась, а содержимое нет: маппинги и автомат не перестраиваются
+    source.revision = "r2"
+    assert crm_cache.get() is snapshot
+    assert source.loads == 2
+    assert snapshot.revision == "r2" and snapshot.alias_matcher is alias_matcher
+
+    source.revision = "r3"
+    source.companies = pd.DataFrame({"Полное имя": ["Сбер", "Яндекс", "Озон"]})
+    updated_snapshot = crm_cache.get()
+    assert updated_snapshot is not snapshot
+    assert list(updated_snapshot.canonical_to_crm) == ["сбер", "яндекс", "озон"]
+
+
+def test_revision_errors_force_reload(tmp_path):
+    source = FakeCrmSource()
+    crm_cache = CrmCache(source.load_companies, source.get_revision, ttl_seconds=0,
+                         index_store=AliasIndexStore(str(tmp_path)))
+    snapshot = crm_cache.get()
+
+    source.revision = None
+    assert crm_cache.get() is snapshot
+    assert source.loads == 2
+
+
+def test_cold_start_loads_index_saved_for_same_revision(tmp_path):
+    """После перезапуска снимок для неизменной ревизии берется из индекса без загрузки CRM"""
+    first_source = FakeCrmSource()
+    CrmCache(first_source.load_companies, first_source.get_revision, index_store=AliasIndexStore(str(tmp_path))).get()
+
+    source = FakeCrmSource()
+    snapshot = CrmCache(source.load_companies, source.get_revision, index_store=AliasIndexStore(str(tmp_path))).get()
+
+    assert source.loads == 0
+    assert dict(snapshot.alias_to_company_id) == {"сбер": 0, "сбербанк": 0, "яндекс": 1}
+    assert snapshot.alias_matcher.find_matches("сбербанк") == [(0, 8, 0)]
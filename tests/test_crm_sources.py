@@ -0,0 +1,30 @@
+import pandas as pd
+
+import crm_sources
+from crm_sources import CRM_SHEET_NAME, UploadedWorkbookCrmSource, has_crm_sheet
+
+
+def test_crm_sheet_is_found_only_in_xlsx_with_that_sheet(tmp_path):
+    with pd.ExcelWriter(tmp_path / "with_crm.xlsx") as writer:
+        pd.DataFrame({"GPT": ["МТС"]}).to_excel(writer, sheet_name="vk", index=False)
+        pd.DataFrame({"Полное имя": ["МТС"]}).to_excel(writer, sheet_name=CRM_SHEET_NAME, index=False)
+    pd.DataFrame({"GPT": ["МТС"]}).to_excel(tmp_path / "posts_only.xlsx", sheet_name="vk", index=False)
+
+    assert has_crm_sheet(str(tmp_path / "with_crm.xlsx"))
+    assert not has_crm_sheet(str(tmp_path / "posts_only.xlsx"))
+    assert UploadedWorkbookCrmSource().is_available(str(tmp_path / "with_crm.xlsx"))
+    assert not UploadedWorkbookCrmSource().is_available(None)
+
+
+def test_other_formats_are_skipped_without_opening_workbook(tmp_path, monkeypatch):
+    """CSV и JSONL не открываются как xlsx и не дают предупреждений в логе"""
+    (tmp_path / "posts.csv").write_text("Пост;GPT\nhttps://vk.com/wall-1_1;МТС\n", encoding="utf-8")
+    (tmp_path / "posts.jsonl").write_text('{"GPT": "МТС"}\n', encoding="utf-8")
+    warnings = []
+    monkeypatch.setattr(crm_sources, "load_workbook", lambda *args, **kwargs: warnings.append("load_workbook"))
+    monkeypatch.setattr(crm_sources.logger, "warning", lambda *args: warnings.append(args))
+
+    assert not has_crm_sheet(str(tmp_path / "posts.csv"))
+    assert not UploadedWorkbookCrmSource().is_available(str(tmp_path / "posts.jsonl"))
+    assert not has_crm_sheet(str(tmp_path / "missing.xlsx"))
+    assert warnings == []
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from crm_table import CRM_REPORT_FIELDS, CrmTable
+
+CANONICAL_NAMES = ["альфа-банк", "мтс", "елки-палки"]
+CRM_ROWS = pd.DataFrame({
+    "#": [1, 2, 3],
+    "Ответственный ДК": ["Иванов", None, "Иванов"],
+    "Лишняя колонка": ["a", "b", "c"],
+})
+
+
+def build_table() -> CrmTable:
+    return CrmTable.from_dataframe(CANONICAL_NAMES, CRM_ROWS)
+
+
+def test_rows_keep_only_report_fields():
+    """Строка компании содержит только колонки отчета, отсутствующая в CRM колонка хранится как None"""
+    crm_table = build_table()
+
+    row = crm_table.get_row(0)
+    assert set(row) == set(CRM_REPORT_FIELDS)
+    assert row["#"] == 1
+    assert row["Ответственный ДК"] == "Иванов"
+    assert row["Ответственный Media"] is None
+    assert pd.isna(crm_table.get_row(1)["Ответственный ДК"])
+    assert crm_table["елки-палки"] == {"#": 3, "Ответственный ДК": "Иванов", "Ответственный Media": None}
+
+
+def test_values_are_dictionary_encoded():
+    """Повторяющиеся значения колонки хранятся один раз, строки ссылаются на них кодами"""
+    crm_table = build_table()
+
+    field_position = crm_table.fields.index("Ответственный ДК")
+    assert crm_table.field_codes.shape == (len(CRM_REPORT_FIELDS), len(CANONICAL_NAMES))
+    assert crm_table.field_codes.dtype == np.uint32
+    assert len(crm_table.field_values[field_position]) == 2
+    assert crm_table.field_codes[field_position][0] == crm_table.field_codes[field_position][2]
+    assert crm_table.get_row(0)["Ответственный ДК"] is crm_table.get_row(2)["Ответственный ДК"]
+
+
+def test_mapping_interface_by_canonical_name():
+    crm_table = build_table()
+
+    assert len(crm_table) == 3
+    assert list(crm_table) == CANONICAL_NAMES
+    assert "мтс" in crm_table
+    assert "билайн" not in crm_table
+    assert crm_table.company_id("елки-палки") == 2
+    assert crm_table.company_id("билайн") is None
+    assert crm_table.get("билайн") is None
+    assert crm_table.get("билайн", {}) == {}
+    assert crm_table.get("мтс")["#"] == 2
+    assert dict(crm_table.items())["альфа-банк"]["#"] == 1
+
+
+def test_company_ids_are_built_on_first_lookup():
+    """Маппинг названий на номера не строится, пока строки запрашиваются только по номеру"""
+    crm_table = build_table()
+
+    crm_table.get_row(1)
+    assert crm_table._company_ids is None
+    assert crm_table.company_ids == {"альфа-банк": 0, "мтс": 1, "елки-палки": 2}
+    assert crm_table.company_ids is crm_table.company_ids
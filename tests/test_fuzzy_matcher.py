@@ -0,0 +1,94 @@
+import random
+
+from alias_matcher import AliasMatcher
+from company_mentions import find_company_mentions_in_post
+from fuzzy_matcher import FUZZY_MATCH_THRESHOLD, FuzzyAliasIndex, fold_transliteration, get_trigrams
+
+# Рабочий порог нечеткого поиска (по умолчанию поиск отключен)
+THRESHOLD = 0.75
+
+ALIAS_TO_CANONICAL = {
+    "сбербанк": "Сбербанк",
+    "сбермаркет": "СберМаркет",
+    "яндекс": "Яндекс",
+    "газпром": "Газпром",
+    "газпром нефть": "Газпром нефть",
+}
+COMPANY_NAMES = list(dict.fromkeys(ALIAS_TO_CANONICAL.values()))
+ALIAS_TO_COMPANY_ID = {alias: COMPANY_NAMES.index(name) for alias, name in ALIAS_TO_CANONICAL.items()}
+
+
+def find_name(index: FuzzyAliasIndex, mention: str):
+    """Название найденной компании (None — похожей компании нет)"""
+    company_id = index.find(mention)
+    return COMPANY_NAMES[company_id] if company_id is not None else None
+
+
+def brute_force_find(index: FuzzyAliasIndex, mention: str):
+    """Поиск по коэффициенту Дайса перебором всех псевдонимов (эталон для индекса)"""
+    mention_trigrams = get_trigrams(fold_transliteration(mention))
+    best_alias_id, best_similarity = None, -1.0
+    for alias_id, folded_name in enumerate(index._folded_names):
+        alias_trigrams = get_trigrams(folded_name)
+        similarity = 2 * len(mention_trigrams & alias_trigrams) / (len(mention_trigrams) + len(alias_trigrams))
+        if similarity > best_similarity:
+            best_alias_id, best_similarity = alias_id, similarity
+    if best_alias_id is None or best_similarity < index.threshold:
+        return None
+    return index._company_ids[best_alias_id]
+
+
+def test_transliteration_and_typos_match():
+    index = FuzzyAliasIndex(ALIAS_TO_COMPANY_ID, THRESHOLD)
+
+    assert find_name(index, "yandex") == "Яндекс"
+    assert find_name(index, "газпромнефть") == "Газпром нефть"
+    assert find_name(index, "сбербанкк") == "Сбербанк"
+
+
+def test_name_prefixes_do_not_match():
+    """Начало названия — чаще другая компания ("Мега" — не "Мегафон"), сокращения не раскрываются"""
+    index = FuzzyAliasIndex({**ALIAS_TO_COMPANY_ID, "мегафон": 5, "росатом": 6}, THRESHOLD)
+
+    assert index.find("мега") is None
+    assert index.find("росат") is None
+    assert index.find("сбер") is None
+    assert index.find("сберм") is None
+
+
+def test_prefixes_stay_free_mentions_in_posts():
+    matcher = AliasMatcher({"мегафон": 0, "росатом": 1}, fuzzy_threshold=THRESHOLD)
+
+    assert find_company_mentions_in_post("Компании: Мега, Росат, Мегафонн", matcher) == ["мега", "росат", 0]
+
+
+def test_short_and_unknown_mentions_do_not_match():
+    index = FuzzyAliasIndex(ALIAS_TO_COMPANY_ID, THRESHOLD)
+
+    assert index.find("сб") is None
+    assert index.find("нефть") is None
+    assert index.find("роснефть трейдинг") is None
+
+
+def test_fuzzy_search_is_disabled_by_default():
+    assert FUZZY_MATCH_THRESHOLD == 0
+    assert AliasMatcher(ALIAS_TO_COMPANY_ID).find_similar("yandex") is None
+
+
+def test_candidate_prefilter_matches_brute_force():
+    """Отбор кандидатов по редким триграммам не меняет результат поиска по сходству"""
+    generator = random.Random(7)
+    letters = "абвгдеклмнопрстabcdeklmnoprst "
+    alias_to_company_id = {}
+    for company_id in range(2000):
+        alias = "".join(generator.choice(letters) for _ in range(generator.randint(4, 14))).strip()
+        if alias:
+            alias_to_company_id.setdefault(alias, company_id)
+    index = FuzzyAliasIndex(alias_to_company_id, THRESHOLD)
+
+    aliases = list(alias_to_company_id)
+    for _ in range(500):
+        mention = list(generator.choice(aliases))
+        mention[generator.randrange(len(mention))] = generator.choice(letters)
+        mention = "".join(mention)
+        assert index.find(mention) == brute_force_find(index, mention), mention
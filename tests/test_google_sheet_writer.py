@@ -0,0 +1,157 @@
+import pandas as pd
+from gspread.utils import a1_to_rowcol
+
+from google_sheet_writer import write_report_delta
+
+HEADER = ["Компания", "Количество упоминаний", "Ссылки"]
+
+
+class FakeSpreadsheet:
+    """Таблица, выполняющая структурные запросы над своим листом"""
+
+    def __init__(self, worksheet: "FakeWorksheet"):
+        self.worksheet = worksheet
+        self.requests: list[dict] = []
+
+    def batch_update(self, body: dict) -> None:
+        for request in body["requests"]:
+            self.requests.append(request)
+            rows = self.worksheet.rows
+            if "deleteDimension" in request:
+                del rows[request["deleteDimension"]["range"]["startIndex"]]
+            elif "sortRange" in request:
+                grid_range = request["sortRange"]["range"]
+                sort_spec = request["sortRange"]["sortSpecs"][0]
+                start, end = grid_range["startRowIndex"], grid_range["endRowIndex"]
+                rows[start:end] = sorted(rows[start:end], key=lambda row: float(row[sort_spec["dimensionIndex"]]),
+                                         reverse=sort_spec["sortOrder"] == "DESCENDING")
+
+
+class FakeWorksheet:
+    """Лист Google Таблицы в памяти: значения хранятся так, как их вернул бы get_all_values"""
+
+    id = 7
+
+    def __init__(self, rows: list[list]):
+        self.rows = [list(row) for row in rows]
+        self.row_count = max(len(self.rows), 1)
+        self.col_count = len(HEADER)
+        self.spreadsheet = FakeSpreadsheet(self)
+        self.written_ranges: list[str] = []
+        self.cleared = False
+
+    def get_all_values(self, value_render_option=None) -> list[list]:
+        return [list(row) for row in self.rows]
+
+    def batch_update(self, data: list[dict]) -> None:
+        for update in data:
+            self.written_ranges.append(update["range"])
+            first_cell = update["range"].split(":")[0]
+            first_row, first_column = a1_to_rowcol(first_cell)
+            for row_offset, values in enumerate(update["values"]):
+                row_index = first_row - 1 + row_offset
+                while len(self.rows) <= row_index:
+                    self.rows.append([""] * self.col_count)
+                row = self.rows[row_index]
+                row[first_column - 1:first_column - 1 + len(values)] = values
+
+    def resize(self, rows: int, cols: int) -> None:
+        self.row_count, self.col_count = rows, cols
+
+    def clear(self) -> None:
+        self.rows = []
+        self.cleared = True
+
+    def format(self, cell_range: str, cell_format: dict) -> None:
+        pass
+
+    def columns_auto_resize(self, start: int, end: int) -> None:
+        pass
+
+
+def build_report(counts: dict[str, int]) -> pd.DataFrame:
+    return pd.DataFrame([(company, count, f"https://vk.com/{company}") for company, count in counts.items()],
+                        columns=HEADER)
+
+
+def sheet_rows(counts: dict[str, int]) -> list[list]:
+    return [HEADER] + [[company, count, f"https://vk.com/{company}"] for company, count in counts.items()]
+
+
+def sheet_counts(worksheet: FakeWorksheet) -> dict[str, int]:
+    return {row[0]: int(row[1]) for row in worksheet.rows[1:]}
+
+
+def test_new_rows_are_appended_and_sorted_on_server():
+    worksheet = FakeWorksheet([HEADER])
+
+    stats = write_report_delta(worksheet, build_report({"Альфа": 1, "Бета": 5, "Гамма": 3}))
+
+    assert stats.added_rows == 3 and stats.updated_rows == 0 and not stats.full_rewrite
+    assert worksheet.written_ranges == ["A2:C4"]
+    assert list(sheet_counts(worksheet).items()) == [("Бета", 5), ("Гамма", 3), ("Альфа", 1)]
+    assert [request.keys() for request in worksheet.spreadsheet.requests] == [{"sortRange"}]
+
+
+def test_only_changed_rows_are_written():
+    worksheet = FakeWorksheet(sheet_rows({"Бета": 5, "Гамма": 3, "Альфа": 1}))
+
+    stats = write_report_delta(worksheet, build_report({"Альфа": 4, "Бета": 5, "Гамма": 3}))
+
+    assert (stats.updated_rows, stats.unchanged_rows, stats.added_rows, stats.removed_rows) == (1, 2, 0, 0)
+    assert worksheet.written_ranges == ["A4:C4"]
+    assert stats.written_cells == len(HEADER)
+    assert list(sheet_counts(worksheet).items()) == [("Бета", 5), ("Альфа", 4), ("Гамма", 3)]
+
+
+def test_unchanged_report_sends_no_requests():
+    worksheet = FakeWorksheet(sheet_rows({"Бета": 5, "Альфа": 1}))
+
+    stats = write_report_delta(worksheet, build_report({"Альфа": 1, "Бета": 5}))
+
+    assert stats.unchanged_rows == 2 and stats.write_requests == 0
+    assert worksheet.written_ranges == [] and worksheet.spreadsheet.requests == []
+
+
+def test_added_company_reuses_row_of_removed_one():
+    worksheet = FakeWorksheet(sheet_rows({"Бета": 5, "Гамма": 3, "Альфа": 1}))
+
+    stats = write_report_delta(worksheet, build_report({"Бета": 5, "Дельта": 2, "Альфа": 1}))
+
+    assert (stats.added_rows, stats.removed_rows) == (1, 1)
+    # Новая строка записана на место удаленной "Гаммы", строки листа не удаляются
+    assert worksheet.written_ranges == ["A3:C3"]
+    assert not any("deleteDimension" in request for request in worksheet.spreadsheet.requests)
+    assert list(sheet_counts(worksheet).items()) == [("Бета", 5), ("Дельта", 2), ("Альфа", 1)]
+
+
+def test_shrinking_report_deletes_extra_rows():
+    worksheet = FakeWorksheet(sheet_rows({"Бета": 5, "Гамма": 3, "Альфа": 1, "Дельта": 0}))
+
+    stats = write_report_delta(worksheet, build_report({"Альфа": 2, "Бета": 5}))
+
+    assert (stats.updated_rows, stats.removed_rows) == (1, 2)
+    delete_requests = [request["deleteDimension"]["range"]["startIndex"]
+                       for request in worksheet.spreadsheet.requests if "deleteDimension" in request]
+    # Строки удаляются снизу вверх
+    assert delete_requests == [4, 2]
+    assert list(sheet_counts(worksheet).items()) == [("Бета", 5), ("Альфа", 2)]
+
+
+def test_duplicate_and_blank_rows_are_reused():
+    worksheet = FakeWorksheet(sheet_rows({"Бета": 5}) + [["", "", ""], ["Бета", 5, "https://vk.com/Бета"]])
+
+    stats = write_report_delta(worksheet, build_report({"Бета": 5, "Альфа": 1, "Гамма": 3}))
+
+    assert (stats.unchanged_rows, stats.added_rows) == (1, 2)
+    assert worksheet.written_ranges == ["A3:C4"]
+    assert list(sheet_counts(worksheet).items()) == [("Бета", 5), ("Гамма", 3), ("Альфа", 1)]
+
+
+def test_header_mismatch_rewrites_sheet():
+    worksheet = FakeWorksheet([["Компания", "Упоминания"], ["Альфа", 1]])
+
+    stats = write_report_delta(worksheet, build_report({"Альфа": 1, "Бета": 5}))
+
+    assert stats.full_rewrite and worksheet.cleared
+    assert worksheet.rows == [HEADER, ["Альфа", 1, "https://vk.com/Альфа"], ["Бета", 5, "https://vk.com/Бета"]]
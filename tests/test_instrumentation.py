@@ -0,0 +1,64 @@
+import pytest
+
+import instrumentation
+from instrumentation import job_trace, span, timed_iter
+
+
+@pytest.fixture
+def records(monkeypatch):
+    """Записи spans.jsonl, перехваченные вместо записи в файл"""
+    emitted = []
+    monkeypatch.setattr(instrumentation, "_emit", emitted.append)
+    return emitted
+
+
+def test_nested_spans_are_summed_in_job(records):
+    with job_trace("batch", file_name="posts.xlsx"):
+        with span("crm_load") as outer_span:
+            with span("parse", rows=3):
+                pass
+        with span("parse") as parse_span:
+            parse_span.set_rows(2)
+
+    span_records = [record for record in records if record["type"] == "span"]
+    job_record = records[-1]
+    assert [record["name"] for record in span_records] == ["parse", "crm_load", "parse"]
+    assert span_records[0]["parent_id"] == outer_span.span_id
+    assert span_records[1]["parent_id"] is None
+    assert {record["job_id"] for record in span_records} == {job_record["job_id"]}
+    assert job_record["type"] == "job" and job_record["status"] == "ok"
+    assert job_record["attributes"] == {"file_name": "posts.xlsx"}
+    assert job_record["stages"]["parse"]["calls"] == 2
+    assert job_record["stages"]["parse"]["rows"] == 5
+
+
+def test_failed_span_and_job_are_marked_as_errors(records):
+    with pytest.raises(KeyError):
+        with job_trace("batch"):
+            with span("match"):
+                raise KeyError("компания")
+
+    assert records[0]["status"] == "error" and records[0]["error"] == "KeyError"
+    assert records[1]["status"] == "error"
+
+
+def test_timed_iter_counts_rows_when_exhausted(records):
+    with job_trace("batch"):
+        assert list(timed_iter("read_posts", iter(range(4)), file_format="csv")) == [0, 1, 2, 3]
+
+    assert records[0]["name"] == "read_posts"
+    assert records[0]["rows"] == 4
+    assert records[0]["attributes"] == {"file_format": "csv"}
+
+
+def test_rss_is_reported_as_none_when_unavailable(records, monkeypatch):
+    """Без /proc и модуля resource (Windows) изменение памяти не замеряется"""
+    monkeypatch.setattr(instrumentation, "get_rss_bytes", lambda: None)
+
+    with job_trace("batch"):
+        with span("parse", rows=1):
+            pass
+
+    assert records[0]["rss_delta_mb"] is None
+    assert records[1]["rss_delta_mb"] is None
+    assert records[1]["stages"]["parse"]["rss_delta_mb"] is None
@@ -0,0 +1,85 @@
+import asyncio
+import itertools
+import threading
+from concurrent.futures import Executor, Future
+
+import pytest
+
+from job_scheduler import JobCancelledError, JobScheduler
+from progress import ProgressChannel, ProgressTracker
+
+
+def process_posts(progress_channel: ProgressChannel, started: threading.Event, stopped: threading.Event) -> int:
+    """Бесконечно обрабатывает посты, пока задачу не отменят"""
+    progress_tracker = ProgressTracker(progress_channel, interval_seconds=3600)
+    try:
+        for _ in progress_tracker.track(itertools.count()):
+            started.set()
+    finally:
+        stopped.set()
+    return progress_tracker.posts_done
+
+
+def test_tracker_stops_cancelled_posts_stream():
+    progress_channel = ProgressChannel()
+    progress_tracker = ProgressTracker(progress_channel, interval_seconds=3600)
+    posts = progress_tracker.track(range(10000))
+    next(posts)
+
+    progress_channel.cancel()
+
+    with pytest.raises(JobCancelledError):
+        list(posts)
+    with pytest.raises(JobCancelledError):
+        progress_tracker.start_stage("write_report")
+
+
+def test_cancel_stops_running_job():
+    """Отмена не только отбрасывает результат, но и останавливает выполняемую задачу"""
+    async def run() -> None:
+        job_scheduler = JobScheduler(max_workers=1, executor_type="thread")
+        started, stopped = threading.Event(), threading.Event()
+        progress_channel = job_scheduler.create_progress_channel()
+        job = job_scheduler.submit(1, process_posts, progress_channel, started, stopped,
+                                   progress_channel=progress_channel)
+        await asyncio.to_thread(started.wait, 5)
+
+        assert job_scheduler.cancel_user_jobs(1) == 1
+        with pytest.raises(JobCancelledError):
+            await job.wait()
+        assert await asyncio.to_thread(stopped.wait, 5)
+        job_scheduler.shutdown()
+
+    asyncio.run(run())
+
+
+class CancellingExecutor(Executor):
+    """Пул, отменяющий первую задачу (как при остановке пула) и выполняющий остальные сразу"""
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, function, *args, **kwargs) -> Future:
+        future = Future()
+        self.submitted += 1
+        if self.submitted == 1:
+            future.cancel()
+        else:
+            future.set_result(function(*args, **kwargs))
+        return future
+
+
+def test_cancelled_executor_future_finishes_job_and_starts_next():
+    async def run() -> None:
+        job_scheduler = JobScheduler(max_workers=1, executor_type="thread")
+        job_scheduler._executor = CancellingExecutor()
+        first_job = job_scheduler.submit(1, sum, [1, 2])
+        second_job = job_scheduler.submit(2, sum, [3, 4])
+
+        with pytest.raises(JobCancelledError):
+            await asyncio.wait_for(first_job.wait(), 5)
+        assert first_job.status == "cancelled"
+        assert await asyncio.wait_for(second_job.wait(), 5) == 7
+        assert second_job.status == "done"
+
+    asyncio.run(run())
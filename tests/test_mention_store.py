@@ -0,0 +1,80 @@
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+from alias_matcher import AliasMatcher
+from company_mentions import MentionAggregator, build_company_mappings
+from mention_store import MentionStore
+from post_readers import resolve_post_link
+
+ALIAS_TO_COMPANY_ID, CANONICAL_TO_CRM = build_company_mappings(pd.DataFrame({"Полное имя": ["Сбербанк", "Яндекс"]}))
+CRM_VERSION = "crm"
+
+
+def report_companies(aggregator: MentionAggregator) -> set[str]:
+    return {row[1] for row in aggregator.iter_report_rows(CANONICAL_TO_CRM)}
+
+
+def test_group_only_posts_do_not_collide(tmp_path):
+    """Посты одной группы без своей ссылки хранятся отдельно и в отчете выводятся со ссылкой на группу"""
+    store = MentionStore(str(tmp_path / "mentions.sqlite3"))
+    matcher = AliasMatcher(ALIAS_TO_COMPANY_ID)
+    group_link = "https://vk.com/group"
+    posts = [
+        (resolve_post_link(None, group_link), "Сбербанк"),
+        (resolve_post_link("", group_link), "Яндекс"),
+    ]
+
+    first_upload = store.ingest_posts(posts, matcher, CANONICAL_TO_CRM, CRM_VERSION)
+    second_upload = store.ingest_posts(posts, matcher, CANONICAL_TO_CRM, CRM_VERSION)
+    summary = store.aggregate_mentions()
+
+    for aggregator in (first_upload, second_upload, summary):
+        assert report_companies(aggregator) == {"сбербанк", "яндекс"}
+        assert len(aggregator) == 2
+        for record in aggregator.records.values():
+            assert record.mention_count == 1
+            assert list(record.post_links) == [group_link]
+
+
+def test_post_link_keeps_latest_text(tmp_path):
+    """Пост со своей ссылкой при изменении текста заменяется, а не добавляется второй раз"""
+    store = MentionStore(str(tmp_path / "mentions.sqlite3"))
+    matcher = AliasMatcher(ALIAS_TO_COMPANY_ID)
+    post_link = resolve_post_link("https://vk.com/wall-1_1", "https://vk.com/group")
+
+    store.ingest_posts([(post_link, "Сбербанк")], matcher, CANONICAL_TO_CRM, CRM_VERSION)
+    store.ingest_posts([(post_link, "Яндекс")], matcher, CANONICAL_TO_CRM, CRM_VERSION)
+
+    assert set(store.aggregate_mentions().records) == {"яндекс"}
+
+
+def test_companies_are_stored_by_name_and_loaded_as_ids(tmp_path):
+    """Номера компаний зависят от версии CRM, поэтому в базе хранятся названия"""
+    store = MentionStore(str(tmp_path / "mentions.sqlite3"))
+    matcher = AliasMatcher(ALIAS_TO_COMPANY_ID)
+    posts = [("https://vk.com/wall-1_1", "Яндекс, Рога и копыта")]
+
+    first_upload = store.ingest_posts(posts, matcher, CANONICAL_TO_CRM, CRM_VERSION)
+    second_upload = store.ingest_posts(posts, matcher, CANONICAL_TO_CRM, CRM_VERSION)
+
+    with closing(sqlite3.connect(store.database_path)) as connection:
+        stored_companies = [row[0] for row in connection.execute("SELECT company FROM post_mentions")]
+    assert stored_companies == ["яндекс", "рога и копыта"]
+    assert list(first_upload.records) == list(second_upload.records) == [1, "рога и копыта"]
+
+
+def test_group_link_column_added_to_old_database(tmp_path):
+    database_path = str(tmp_path / "mentions.sqlite3")
+    with closing(sqlite3.connect(database_path)) as connection:
+        connection.execute(
+            "CREATE TABLE posts (link TEXT PRIMARY KEY, text_hash TEXT NOT NULL, matcher_version TEXT NOT NULL, "
+            "first_seen_at TEXT NOT NULL, last_seen_at TEXT NOT NULL)"
+        )
+
+    store = MentionStore(database_path)
+
+    with closing(sqlite3.connect(store.database_path)) as connection:
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(posts)")}
+    assert "group_link" in columns
@@ -0,0 +1,76 @@
+import socket
+import urllib.error
+import urllib.request
+
+import pytest
+
+from metrics import REGISTRY, UPLOADS, Counter, Gauge, Histogram, MetricsRegistry, start_metrics_server
+
+
+def test_counter_and_gauge_exposition():
+    registry = MetricsRegistry()
+    uploads = registry.register(Counter("uploads_total", "Загрузки", ["outcome"]))
+    queued = registry.register(Gauge("jobs_queued", "Очередь"))
+
+    uploads.inc(outcome="ok")
+    uploads.inc(2, outcome='bad "file"\n')
+    queued.set(3)
+
+    assert registry.render().splitlines() == [
+        "# HELP uploads_total Загрузки",
+        "# TYPE uploads_total counter",
+        r'uploads_total{outcome="bad \"file\"\n"} 2',
+        'uploads_total{outcome="ok"} 1',
+        "# HELP jobs_queued Очередь",
+        "# TYPE jobs_queued gauge",
+        "jobs_queued 3",
+    ]
+    assert uploads.get(outcome="ok") == 1
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("job_seconds", "Длительность", ["status"], buckets=(1, 5))
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value, status="done")
+
+    assert histogram.render()[2:] == [
+        'job_seconds_bucket{status="done",le="1"} 2',
+        'job_seconds_bucket{status="done",le="5"} 3',
+        'job_seconds_bucket{status="done",le="+Inf"} 4',
+        'job_seconds_sum{status="done"} 14.5',
+        'job_seconds_count{status="done"} 4',
+    ]
+    assert histogram.get_count(status="done") == 4
+
+
+def test_labels_and_names_are_validated():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("uploads_total", "Загрузки", ["outcome"]))
+
+    with pytest.raises(ValueError):
+        counter.inc(status="ok")
+    with pytest.raises(ValueError):
+        registry.register(Counter("uploads_total", "Повтор"))
+
+
+def test_endpoint_serves_registry_on_localhost():
+    assert start_metrics_server(port=0) is None
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = start_metrics_server(port=port, host="127.0.0.1")
+    try:
+        UPLOADS.inc(outcome="ok")
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert body == REGISTRY.render()
+        assert 'bot_uploads_total{outcome="ok"}' in body
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/other", timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
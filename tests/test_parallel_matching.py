@@ -0,0 +1,109 @@
+import parallel_matching
+from alias_matcher import AliasMatcher
+from company_mentions import MentionAggregator
+from mention_cache import CachedMentionFinder, MentionFinder
+from parallel_matching import MatchingPool, ParallelMentionMatcher
+
+ALIAS_TO_COMPANY_ID = {"сбербанк": 0, "яндекс": 1, "газпром": 2}
+TEXTS = ["Сбербанк и Яндекс", "Газпром", "ничего", "Яндекс, Газпром", None] * 40
+POSTS = [(f"https://vk.com/wall-1_{index}", text) for index, text in enumerate(TEXTS)]
+
+
+def aggregate_sequentially(alias_matcher: AliasMatcher) -> MentionAggregator:
+    aggregator = MentionAggregator()
+    finder = MentionFinder(alias_matcher)
+    for post_link, gpt_text in POSTS:
+        aggregator.add_post(post_link, finder(gpt_text))
+    return aggregator
+
+
+def test_pool_results_match_sequential_and_fill_parent_cache():
+    alias_matcher = AliasMatcher(ALIAS_TO_COMPANY_ID)
+    matching_pool = MatchingPool(workers=2)
+    try:
+        with ParallelMentionMatcher(alias_matcher, "parallel-test", matching_pool, chunk_size=20) as mention_matcher:
+            aggregator = mention_matcher.aggregate(POSTS)
+            parent_finder = mention_matcher._local_finder
+        expected = aggregate_sequentially(alias_matcher)
+
+        assert {company: record.mention_count for company, record in aggregator.records.items()} == \
+            {company: record.mention_count for company, record in expected.records.items()}
+        assert [list(record.post_links) for record in aggregator.records.values()] == \
+            [list(record.post_links) for record in expected.records.values()]
+
+        # Результаты процессов сохранены в кэше текущего процесса: повторная загрузка не отправляет тексты процессам
+        assert isinstance(parent_finder, CachedMentionFinder)
+        with ParallelMentionMatcher(alias_matcher, "parallel-test", matching_pool, chunk_size=20) as mention_matcher:
+            matched_companies = mention_matcher.match_texts(TEXTS)
+            assert mention_matcher._executor is None
+        assert matched_companies == [tuple(MentionFinder(alias_matcher)(text)) for text in TEXTS]
+    finally:
+        matching_pool.close()
+
+
+def test_pool_is_reused_until_crm_version_changes():
+    alias_matcher = AliasMatcher(ALIAS_TO_COMPANY_ID)
+    matching_pool = MatchingPool(workers=2)
+    try:
+        first_executor = matching_pool.acquire(alias_matcher, "crm-1")
+        matching_pool.release("crm-1")
+        assert matching_pool.acquire(alias_matcher, "crm-1") is first_executor
+        matching_pool.release("crm-1")
+
+        second_executor = matching_pool.acquire(alias_matcher, "crm-2")
+        assert second_executor is not first_executor
+        assert list(matching_pool._executors) == ["crm-2"]
+        matching_pool.release("crm-2")
+    finally:
+        matching_pool.close()
+
+
+def test_worker_uses_plain_finder_when_cache_is_disabled(monkeypatch):
+    """При MENTION_CACHE_SIZE <= 0 процессы пула не заводят собственный кэш"""
+    alias_matcher = AliasMatcher(ALIAS_TO_COMPANY_ID)
+    monkeypatch.setattr(parallel_matching, "_worker_finder", None)
+
+    monkeypatch.setattr(parallel_matching, "MENTION_CACHE_SIZE", 0)
+    parallel_matching._init_worker(alias_matcher, "crm-1")
+    assert type(parallel_matching._worker_finder) is MentionFinder
+    assert parallel_matching._take_new_entries() == []
+
+    monkeypatch.setattr(parallel_matching, "MENTION_CACHE_SIZE", 10)
+    parallel_matching._init_worker(alias_matcher, "crm-1")
+    assert isinstance(parallel_matching._worker_finder, CachedMentionFinder)
+
+
+def test_link_limit_is_kept_when_chunks_are_merged():
+    """Ограничение ссылок и порядок ссылок не зависят от разбиения постов на части"""
+    alias_matcher = AliasMatcher(ALIAS_TO_COMPANY_ID)
+    expected = MentionAggregator(max_links_per_company=3)
+    for post_link, gpt_text in POSTS:
+        expected.add_post(post_link, MentionFinder(alias_matcher)(gpt_text))
+
+    matching_pool = MatchingPool(workers=2)
+    try:
+        with ParallelMentionMatcher(alias_matcher, None, matching_pool, chunk_size=15) as mention_matcher:
+            aggregator = mention_matcher.aggregate(POSTS, MentionAggregator(max_links_per_company=3))
+            assert mention_matcher._executor is not None
+    finally:
+        matching_pool.close()
+
+    assert list(aggregator.records) == list(expected.records)
+    assert [(record.mention_count, list(record.post_links)) for record in aggregator.records.values()] == \
+        [(record.mention_count, list(record.post_links)) for record in expected.records.values()]
+
+
+def test_upload_smaller_than_chunk_is_matched_without_pool():
+    alias_matcher = AliasMatcher(ALIAS_TO_COMPANY_ID)
+    matching_pool = MatchingPool(workers=2)
+    try:
+        with ParallelMentionMatcher(alias_matcher, None, matching_pool, chunk_size=len(POSTS) + 1) as mention_matcher:
+            aggregator = mention_matcher.aggregate(POSTS)
+            assert mention_matcher._executor is None
+        assert matching_pool._executors == {}
+    finally:
+        matching_pool.close()
+
+    assert {company: record.mention_count for company, record in aggregator.records.items()} == {
+        0: 40, 1: 80, 2: 80, "ничего": 40,
+    }
@@ -0,0 +1,103 @@
+import gzip
+import json
+import sys
+
+import pandas as pd
+import pytest
+
+from post_readers import GroupLink, detect_post_format, estimate_post_count, iter_posts, iter_xlsx_posts
+from report_writer import write_parquet_report
+
+POSTS = pd.DataFrame({
+    "Пост": ["https://vk.com/wall-1_1", None, "https://vk.com/wall-1_3"],
+    "Группа": ["https://vk.com/club1", "https://vk.com/club2", None],
+    "GPT": ["Компании: МТС, Сбер", "Альфа-Банк", None],
+    "Лишняя колонка": [1, 2, 3],
+})
+EXPECTED_POSTS = [
+    ("https://vk.com/wall-1_1", "Компании: МТС, Сбер"),
+    ("https://vk.com/club2", "Альфа-Банк"),
+    ("https://vk.com/wall-1_3", None),
+]
+
+
+def write_posts(directory, post_format: str) -> str:
+    """Сохраняет POSTS в файл указанного формата и возвращает путь к нему"""
+    if post_format == "xlsx":
+        file_path = directory / "posts.xlsx"
+        POSTS.to_excel(file_path, sheet_name="vk", index=False)
+    elif post_format == "csv":
+        file_path = directory / "posts.csv"
+        POSTS.to_csv(file_path, sep=";", index=False)
+    elif post_format == "csv.gz":
+        file_path = directory / "posts.csv.gz"
+        with gzip.open(file_path, "wt", encoding="utf-8") as gzip_file:
+            POSTS.to_csv(gzip_file, index=False)
+    elif post_format == "jsonl":
+        file_path = directory / "posts.jsonl"
+        file_path.write_text("\n".join(json.dumps(post, ensure_ascii=False)
+                                       for post in POSTS.to_dict("records")) + "\n\n", encoding="utf-8")
+    else:
+        file_path = directory / "posts.parquet"
+        POSTS.to_parquet(file_path, index=False)
+    return str(file_path)
+
+
+@pytest.mark.parametrize("post_format, expected_format", [
+    ("xlsx", "xlsx"), ("csv", "csv"), ("csv.gz", "csv"), ("jsonl", "jsonl"), ("parquet", "parquet"),
+])
+def test_every_format_yields_the_same_posts(tmp_path, post_format, expected_format):
+    file_path = write_posts(tmp_path, post_format)
+
+    assert detect_post_format(file_path) == expected_format
+    posts = [(link, None if pd.isna(text) or text == "" else text) for link, text in iter_posts(file_path)]
+    assert posts == EXPECTED_POSTS
+    # Пустая ссылка на пост заменяется ссылкой на группу
+    assert isinstance(next(link for link, _ in iter_posts(file_path) if link.endswith("club2")), GroupLink)
+
+
+def test_parquet_is_detected_by_signature_regardless_of_extension(tmp_path):
+    file_path = tmp_path / "posts.bin"
+    POSTS.to_parquet(file_path, index=False)
+
+    assert detect_post_format(str(file_path)) == "parquet"
+    assert estimate_post_count(str(file_path)) == len(POSTS)
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    file_path = tmp_path / "posts.txt"
+    file_path.write_text("Пост;GPT\n", encoding="utf-8")
+
+    with pytest.raises(ValueError, match="Неподдерживаемый формат"):
+        detect_post_format(str(file_path))
+
+
+def test_parquet_without_pyarrow_is_rejected_with_clear_message(tmp_path, monkeypatch):
+    """Без pyarrow файл Parquet отклоняется при определении формата, а отчет Parquet — при записи"""
+    file_path = write_posts(tmp_path, "parquet")
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    monkeypatch.setitem(sys.modules, "pyarrow.parquet", None)
+
+    with pytest.raises(ValueError, match="pyarrow"):
+        detect_post_format(file_path)
+    with pytest.raises(ValueError, match="pyarrow"):
+        write_parquet_report([], str(tmp_path / "report.parquet"))
+
+
+def test_xlsx_reader_takes_needed_columns_in_any_order(tmp_path):
+    file_path = tmp_path / "posts.xlsx"
+    with pd.ExcelWriter(file_path) as writer:
+        pd.DataFrame({"Другой лист": [1]}).to_excel(writer, sheet_name="Сводка", index=False)
+        POSTS[["Лишняя колонка", "GPT", "Группа", "Пост"]].to_excel(writer, sheet_name="vk", index=False)
+
+    assert list(iter_xlsx_posts(str(file_path))) == EXPECTED_POSTS
+    assert estimate_post_count(str(file_path)) == len(POSTS)
+
+
+def test_xlsx_reader_without_posts_sheet_or_columns(tmp_path):
+    file_path = tmp_path / "posts.xlsx"
+    pd.DataFrame({"Лишняя колонка": [1, 2]}).to_excel(file_path, sheet_name="vk", index=False)
+
+    assert list(iter_xlsx_posts(str(file_path))) == []
+    with pytest.raises(ValueError, match="нет листа 'Посты'"):
+        list(iter_xlsx_posts(str(file_path), sheet_name="Посты"))
@@ -0,0 +1,88 @@
+from company_mentions import MentionAggregator
+from progress import (PROGRESS_CHECK_EVERY_POSTS, ProgressChannel, ProgressTracker, ProgressUpdate,
+                      format_progress_message)
+
+
+class RecordingChannel(ProgressChannel):
+    """Канал, запоминающий все опубликованные состояния"""
+
+    def __init__(self):
+        super().__init__()
+        self.updates = []
+
+    def publish(self, progress_update: ProgressUpdate) -> None:
+        super().publish(progress_update)
+        self.updates.append(progress_update)
+
+
+def test_posts_pass_through_unchanged():
+    progress_tracker = ProgressTracker(ProgressChannel(), interval_seconds=3600)
+
+    assert list(progress_tracker.track(range(1000))) == list(range(1000))
+    assert progress_tracker.posts_done == 1000
+
+
+def test_progress_is_published_no_more_often_than_interval():
+    """Время проверяется раз в PROGRESS_CHECK_EVERY_POSTS постов, публикация — не чаще interval_seconds"""
+    posts_count = PROGRESS_CHECK_EVERY_POSTS * 4
+
+    throttled_channel = RecordingChannel()
+    list(ProgressTracker(throttled_channel, interval_seconds=3600).track(range(posts_count)))
+    assert [update.posts_done for update in throttled_channel.updates] == [0]
+
+    eager_channel = RecordingChannel()
+    list(ProgressTracker(eager_channel, interval_seconds=0).track(range(posts_count)))
+    assert [update.posts_done for update in eager_channel.updates] == [
+        0, *range(PROGRESS_CHECK_EVERY_POSTS, posts_count + 1, PROGRESS_CHECK_EVERY_POSTS),
+    ]
+
+
+def test_stages_and_top_companies_are_published():
+    """Лидеры берутся из накопителя, компании CRM публикуются под каноническими названиями"""
+    progress_channel = ProgressChannel()
+    aggregator = MentionAggregator()
+    progress_tracker = ProgressTracker(progress_channel, total_posts=3, aggregator=aggregator, top_companies=2)
+    progress_tracker.company_names = ["мтс", "сбер"]
+
+    progress_tracker.start_stage("crm_load")
+    assert progress_channel.latest().stage == "crm_load"
+
+    for post_number in progress_tracker.track(range(3)):
+        aggregator.add_post(f"https://vk.com/wall-1_{post_number}", [1, "рога и копыта"] if post_number else [1])
+    progress_tracker.start_stage("write_report")
+
+    progress_update = progress_channel.latest()
+    assert progress_update.stage == "write_report"
+    assert progress_update.posts_done == 3
+    assert progress_update.top_companies == [("сбер", 3), ("рога и копыта", 2)]
+
+
+def test_speed_is_fixed_after_matching():
+    """После поиска упоминаний скорость считается по его длительности, а не по времени следующих этапов"""
+    progress_channel = ProgressChannel()
+    progress_tracker = ProgressTracker(progress_channel)
+    list(progress_tracker.track(range(10)))
+
+    progress_tracker.start_stage("write_report")
+    first_elapsed = progress_channel.latest().elapsed_seconds
+    progress_tracker.start_stage("write_report")
+
+    assert progress_channel.latest().elapsed_seconds == first_elapsed
+
+
+def test_eta_and_message():
+    progress_update = ProgressUpdate("match", 2500, 10000, 5.0, [("мтс", 12), ("сбер", 7)])
+
+    assert progress_update.posts_per_second == 500
+    assert progress_update.eta_seconds == 15
+    assert ProgressUpdate("match", 10, None, 1.0).eta_seconds is None
+    assert ProgressUpdate("crm_load").posts_per_second == 0
+    assert format_progress_message(progress_update, "posts.xlsx") == "\n".join([
+        "⏳ posts.xlsx: Поиск упоминаний",
+        "Обработано постов: 2 500 из ~10 000 (25%)",
+        "Скорость: 500 постов/с, осталось ~15 с",
+        "Лидеры по упоминаниям:",
+        "1. мтс — 12",
+        "2. сбер — 7",
+    ])
+    assert format_progress_message(ProgressUpdate("write_report"), "posts.xlsx") == "⏳ posts.xlsx: Запись отчета"
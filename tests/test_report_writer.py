@@ -0,0 +1,81 @@
+import pandas as pd
+import pyarrow.parquet as parquet
+import pytest
+
+import report_writer
+from company_mentions import REPORT_COLUMNS, MentionAggregator, build_company_mappings
+from report_writer import report_file_name, write_report
+
+COMPANIES = pd.DataFrame({
+    "Полное имя": ["Сбер", "Яндекс"],
+    "#": [12.0, None],
+    "Ответственный ДК": ["Иванов", None],
+    "Ответственный Media": ["Петрова", "Смирнов"],
+})
+EXPECTED_ROWS = [
+    ["", "яндекс", 3, "https://vk.com/wall-1_1, https://vk.com/wall-1_2", "", "Смирнов", "Да"],
+    ["", "рога и копыта", 2, "https://vk.com/wall-1_2", "", "", "Нет"],
+    ["12", "сбер", 1, "https://vk.com/wall-1_3", "Иванов", "Петрова", "Да"],
+]
+
+
+def build_aggregator() -> MentionAggregator:
+    aggregator = MentionAggregator()
+    aggregator.add_post("https://vk.com/wall-1_1", [1])
+    aggregator.add_post("https://vk.com/wall-1_2", [1, "рога и копыта"])
+    aggregator.add_post(None, [1, "рога и копыта"])
+    aggregator.add_post("https://vk.com/wall-1_3", [0])
+    return aggregator
+
+
+def read_report(file_path: str, report_format: str) -> list[list]:
+    """Читает отчет обратно, приводя пустые ячейки к "" и номера CRM к строкам"""
+    if report_format == "xlsx":
+        report = pd.read_excel(file_path, dtype={"#": str})
+    elif report_format == "csv":
+        report = pd.read_csv(file_path, encoding="utf-8-sig", dtype={"#": str})
+    else:
+        report = pd.read_parquet(file_path)
+    assert list(report.columns) == REPORT_COLUMNS
+    return report.fillna("").astype({"Количество упоминаний": int}).values.tolist()
+
+
+@pytest.mark.parametrize("report_format", ["xlsx", "csv", "parquet"])
+def test_every_format_contains_rows_sorted_by_mentions(tmp_path, report_format):
+    _, canonical_to_crm = build_company_mappings(COMPANIES)
+    file_path = str(tmp_path / report_file_name("processed_report.xlsx", report_format))
+
+    assert write_report(build_aggregator(), canonical_to_crm, file_path, report_format) == 3
+
+    rows = read_report(file_path, report_format)
+    # Номер CRM из Excel (12.0) записан в xlsx и csv числом, а в Parquet строкой "12"
+    assert [[str(row[0]).removesuffix(".0"), *row[1:]] for row in rows] == EXPECTED_ROWS
+
+
+def test_report_rows_are_limited(tmp_path):
+    _, canonical_to_crm = build_company_mappings(COMPANIES)
+    file_path = str(tmp_path / "report.csv")
+
+    assert write_report(build_aggregator(), canonical_to_crm, file_path, "csv", max_rows=2) == 2
+    assert [row[1] for row in read_report(file_path, "csv")] == ["яндекс", "рога и копыта"]
+
+
+def test_parquet_is_written_in_row_groups(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_writer, "PARQUET_ROW_GROUP_SIZE", 2)
+    rows = ([str(index), f"компания {index}", index, "", None, float("nan"), "Нет"] for index in range(5))
+    file_path = str(tmp_path / "report.parquet")
+
+    assert report_writer.write_parquet_report(rows, file_path) == 5
+
+    parquet_file = parquet.ParquetFile(file_path)
+    assert parquet_file.metadata.num_row_groups == 3
+    report = parquet_file.read().to_pandas()
+    assert report["Количество упоминаний"].tolist() == [0, 1, 2, 3, 4]
+    assert report["Ссылки на посты"].isna().all() and report["Ответственный Медиа"].isna().all()
+
+
+def test_unknown_report_format_is_rejected(tmp_path):
+    _, canonical_to_crm = build_company_mappings(COMPANIES)
+
+    with pytest.raises(ValueError, match="Неизвестный формат отчета"):
+        write_report(build_aggregator(), canonical_to_crm, str(tmp_path / "report.ods"), "ods")
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from text_normalization import (is_missing, is_valid_company_name, normalize_series, normalize_text,
+                                remove_legal_forms, strip_gpt_prefix)
+
+RAW_NAMES = ["  ООО «Ёлка»  ", "Альфа\tБанк", "(МТС)", "", None, float("nan"), 42, "Сбер\n\nБанк"]
+
+
+def test_normalize_text():
+    assert normalize_text("  «Ёлка-Палка»  ") == "елка-палка"
+    assert normalize_text("Альфа \t  Банк") == "альфа банк"
+    assert normalize_text("ЁЖ") == "еж"
+    assert normalize_text(None) == ""
+    assert normalize_text(float("nan")) == ""
+
+
+def test_normalize_series_matches_normalize_text():
+    """Векторизованная нормализация колонки дает тот же результат, что и построчная"""
+    assert normalize_series(pd.Series(RAW_NAMES, dtype=object)).tolist() == [normalize_text(name)
+                                                                            for name in RAW_NAMES]
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, True), (float("nan"), True), (pd.NA, True), (pd.NaT, True), ("", False), (0, False), ("МТС", False),
+])
+def test_is_missing(value, expected):
+    assert is_missing(value) is expected
+
+
+def test_strip_gpt_prefix_removes_text_before_first_colon():
+    assert strip_gpt_prefix("Компании: МТС: связь") == " МТС: связь"
+    assert strip_gpt_prefix("МТС, Сбер") == "МТС, Сбер"
+
+
+def test_legal_forms_are_removed_as_whole_words():
+    assert remove_legal_forms("ооо яндекс") == "яндекс"
+    assert remove_legal_forms("пао. северсталь") == "северсталь"
+    assert remove_legal_forms("coca-cola") == "coca-cola"
+
+
+@pytest.mark.parametrize("company_name, expected", [
+    ("яндекс", True),
+    ("ооо рога и копыта", True),
+    ("ооо", False),
+    ("ооо пао", False),
+    ("vk", False),
+    ("vk.com", False),
+    ("12345", False),
+    ("ип", False),
+    ("стажировка", False),
+    ("", False),
+])
+def test_is_valid_company_name(company_name, expected):
+    assert is_valid_company_name(company_name) is expected
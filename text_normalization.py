@@ -0,0 +1,121 @@
+import re
+
+# Списки для фильтрации
+GENERIC_STOP_WORDS = {
+    "стажировка", "вакансия", "практика", "кафедра", "факультет", "центр", "департамент", "управление",
+    "гк", "ооо", "зао", "пао", "ао", "ao", "pjsc", "llc", "inc", "corp", "co", "gmbh",
+    "компания", "университет", "институт", "колледж", "академия", "лаборатория", "школа", "обучение",
+    "работа", "карьера", "команда", "проект", "приглашает", "ищет", "набор"
+}
+
+COMPANY_LEGAL_FORMS = {"ооо", "ао", "пао", "зао", "ao", "pjsc", "llc", "inc", "co", "corp", "gmbh"}
+
+PLATFORM_NAMES = {"vk", "вк", "vk.com"}
+
+# Регулярные выражения компилируются один раз при импорте модуля
+MENTION_FRAGMENT_PATTERN = re.compile(r"[^;,•/|—\-–\n\.]+")
+LEGAL_FORMS_PATTERN = re.compile(r"\b(" + "|".join(sorted(COMPANY_LEGAL_FORMS)) + r")\b\.?")
+
+QUOTE_CHARACTERS = "«»\"'()[]"
+
+
+def is_missing(value) -> bool:
+    """
+    Проверяет, является ли значение пустым (None или NaN), аналогично pd.isna для скаляров.
+    Args: value: Значение ячейки
+    Returns: True если значение пустое
+    """
+    try:
+        return value is None or bool(value != value)
+    except TypeError:
+        # pd.NA не приводится к bool
+        return True
+
+
+def normalize_text(text: str) -> str:
+    """
+    Нормализует текст: приводит к нижнему регистру, заменяет ё на е, удаляет лишние пробелы и символы.
+    Args: text: Исходный текст
+    Returns: Нормализованный текст
+    """
+    if is_missing(text):
+        return ""
+
+    # split/join одновременно обрезает края и схлопывает пробельные символы
+    return " ".join(str(text).lower().replace("ё", "е").split()).strip(QUOTE_CHARACTERS)
+
+
+def normalize_series(values):
+    """
+    Векторизованный аналог normalize_text для колонки pandas.
+    Args: values: pd.Series с исходными значениями
+    Returns: pd.Series с нормализованными строками (пустые значения превращаются в "")
+    """
+    text_values = values.where(values.notna(), "").astype(str)
+    return (text_values
+            .str.lower()
+            .str.replace("ё", "е", regex=False)
+            .str.split()
+            .str.join(" ")
+            .str.strip(QUOTE_CHARACTERS))
+
+
+def prepare_text_for_matching(text: str) -> str:
+    """
+    Подготавливает текст поста для поиска псевдонимов: нижний регистр, ё на е, схлопывание пробелов.
+    Переводы строк сохраняются, так как являются разделителями упоминаний.
+    Args: text: Исходный текст
+    Returns: Текст для поиска псевдонимов
+    """
+    # str.replace и split/join заметно быстрее str.translate и re.sub на кириллице;
+    # пробелы по краям строк удаляются, что не влияет на границы псевдонимов
+    lines = str(text).lower().replace("ё", "е").split("\n")
+    return "\n".join([" ".join(line.split()) for line in lines])
+
+
+def strip_gpt_prefix(text: str) -> str:
+    """
+    Удаляет префикс перед двоеточием (например, "Компании: ...") если он есть.
+    Args: text: Текст, обработанный GPT
+    Returns: Текст после первого двоеточия
+    """
+    _, colon, text_after_colon = text.partition(":")
+    return text_after_colon if colon else text
+
+
+def remove_legal_forms(company_name: str) -> str:
+    """
+    Удаляет юридические формы (ООО, АО, LLC и т.п.) из нормализованного названия.
+    Args: company_name: Нормализованное название компании
+    Returns: Название без юридических форм
+    """
+    return LEGAL_FORMS_PATTERN.sub("", company_name).strip()
+
+
+def is_valid_company_name(company_name: str) -> bool:
+    """
+    Проверяет, является ли название компании валидным для обработки.
+    Args: company_name: Название компании для проверки
+    Returns: True если название валидно, иначе False
+    """
+    if not company_name:
+        return False
+
+    # Исключаем названия площадок
+    if company_name in PLATFORM_NAMES:
+        return False
+
+    # Исключаем чисто числовые значения
+    if company_name.isdigit():
+        return False
+
+    # Исключаем слишком короткие названия
+    if len(company_name) <= 2:
+        return False
+
+    # Исключаем общие стоп-слова
+    if company_name in GENERIC_STOP_WORDS:
+        return False
+
+    # Удаляем юридические формы и проверяем остаток
+    return bool(remove_legal_forms(company_name))